@@ -0,0 +1,38 @@
+"""add bot_daily_users table
+
+Revision ID: a83c5e17d2b4
+Revises: d4f7b2e90a15
+Create Date: 2026-10-19 18:12:44.207391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83c5e17d2b4'
+down_revision: Union[str, Sequence[str], None] = 'd4f7b2e90a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Per-day user keys, so uniqueUsers is deduplicated across workers (not per process)
+    op.create_table(
+        'bot_daily_users',
+        sa.Column('botId', sa.Uuid(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('userKey', sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(['botId'], ['bots.id'], name='bot_daily_users_botId_fkey', onupdate='CASCADE', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('botId', 'date', 'userKey', name='bot_daily_users_pkey')
+    )
+    op.create_index('bot_daily_users_date_idx', 'bot_daily_users', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('bot_daily_users_date_idx', table_name='bot_daily_users')
+    op.drop_table('bot_daily_users')
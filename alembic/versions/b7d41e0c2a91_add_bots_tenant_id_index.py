@@ -0,0 +1,54 @@
+"""add bots tenant_id index and config change notify trigger
+
+Revision ID: b7d41e0c2a91
+Revises: f9bbcade5bdd
+Create Date: 2026-10-19 10:12:41.530214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41e0c2a91'
+down_revision: Union[str, Sequence[str], None] = 'f9bbcade5bdd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Every chat request looks its bot up by tenant_id
+    op.create_index('bots_tenant_id_idx', 'bots', ['tenant_id'], unique=False)
+
+    # NOTIFY the chat service's bot config cache (services/bot_config_cache.py) when a bot's
+    # config changes. Counter updates (totalMessages/totalConversations) don't fire it.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bots_notify_config_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('bot_config_changed', OLD.tenant_id);
+                RETURN OLD;
+            END IF;
+            IF TG_OP = 'UPDATE' AND OLD.tenant_id IS DISTINCT FROM NEW.tenant_id THEN
+                PERFORM pg_notify('bot_config_changed', OLD.tenant_id);
+            END IF;
+            PERFORM pg_notify('bot_config_changed', NEW.tenant_id);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER bots_notify_config_change
+        AFTER INSERT OR DELETE OR UPDATE OF tenant_id, config, status, name ON bots
+        FOR EACH ROW EXECUTE FUNCTION bots_notify_config_change();
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS bots_notify_config_change ON bots;")
+    op.execute("DROP FUNCTION IF EXISTS bots_notify_config_change();")
+    op.drop_index('bots_tenant_id_idx', table_name='bots')
@@ -0,0 +1,58 @@
+"""add source_images table
+
+Revision ID: c2e8a4f19d63
+Revises: b7d41e0c2a91
+Create Date: 2026-10-19 11:03:27.118452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2e8a4f19d63'
+down_revision: Union[str, Sequence[str], None] = 'b7d41e0c2a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'source_images',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('source_id', sa.Uuid(), nullable=False),
+        sa.Column('tenant_id', sa.Uuid(), nullable=False),
+        sa.Column('source_url', sa.Text(), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('alt', sa.Text(), nullable=True),
+        sa.Column('title', sa.Text(), nullable=True),
+        sa.Column('position', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.ForeignKeyConstraint(['source_id'], ['knowledge_sources.source_id'], name='source_images_source_id_fkey', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', name='source_images_pkey')
+    )
+    op.create_index('source_images_tenant_id_source_url_idx', 'source_images', ['tenant_id', 'source_url'], unique=False)
+    op.create_index('source_images_source_id_idx', 'source_images', ['source_id'], unique=False)
+
+    # Backfill from the images already stored in knowledge_sources.source_metadata
+    op.execute("""
+        INSERT INTO source_images (id, source_id, tenant_id, source_url, url, alt, title, position)
+        SELECT gen_random_uuid(), ks.source_id, ks.tenant_id, ks.source_url,
+               img.value->>'url', COALESCE(img.value->>'alt', ''), NULLIF(img.value->>'title', ''),
+               (img.ordinality - 1)::int
+        FROM knowledge_sources ks
+        CROSS JOIN LATERAL jsonb_array_elements(ks.source_metadata->'images') WITH ORDINALITY AS img(value, ordinality)
+        WHERE ks.source_url IS NOT NULL
+          AND jsonb_typeof(ks.source_metadata->'images') = 'array'
+          AND jsonb_typeof(img.value) = 'object'
+          AND COALESCE(img.value->>'url', '') <> ''
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('source_images_source_id_idx', table_name='source_images')
+    op.drop_index('source_images_tenant_id_source_url_idx', table_name='source_images')
+    op.drop_table('source_images')
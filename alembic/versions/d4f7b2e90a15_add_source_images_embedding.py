@@ -0,0 +1,29 @@
+"""add source_images.embedding
+
+Revision ID: d4f7b2e90a15
+Revises: c2e8a4f19d63
+Create Date: 2026-10-19 16:42:08.531904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7b2e90a15'
+down_revision: Union[str, Sequence[str], None] = 'c2e8a4f19d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled at ingestion; existing rows are embedded on their first lookup
+    op.add_column('source_images', sa.Column('embedding', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('source_images', 'embedding')
@@ -0,0 +1,69 @@
+"""unique conversations (botId, sessionId)
+
+Revision ID: e61b9f4c08d7
+Revises: a83c5e17d2b4
+Create Date: 2026-10-19 18:40:19.662035
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61b9f4c08d7'
+down_revision: Union[str, Sequence[str], None] = 'a83c5e17d2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Conversations sharing (botId, sessionId), oldest first
+_RANKED = """
+    SELECT id, "botId", "sessionId",
+           row_number() OVER (PARTITION BY "botId", "sessionId" ORDER BY "createdAt", id) AS rn
+    FROM conversations
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Merge duplicate conversations into the oldest one (messages in creation order)
+    op.execute(f"""
+        WITH ranked AS ({_RANKED}),
+        dup_keys AS (
+            SELECT "botId", "sessionId" FROM ranked WHERE rn > 1 GROUP BY "botId", "sessionId"
+        ),
+        merged AS (
+            SELECT k.id AS keep_id,
+                   COALESCE(jsonb_agg(m.value ORDER BY c."createdAt", c.id, m.ordinality)
+                            FILTER (WHERE m.value IS NOT NULL), '[]'::jsonb) AS messages,
+                   MAX(c."updatedAt") AS updated_at
+            FROM ranked k
+            JOIN dup_keys d ON d."botId" = k."botId" AND d."sessionId" = k."sessionId"
+            JOIN conversations c ON c."botId" = k."botId" AND c."sessionId" = k."sessionId"
+            LEFT JOIN LATERAL jsonb_array_elements(
+                CASE WHEN jsonb_typeof(c.messages) = 'array' THEN c.messages ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS m(value, ordinality) ON true
+            WHERE k.rn = 1
+            GROUP BY k.id
+        )
+        UPDATE conversations
+        SET messages = merged.messages, "updatedAt" = merged.updated_at
+        FROM merged
+        WHERE conversations.id = merged.keep_id
+    """)
+    op.execute(f"""
+        DELETE FROM conversations c
+        USING ({_RANKED}) AS ranked
+        WHERE c.id = ranked.id AND ranked.rn > 1
+    """)
+
+    # Conversations are created with INSERT ... ON CONFLICT ("botId", "sessionId") DO NOTHING
+    op.execute('DROP INDEX IF EXISTS "conversations_botId_sessionId_idx"')
+    op.create_index('conversations_botId_sessionId_key', 'conversations', ['botId', 'sessionId'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Merged duplicates are not split again
+    op.drop_index('conversations_botId_sessionId_key', table_name='conversations')
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, attributes
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.orm import Session
 from datetime import datetime
 import uuid
 
@@ -14,12 +14,51 @@ from models.schemas import (
 )
 from auth.dependencies import get_tenant_id, get_current_user
 from services.retrieval_service_v2 import retrieval_service
-from database.connection import get_db
-from database.models import Conversations, Bots, KnowledgeSources
+from services.request_pipeline import RequestPipeline
+from services.bot_config_cache import bot_cache, CachedBot
+from services.conversation_writer import conversation_writer, message_key
+from services.image_index import image_index
+from services.fast_path import small_talk
+from services.intent import classify_intent
+from database.connection import get_db, SessionLocal
+from database.models import Conversations, Users
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
+def _get_bot(tenant_id: str) -> CachedBot:
+    """Cached bot for the tenant, or 404."""
+    bot = bot_cache.get(str(tenant_id))
+    if not bot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Bot not found for this tenant"
+        )
+    return bot
+
+
+def _with_pending(stored, pending: list) -> list:
+    """Stored messages followed by queued ones not stored yet (a flush may land in between)."""
+    messages = list(stored) if isinstance(stored, list) else []
+    stored_keys = {message_key(m) for m in messages}
+    messages.extend(m for m in pending if message_key(m) not in stored_keys)
+    return messages
+
+
+def _preview(messages: list):
+    """Short preview of the last message for the conversation list."""
+    if not messages:
+        return None
+    last = messages[-1]
+    if not (isinstance(last, dict) and last.get("text")):
+        return None
+    text = str(last["text"]).strip()
+    preview = text[:80] + "..." if len(text) > 80 else text
+    if "images" in last:
+        preview += " (images)"
+    return preview
+
+
 @router.get("/session", status_code=status.HTTP_200_OK)
 async def create_chat_session(
     tenant_id: str = Query(..., description="Tenant ID for the chatbot"),
@@ -34,12 +73,7 @@ async def create_chat_session(
     2. Every message → POST /chat/ask with body: { question, tenant_id, session_id: <stored> }.
     3. Load history → GET /chat/conversation?tenant_id=...&session_id=<stored>.
     """
-    bot = db.query(Bots).filter(Bots.tenant_id == str(tenant_id)).first()
-    if not bot:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Bot not found for this tenant"
-        )
+    _get_bot(tenant_id)
     session_id = str(uuid.uuid4())
     return {"session_id": session_id, "tenant_id": tenant_id}
 
@@ -47,10 +81,17 @@ async def create_chat_session(
 @router.post("/ask", response_model=QuestionResponse)
 async def ask_question(
     request: QuestionRequest,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     """
     Ask a question, get an answer, and log the conversation.
+
+    Bot lookup (cached) and retrieval run concurrently; per-stage timings
+    and the measured critical path are returned in the `Server-Timing` response header,
+    the prompt context size in `X-Context-Tokens`, and the prompt's static prefix, the part
+    of it the provider can cache (0 while the prefix is below its minimum, as it is for
+    most bots) and the uncached tokens in `X-Prompt-Cache`.
     """
     tenant_id = request.tenant_id
     # New conversation: always generate a new session_id. Otherwise reuse the one sent by the client.
@@ -71,140 +112,138 @@ async def ask_question(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="tenant_id is required"
         )
-
-    try:
-        # 1 Find bot using tenant_id (to read config such as behavior mode)
-        bot = db.query(Bots).filter(Bots.tenant_id == str(tenant_id)).first()
-        if not bot:
+    # The turn is written in the background, so a bad user_id must be rejected here rather
+    # than failing the write (and being dead-lettered) after the client got its answer
+    if user_id:
+        try:
+            user_id = uuid.UUID(str(user_id))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="user_id must be a UUID"
+            )
+        if not db.query(Users.id).filter(Users.id == user_id).first():
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Bot not found for this tenant"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown user_id"
             )
 
-        # 2 Detect if user is asking for images so the model can acknowledge them in the answer
-        user_wants_images = retrieval_service.user_asks_for_image(question_text)
+    # Classify once (greeting / image request / long question); reused by every stage below
+    intent = classify_intent(question_text)
+    # Detect if user is asking for images so the model can acknowledge them in the answer
+    user_wants_images = intent.image_request
 
-        # 3 Build chatbot behavior config from bot.config (if present)
-        behavior = None
-        try:
-            cfg = bot.config or {}
-            website_type = cfg.get("websiteType") or cfg.get("website_type")
-            primary_goal = cfg.get("primaryGoal") or cfg.get("primary_goal")
-            tone = cfg.get("tone")
-            extra = cfg.get("extraInstructions") or cfg.get("extra_instructions")
-            if any([website_type, primary_goal, tone, extra]):
-                behavior = {
-                    "website_type": website_type,
-                    "primary_goal": primary_goal,
-                    "tone": tone,
-                    "extra_instructions": extra,
-                }
-        except Exception:
-            behavior = None
-
-        # 4 Run retrieval and generate answer (pass image hint + behavior mode)
-        result = retrieval_service.answer_question(
+    # 1 Find bot using tenant_id (to read config such as behavior mode); served from the bot cache
+    def load_bot():
+        return _get_bot(tenant_id)
+
+    # 3 Embed the question and retrieve chunks (no DB involved); small talk needs none
+    def retrieve():
+        if small_talk.applies(intent):
+            return []
+        return retrieval_service.retrieve_documents(question_text, tenant_id)
+
+    # 4 Generate answer from retrieved chunks (pass image hint + behavior mode)
+    def answer(bot, retrieve):
+        return retrieval_service.answer_question(
             question_text,
             tenant_id,
             user_asking_for_images=user_wants_images,
-            behavior=behavior,
+            behavior=bot.behavior,
+            retrieved_docs=retrieve,
+            intent=intent,
         )
 
-        # 5 Include images only when the user explicitly asks for them (e.g. "show image", "photo")
-        images: list[SourceImage] = []
+    # 5 Include images only when the user explicitly asks for them (e.g. "show image", "photo")
+    def images(answer):
+        result = answer
+        found: list[SourceImage] = []
         if user_wants_images and result.get("sources"):
-            raw_images: list[dict] = []
-            source_rows = (
-                db.query(KnowledgeSources)
-                .filter(
-                    KnowledgeSources.tenant_id == tenant_id,
-                    KnowledgeSources.source_url.in_(result["sources"]),
-                    KnowledgeSources.source_metadata.isnot(None),
+            # Only (url, alt, title, vector) rows from the image index; page text is never loaded.
+            # Runs in a worker thread and may commit (embedding backfill), so it gets its own session
+            # rather than sharing the request's.
+            image_db = SessionLocal()
+            try:
+                raw_images = image_index.lookup(
+                    image_db, tenant_id, result["sources"], embeddings=retrieval_service.embeddings
                 )
-                .all()
-            )
-            seen_urls: set[str] = set()
-            for row in source_rows:
-                meta = row.source_metadata or {}
-                for img in meta.get("images") or []:
-                    if isinstance(img, dict) and img.get("url") and img["url"] not in seen_urls:
-                        seen_urls.add(img["url"])
-                        raw_images.append({
-                            "url": img["url"],
-                            "alt": img.get("alt") or "",
-                            "title": img.get("title"),
-                        })
+            finally:
+                image_db.close()
             filtered = retrieval_service.filter_relevant_images(
-                question_text, result["answer"], raw_images
+                question_text, result["answer"], raw_images, source_scores=result.get("source_scores")
             )
-            images = [
+            found = [
                 SourceImage(url=img["url"], alt=img.get("alt") or "", title=img.get("title"))
                 for img in filtered
             ]
             # If we have images but the model still said it doesn't have the info, fix the answer
-            if images and result.get("answer"):
+            if found and result.get("answer"):
                 answer_lower = result["answer"].lower()
                 if "don't have" in answer_lower or "do not have" in answer_lower or "don't have that information" in answer_lower:
                     result = {**result, "answer": "Here are the images from the relevant sources."}
+        return result, found
 
-        # 6 Find or create conversation
-        conversation = (
-            db.query(Conversations)
-            .filter(Conversations.sessionId == session_id, Conversations.botId == bot.id)
-            .first()
-        )
-
-        if not conversation:
-            conversation = Conversations(
-                id=str(uuid.uuid4()),
-                sessionId=session_id,
-                userId=user_id,
-                botId=bot.id,
-                messages=[],
-                createdAt=datetime.utcnow(),
-                updatedAt=datetime.utcnow(),
-            )
-            db.add(conversation)
-            bot.totalConversations += 1
-
-        # 7 Append user + bot messages (assign new list so SQLAlchemy persists JSONB changes)
-        msg_list = list(conversation.messages) if conversation.messages else []
-        msg_list.append({
+    # 6 Queue user + bot messages; the conversation writer creates/updates the row in Postgres
+    #   in the background, so DB write time is not part of the response latency
+    def persist(bot, images):
+        result, found = images
+        user_msg = {
             "role": "user",
             "text": question_text,
             "timestamp": datetime.utcnow().isoformat(),
-        })
+        }
         bot_msg: dict = {
             "role": "bot",
             "text": result["answer"],
             "timestamp": datetime.utcnow().isoformat(),
         }
-        if images:
-            bot_msg["images"] = [{"url": img.url, "alt": img.alt or "", "title": img.title} for img in images]
-        msg_list.append(bot_msg)
-        conversation.messages = msg_list
-        conversation.updatedAt = datetime.utcnow()
-        bot.totalMessages += 2
-        attributes.flag_modified(conversation, "messages")
-
-        # 8 Commit all changes
-        db.add(conversation)
-        db.add(bot)
-        db.commit()
-
-        # 9 Optional hint when question is very long (better UX: suggest shortening)
-        question_hint = retrieval_service.get_question_length_hint(question_text)
-
-        # 10 Return response including images and session_id so frontend can load conversation
+        if found:
+            bot_msg["images"] = [{"url": img.url, "alt": img.alt or "", "title": img.title} for img in found]
+        conversation_writer.append(
+            bot_id=bot.id,
+            session_id=session_id,
+            user_id=user_id,
+            messages=[user_msg, bot_msg],
+        )
+
+    pipeline = (
+        RequestPipeline()
+        .add("bot", load_bot)
+        .add("retrieve", retrieve)
+        .add("answer", answer, deps=("bot", "retrieve"))
+        .add("images", images, deps=("answer",))
+        .add("persist", persist, deps=("bot", "images"))
+    )
+
+    try:
+        results = await pipeline.run()
+        result, images_found = results["images"]
+
+        # Optional hint when question is very long (better UX: suggest shortening)
+        question_hint = retrieval_service.get_question_length_hint(question_text, intent)
+
+        response.headers["Server-Timing"] = pipeline.server_timing()
+        if result.get("context_tokens") is not None:
+            response.headers["X-Context-Tokens"] = str(result["context_tokens"])
+        if result.get("prompt_cache"):
+            response.headers["X-Prompt-Cache"] = "; ".join(
+                f"{k}={v}" for k, v in result["prompt_cache"].items() if v is not None
+            )
+        print(f"⏱️ /chat/ask {pipeline.total_ms():.0f} ms; {pipeline.server_timing()}")
+
+        # Return response including images and session_id so frontend can load conversation
         return QuestionResponse(
             answer=result["answer"],
             sources=result["sources"],
             tenant_id=result["tenant_id"],
             session_id=session_id,
             suggestions=result["suggestions"],
-            images=images,
+            images=images_found,
             question_hint=question_hint,
         )
+    except HTTPException:
+        # e.g. the "bot" stage's 404 for an unknown tenant
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -228,12 +267,9 @@ async def list_conversations(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="tenant_id is required"
         )
-    bot = db.query(Bots).filter(Bots.tenant_id == str(tenant_id)).first()
-    if not bot:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Bot not found for this tenant"
-        )
+    bot = _get_bot(tenant_id)
+    # Turns still queued in the conversation writer (read before the DB, as in get_conversation)
+    pending = conversation_writer.pending_sessions(bot.id)
     rows = (
         db.query(Conversations)
         .filter(Conversations.botId == bot.id)
@@ -242,24 +278,27 @@ async def list_conversations(
     )
     items = []
     for conv in rows:
-        messages = conv.messages if isinstance(conv.messages, list) else []
-        preview = None
-        if messages:
-            last = messages[-1]
-            if isinstance(last, dict) and last.get("text"):
-                text = str(last["text"]).strip()
-                preview = text[:80] + "..." if len(text) > 80 else text
-                if "images" in last:
-                    preview += " (images)"
+        messages = _with_pending(conv.messages, pending.pop(conv.sessionId, []))
         items.append(ConversationListItem(
             conversation_id=conv.id,
             session_id=conv.sessionId,
             tenant_id=tenant_id,
             messages=messages,
-            preview=preview,
+            preview=_preview(messages),
             created_at=conv.createdAt,
             updated_at=conv.updatedAt,
         ))
+    # Conversations whose first turn is not in Postgres yet go first (they are the newest)
+    items[:0] = [
+        ConversationListItem(
+            conversation_id=None,
+            session_id=session_id,
+            tenant_id=tenant_id,
+            messages=messages,
+            preview=_preview(messages),
+        )
+        for session_id, messages in pending.items()
+    ]
     return ConversationListResponse(conversations=items, total=len(items))
 
 
@@ -278,18 +317,16 @@ async def get_conversation(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="tenant_id and session_id are required"
         )
-    bot = db.query(Bots).filter(Bots.tenant_id == str(tenant_id)).first()
-    if not bot:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Bot not found for this tenant"
-        )
+    bot = _get_bot(tenant_id)
+    # Read-your-writes: turns still queued in the conversation writer. Read before the DB so a
+    # flush in between shows up in both places (deduplicated below) rather than in neither.
+    pending = conversation_writer.pending_messages(bot.id, session_id)
     conversation = (
         db.query(Conversations)
         .filter(Conversations.sessionId == session_id, Conversations.botId == bot.id)
         .first()
     )
-    if not conversation:
+    if not conversation and not pending:
         return ConversationResponse(
             conversation_id=None,
             session_id=session_id,
@@ -298,9 +335,11 @@ async def get_conversation(
             created_at=None,
             updated_at=None,
         )
+    stored = _with_pending(conversation.messages if conversation else None, pending)
+
     # Normalize messages: ensure each has role, text, timestamp; include images when present
     messages = []
-    for m in conversation.messages or []:
+    for m in stored:
         if isinstance(m, dict) and m.get("text") is not None:
             raw_images = m.get("images") or []
             msg_images = [
@@ -314,6 +353,15 @@ async def get_conversation(
                 timestamp=m.get("timestamp"),
                 images=msg_images,
             ))
+    if not conversation:
+        return ConversationResponse(
+            conversation_id=None,
+            session_id=session_id,
+            tenant_id=tenant_id,
+            messages=messages,
+            created_at=None,
+            updated_at=None,
+        )
     return ConversationResponse(
         conversation_id=conversation.id,
         session_id=conversation.sessionId,
@@ -329,12 +377,17 @@ async def get_chat_status(
     tenant_id: str = Query(..., description="Tenant ID for the chatbot"),
     db: Session = Depends(get_db)
 ):
-    """Get chatbot status for the given tenant_id."""
+    """Get chatbot status for the given tenant_id (reads tenant counters, never the corpus)."""
     try:
-        doc_count = retrieval_service.get_tenant_document_count(tenant_id)
+        stats = retrieval_service.get_tenant_stats(tenant_id)
+        doc_count = stats.chunks if stats else 0
         return {
             "tenant_id": tenant_id,
             "document_count": doc_count,
+            "source_count": stats.sources if stats else 0,
+            "token_count": stats.tokens if stats else 0,
+            "byte_count": stats.bytes if stats else 0,
+            "last_updated": stats.updated_at if stats else None,
             "status": "ready" if doc_count > 0 else "no_knowledge",
             "message": f"Chatbot has {doc_count} document chunks indexed"
             if doc_count > 0
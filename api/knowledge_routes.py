@@ -1,19 +1,122 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import func
+from typing import Iterator, List, Optional, Tuple
 import asyncio
 import json
+import os
 
 from models.schemas import KnowledgeSourceCreate, KnowledgeSourceInfo, ProcessingStatus
 from auth.dependencies import get_tenant_id, get_current_user
-from database.connection import get_db
+from config.settings import settings
+from database.connection import get_db, SessionLocal
 from database.models import Users, KnowledgeSources
 from services.web_scraper import web_scraper
 from services.document_processor import document_processor
-from services.retrieval_service_v2 import retrieval_service
+from services.retrieval_service_v2 import StreamIngestResult, retrieval_service
+from services.image_index import image_index
+from services.near_dedup import near_dedup
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
+
+def _append_file_content(source_id, pages: Iterator[str]) -> Iterator[str]:
+    """
+    Pass pages through unchanged while appending them to `knowledge_sources.file_content`
+    in ~`file_content_flush_chars` pieces (own session: this runs in the splitter thread),
+    so the full text is stored for rebuild-index without ever being held in memory.
+    """
+    buffer: List[str] = []
+    size = 0
+
+    def flush() -> None:
+        nonlocal buffer, size
+        if not buffer:
+            return
+        db = SessionLocal()
+        try:
+            db.query(KnowledgeSources).filter(KnowledgeSources.source_id == source_id).update(
+                {KnowledgeSources.file_content: func.coalesce(KnowledgeSources.file_content + "\n", "") + "\n".join(buffer)},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+        buffer, size = [], 0
+
+    for page in pages:
+        yield page
+        buffer.append(page)
+        size += len(page)
+        if size >= settings.file_content_flush_chars:
+            flush()
+    flush()
+
+
+async def _ingest_uploaded_file(
+    file: UploadFile, tenant_id: str, db: Session
+) -> Tuple[KnowledgeSources, StreamIngestResult]:
+    """
+    Spool the upload to disk, then extract, split and embed it page by page (embedding starts
+    with the first pages). Returns the source row and the ingest result. A file with no
+    extractable text (`chunks == 0`) has its new source row removed. On errors a new source
+    is marked failed before the exception propagates.
+
+    A file the tenant already has as a completed source (same bytes, by SHA-256) reuses that
+    row instead of adding a second one pointing at the same chunks: it is re-indexed under
+    the existing row's file name, which only embeds chunks missing from the index.
+    """
+    path, content_hash = await asyncio.to_thread(document_processor.spool_upload, file)
+    try:
+        source = db.query(KnowledgeSources).filter(
+            KnowledgeSources.tenant_id == tenant_id,
+            KnowledgeSources.source_type == "file",
+            KnowledgeSources.status == "completed",
+            KnowledgeSources.source_metadata["file_hash"].astext == content_hash,
+        ).order_by(KnowledgeSources.created_at).first()
+        existing = source is not None
+        if not existing:
+            source = KnowledgeSources(
+                tenant_id=tenant_id,
+                source_type="file",
+                file_name=file.filename,
+                status="processing",
+                source_metadata={"file_hash": content_hash},
+            )
+            db.add(source)
+            db.commit()
+            db.refresh(source)
+
+        try:
+            pages = document_processor.iter_file_text(path, source.file_name, content_hash=content_hash)
+            if not existing:
+                pages = _append_file_content(source.source_id, pages)
+            result = await retrieval_service.add_text_stream_to_index(
+                pages,
+                source=source.file_name,
+                tenant_id=tenant_id
+            )
+        except Exception as e:
+            db.rollback()
+            if not existing:
+                source.status = "failed"
+                source.error_message = str(e)
+                db.commit()
+            raise
+        if not result.chunks and not existing:
+            db.delete(source)
+            db.commit()
+        return source, result
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _index_source_name(source: KnowledgeSources) -> Optional[str]:
+    """The `source` metadata the row's chunks were indexed under."""
+    return source.source_url or source.file_name or (source.source_metadata or {}).get("title")
+
 @router.post("/sources/url", response_model=ProcessingStatus, status_code=status.HTTP_201_CREATED)
 async def add_url_source(
     url: str = Form(...),
@@ -58,6 +161,7 @@ async def add_url_source(
             'images': result.get('images', [])
         }
         source.source_metadata = metadata
+        image_index.set_source_images(db, source, metadata['images'], embeddings=retrieval_service.embeddings)
 
         await retrieval_service.add_documents_to_index(
             text=result['content'],
@@ -144,6 +248,7 @@ async def add_multiple_urls(
                 'images': result.get('images', [])
             }
             source.source_metadata = metadata
+            image_index.set_source_images(db, source, metadata['images'], embeddings=retrieval_service.embeddings)
 
             await retrieval_service.add_documents_to_index(
                 text=result['content'],
@@ -249,73 +354,57 @@ async def add_multiple_files(
         )
 
     allowed_extensions = ['.txt', '.md', '.csv', '.pdf', '.docx']
-    results = []
 
-    for file in files:
+    # Files are ingested concurrently (each with its own DB session); parsing is spread over
+    # the extraction process pool, so a batch scales across cores.
+    semaphore = asyncio.Semaphore(max(1, settings.upload_batch_concurrency))
+
+    async def process_file(file: UploadFile) -> dict:
         if not file.filename:
-            results.append({
+            return {
                 "filename": "unknown",
                 "status": "failed",
                 "error": "File name is required"
-            })
-            continue
+            }
 
         if not any(file.filename.endswith(ext) for ext in allowed_extensions):
-            results.append({
+            return {
                 "filename": file.filename,
                 "status": "failed",
                 "error": f"File type not supported. Allowed: {', '.join(allowed_extensions)}"
-            })
-            continue
-
-        try:
-            file_content = await file.read()
-            text_content = document_processor.extract_file_content(file_content, file.filename)
+            }
 
-            if not text_content.strip():
-                results.append({
-                    "filename": file.filename,
-                    "status": "failed",
-                    "error": "Could not extract text from file"
-                })
-                continue
+        async with semaphore:
+            file_db = SessionLocal()
+            try:
+                source, result = await _ingest_uploaded_file(file, tenant_id, file_db)
 
-            source = KnowledgeSources(
-                tenant_id=tenant_id,
-                source_type="file",
-                file_name=file.filename,
-                file_content=text_content,
-                status="processing"
-            )
-            db.add(source)
-            db.commit()
-            db.refresh(source)
+                if not result.chunks:
+                    return {
+                        "filename": file.filename,
+                        "status": "failed",
+                        "error": "Could not extract text from file"
+                    }
 
-            await retrieval_service.add_documents_to_index(
-                text=text_content,
-                source=file.filename,
-                tenant_id=tenant_id
-            )
+                source.status = "completed"
+                file_db.commit()
 
-            source.status = "completed"
-            db.commit()
+                return {
+                    "filename": file.filename,
+                    "source_id": source.source_id,
+                    "status": "completed"
+                }
 
-            results.append({
-                "filename": file.filename,
-                "source_id": source.source_id,
-                "status": "completed"
-            })
+            except Exception as e:
+                return {
+                    "filename": file.filename,
+                    "status": "failed",
+                    "error": str(e)
+                }
+            finally:
+                file_db.close()
 
-        except Exception as e:
-            if 'source' in locals():
-                source.status = "failed"
-                source.error_message = str(e)
-                db.commit()
-            results.append({
-                "filename": file.filename,
-                "status": "failed",
-                "error": str(e)
-            })
+    results = list(await asyncio.gather(*(process_file(file) for file in files)))
 
     successful = len([r for r in results if r['status'] == 'completed'])
     failed = len([r for r in results if r['status'] == 'failed'])
@@ -337,10 +426,6 @@ async def add_file_source(
     db: Session = Depends(get_db)
 ):
     """Upload a file as a knowledge source."""
-    
-    def sanitize_text(text: str) -> str:
-        """Remove null bytes to prevent PostgreSQL errors."""
-        return text.replace("\x00", "")
 
     if not file.filename:
         raise HTTPException(
@@ -356,42 +441,14 @@ async def add_file_source(
         )
 
     try:
-        file_content = await file.read()
-        text_content = document_processor.extract_file_content(file_content, file.filename)
-        text_content = sanitize_text(text_content)
+        source, result = await _ingest_uploaded_file(file, tenant_id, db)
 
-        if not text_content.strip():
+        if not result.chunks:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Could not extract text from file"
             )
 
-        source = KnowledgeSources(
-            tenant_id=tenant_id,
-            source_type="file",
-            file_name=file.filename,
-            file_content=text_content,
-            status="processing"
-        )
-
-        db.add(source)
-        try:
-            db.commit()
-            db.refresh(source)
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Database commit failed: {str(e)}"
-            )
-
-        # Process with your retrieval service
-        await retrieval_service.add_documents_to_index(
-            text=text_content,
-            source=file.filename,
-            tenant_id=tenant_id
-        )
-
         # Update status to completed
         source.status = "completed"
         try:
@@ -406,19 +463,15 @@ async def add_file_source(
         return ProcessingStatus(
             source_id=source.source_id,
             status="completed",
-            message="File processed successfully"
+            message=(
+                "File processed successfully" if result.added
+                else "File already indexed; nothing new to embed"
+            )
         )
 
     except HTTPException:
         raise
     except Exception as e:
-        if 'source' in locals():
-            source.status = "failed"
-            source.error_message = str(e)
-            try:
-                db.commit()
-            except:
-                db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing file: {str(e)}"
@@ -430,7 +483,18 @@ async def list_knowledge_sources(
     db: Session = Depends(get_db)
 ):
     """List all knowledge sources for the current tenant."""
-    sources = db.query(KnowledgeSources).filter(
+    sources = db.query(KnowledgeSources).options(
+        load_only(
+            KnowledgeSources.source_id,
+            KnowledgeSources.tenant_id,
+            KnowledgeSources.source_type,
+            KnowledgeSources.source_url,
+            KnowledgeSources.file_name,
+            KnowledgeSources.status,
+            KnowledgeSources.error_message,
+            KnowledgeSources.created_at,
+        )
+    ).filter(
         KnowledgeSources.tenant_id == tenant_id
     ).order_by(KnowledgeSources.created_at.desc()).all()
 
@@ -443,7 +507,14 @@ async def delete_knowledge_source(
     db: Session = Depends(get_db)
 ):
     """Delete a knowledge source."""
-    source = db.query(KnowledgeSources).filter(
+    columns = (
+        KnowledgeSources.source_id,
+        KnowledgeSources.tenant_id,
+        KnowledgeSources.source_url,
+        KnowledgeSources.file_name,
+        KnowledgeSources.source_metadata,
+    )
+    source = db.query(KnowledgeSources).options(load_only(*columns)).filter(
         KnowledgeSources.source_id == source_id,
         KnowledgeSources.tenant_id == tenant_id
     ).first()
@@ -454,9 +525,17 @@ async def delete_knowledge_source(
             detail="Knowledge source not found"
         )
 
+    name = _index_source_name(source)
     db.delete(source)
     db.commit()
 
+    # Release the source's near-duplicate fingerprints unless another row indexes under the same name
+    others = db.query(KnowledgeSources).options(load_only(*columns)).filter(
+        KnowledgeSources.tenant_id == tenant_id
+    ).yield_per(500)
+    if name and not any(_index_source_name(other) == name for other in others):
+        near_dedup.forget_source(tenant_id, name)
+
     return {"message": "Knowledge source deleted successfully"}
 
 @router.post("/rebuild-index", status_code=status.HTTP_200_OK)
@@ -466,17 +545,28 @@ async def rebuild_tenant_index(
 ):
     """Rebuild the search index for the current tenant."""
     try:
-        sources = db.query(KnowledgeSources).filter(
+        completed = db.query(KnowledgeSources).filter(
             KnowledgeSources.tenant_id == tenant_id,
             KnowledgeSources.status == "completed"
-        ).all()
+        )
 
-        if not sources:
+        if not db.query(completed.exists()).scalar():
             return {"message": "No completed sources to index"}
 
         retrieval_service.clear_tenant_documents(tenant_id)
 
-        for source in sources:
+        # Stream rows (server-side cursor) so only a few document bodies are in memory at once
+        rows = completed.with_entities(
+            KnowledgeSources.source_id,
+            KnowledgeSources.source_url,
+            KnowledgeSources.file_name,
+            KnowledgeSources.source_content,
+            KnowledgeSources.file_content,
+        ).yield_per(20)
+
+        sources_processed = 0
+        for source in rows:
+            sources_processed += 1
             content = source.source_content or source.file_content
             if content:
                 source_name = source.source_url or source.file_name or f"source_{source.source_id}"
@@ -488,7 +578,7 @@ async def rebuild_tenant_index(
 
         return {
             "message": f"Index rebuilt successfully for tenant {tenant_id}",
-            "sources_processed": len(sources)
+            "sources_processed": sources_processed
         }
 
     except Exception as e:
@@ -564,6 +654,7 @@ async def crawl_sitemap(
                     'images': result.get('images', [])
                 }
                 source.source_metadata = metadata
+                image_index.set_source_images(db, source, metadata['images'], embeddings=retrieval_service.embeddings)
 
                 await retrieval_service.add_documents_to_index(
                     text=result['content'],
@@ -0,0 +1,110 @@
+"""
+Agreement of the local answerability pre-filter (services/answerability.py) with the LLM
+suggestion verifier, and how many verification calls it saves.
+
+    # Live: sample a tenant, generate candidates, run both verifiers (needs OPENAI_API_KEY)
+    python -m benchmarks.answerability_benchmark --tenant <id> [--rounds 10] [--save cases.jsonl]
+
+    # Offline replay of recorded cases (embeddings only), e.g. to tune thresholds
+    python -m benchmarks.answerability_benchmark --file cases.jsonl [--accept-sim 0.5 ...]
+
+A recorded case is one JSON line: {"questions": [...], "chunks": [...], "llm_keep": [...]}.
+"""
+import argparse
+import json
+from typing import Dict, List
+
+from langchain.schema import Document
+
+from config.settings import settings
+from services.answerability import ACCEPT, BORDERLINE, REJECT, AnswerabilityFilter
+
+
+def _live_cases(tenant_id: str, rounds: int) -> List[Dict]:
+    from services.retrieval_service_v2 import SUGGESTION_POOL_MAX_DOCS, retrieval_service
+
+    if not retrieval_service.initialize_database():
+        raise SystemExit("Vector store unavailable")
+    cases = []
+    for n in range(rounds):
+        docs = retrieval_service._dedupe_documents(
+            retrieval_service._sample_tenant_docs(tenant_id, SUGGESTION_POOL_MAX_DOCS)
+        )
+        if not docs:
+            raise SystemExit(f"No chunks for tenant {tenant_id}")
+        questions = retrieval_service.suggestion_generator.generate(docs)
+        keep = retrieval_service._verify_suggestions_with_llm(questions, docs)
+        cases.append({"questions": questions, "chunks": [d.page_content for d in docs], "llm_keep": keep})
+        print(f"  round {n + 1}/{rounds}: {len(questions)} candidates, LLM kept {len(keep)}")
+    return cases
+
+
+def run(cases: List[Dict], pre_filter: AnswerabilityFilter, embeddings) -> Dict:
+    counts = {"agree_accept": 0, "agree_reject": 0, "false_accept": 0, "false_reject": 0, "borderline": 0}
+    batches_without_llm = 0
+    for case in cases:
+        docs = [Document(page_content=c) for c in case["chunks"]]
+        keep = set(case["llm_keep"])
+        verdicts = pre_filter.triage(case["questions"], docs, embeddings)
+        if not any(v.decision == BORDERLINE for v in verdicts):
+            batches_without_llm += 1
+        for v in verdicts:
+            if v.decision == BORDERLINE:
+                counts["borderline"] += 1
+            elif v.decision == ACCEPT:
+                counts["agree_accept" if v.question in keep else "false_accept"] += 1
+            elif v.decision == REJECT:
+                counts["false_reject" if v.question in keep else "agree_reject"] += 1
+
+    total = sum(counts.values())
+    local = total - counts["borderline"]
+    agreed = counts["agree_accept"] + counts["agree_reject"]
+    return {
+        **counts,
+        "candidates": total,
+        "decided_locally": f"{local / total:.1%}" if total else "n/a",
+        "agreement_on_local": f"{agreed / local:.1%}" if local else "n/a",
+        "llm_calls_avoided": f"{batches_without_llm}/{len(cases)}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tenant", help="tenant id to sample live")
+    source.add_argument("--file", help="recorded cases (JSON lines)")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--save", help="write live cases here for offline replay")
+    parser.add_argument("--accept-sim", type=float, default=settings.answerability_accept_similarity)
+    parser.add_argument("--reject-sim", type=float, default=settings.answerability_reject_similarity)
+    parser.add_argument("--accept-overlap", type=float, default=settings.answerability_accept_overlap)
+    parser.add_argument("--reject-overlap", type=float, default=settings.answerability_reject_overlap)
+    args = parser.parse_args()
+
+    if args.tenant:
+        cases = _live_cases(args.tenant, args.rounds)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                for case in cases:
+                    f.write(json.dumps(case) + "\n")
+    else:
+        with open(args.file, encoding="utf-8") as f:
+            cases = [json.loads(line) for line in f if line.strip()]
+
+    from langchain_openai import OpenAIEmbeddings
+
+    pre_filter = AnswerabilityFilter(
+        accept_similarity=args.accept_sim,
+        reject_similarity=args.reject_sim,
+        accept_overlap=args.accept_overlap,
+        reject_overlap=args.reject_overlap,
+    )
+    result = run(cases, pre_filter, OpenAIEmbeddings(model=settings.embedding_model))
+    print(f"\nThresholds: accept sim>={args.accept_sim} & overlap>={args.accept_overlap}, "
+          f"reject sim<{args.reject_sim} or overlap<{args.reject_overlap}")
+    for key, value in result.items():
+        print(f"  {key:20s} {value}")
+
+
+if __name__ == "__main__":
+    main()
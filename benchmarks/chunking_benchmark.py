@@ -0,0 +1,104 @@
+"""
+Throughput of the shared chunker (services/chunking.py) against the langchain
+RecursiveCharacterTextSplitter it replaced.
+
+    python -m benchmarks.chunking_benchmark [--mb 8] [--file path.txt]
+
+Reports MB/s and chunk counts / token sizes for each splitter. Without --file, a synthetic
+document with headings, paragraphs, lists and tables is used.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from services.chunking import Chunker
+from services.tokenizer import count_tokens, encoding_name
+from config.settings import settings
+
+_WORDS = (
+    "account billing plan support answer question widget tenant upload document page "
+    "price feature team integration security data api response model search index chat "
+    "customer service order shipping return policy contact hours location"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(6, 22))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_document(target_bytes: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    out, size, section = [], 0, 0
+    while size < target_bytes:
+        section += 1
+        parts = [f"## Section {section}: {rng.choice(_WORDS).title()} {rng.choice(_WORDS)}"]
+        for _ in range(rng.randint(1, 4)):
+            parts.append(" ".join(_sentence(rng) for _ in range(rng.randint(2, 8))))
+        if rng.random() < 0.4:
+            parts.append("\n".join(f"- {_sentence(rng)}" for _ in range(rng.randint(3, 8))))
+        if rng.random() < 0.2:
+            rows = ["| Item | Price | Notes |", "|---|---|---|"]
+            rows += [f"| {rng.choice(_WORDS)} | ${rng.randint(1, 500)} | {_sentence(rng)} |" for _ in range(rng.randint(3, 12))]
+            parts.append("\n".join(rows))
+        block = "\n\n".join(parts) + "\n\n"
+        out.append(block)
+        size += len(block.encode("utf-8"))
+    return "".join(out)
+
+
+def _pages(text: str, page_chars: int = 3000):
+    """Cut on line boundaries, like PDF pages / file blocks from document_processor."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + page_chars)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end]
+        start = end
+
+
+def _report(name: str, chunks, seconds: float, size_mb: float) -> None:
+    tokens = [count_tokens(c) for c in chunks]
+    print(
+        f"{name:<34} {size_mb / seconds:8.2f} MB/s  {len(chunks):7d} chunks  "
+        f"tokens/chunk median={statistics.median(tokens):.0f} max={max(tokens)}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=8.0, help="size of the synthetic document")
+    parser.add_argument("--file", help="benchmark on this text file instead")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    else:
+        text = synthetic_document(int(args.mb * 1024 * 1024))
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    print(f"input: {size_mb:.2f} MB, encoding: {encoding_name() or 'approximate (tiktoken unavailable)'}")
+
+    legacy = RecursiveCharacterTextSplitter(
+        chunk_size=800, chunk_overlap=100, length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    t0 = time.perf_counter()
+    chunks = legacy.split_text(text)
+    _report("RecursiveCharacterTextSplitter 800", chunks, time.perf_counter() - t0, size_mb)
+
+    chunker = Chunker(max_tokens=settings.dense_chunk_tokens, overlap_tokens=settings.dense_chunk_overlap_tokens)
+    t0 = time.perf_counter()
+    chunks = chunker.split_text(text)
+    _report(f"Chunker {chunker.max_tokens} tokens", chunks, time.perf_counter() - t0, size_mb)
+
+    t0 = time.perf_counter()
+    chunks = list(chunker.split_stream(_pages(text)))
+    _report(f"Chunker {chunker.max_tokens} tokens (streamed)", chunks, time.perf_counter() - t0, size_mb)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Per-request cost of intent detection (services/intent.py) against the separate checks it
+replaced (`user_asks_for_image` substring scans + `_is_simple_greeting`, called twice).
+
+    python -m benchmarks.intent_benchmark [--n 200000]
+
+Reports µs per message for the old checks, a cold single-pass scan and a cached lookup, and
+lists messages where the two disagree (the new word-start matching is slightly stricter:
+"demographics" no longer counts as an image request).
+"""
+import argparse
+import random
+import re
+import time
+
+from services.intent import IntentClassifier
+
+_GREETING_RE = re.compile(
+    r"^(hi|hello|hey|hiya|howdy|yo|sup|good\s+(morning|afternoon|evening|day)|greetings?|namaste)"
+    r"[\s!?.,]*$",
+    re.I,
+)
+
+MESSAGES = [
+    "hi", "Hello!", "hey there", "Good morning", "thank you", "Thanks!", "hiya :)",
+    "What are your opening hours?", "How much does the premium plan cost per month?",
+    "Can you show me a picture of the office?", "send me photos of the new product line",
+    "What does the dashboard look like?", "How does the widget look on mobile?",
+    "Do you have a diagram of the onboarding flow?", "Where is your head office located?",
+    "I need a refund for order 18422, it arrived damaged and support has not replied.",
+    "Is there a chart comparing the plans?", "What demographics do you serve?",
+    "hello, I want to know about your pricing and whether you offer discounts for nonprofits",
+    "Who founded the company and when?", "history of the company", "support hours",
+]
+
+
+def legacy_asks_for_image(question: str) -> bool:
+    q = question.strip().lower()
+    for token in ("image", "images", "photo", "photos", "picture", "pictures",
+                  "visual", "diagram", "screenshot", "illustration", "graphic", "chart"):
+        if token in q:
+            return True
+    if "show me" in q and ("image" in q or "photo" in q or "picture" in q):
+        return True
+    if "what does" in q and "look like" in q:
+        return True
+    if "how does" in q and "look" in q:
+        return True
+    return False
+
+
+def legacy_is_simple_greeting(question: str) -> bool:
+    q = (question or "").strip()
+    if not q or len(q) > 72:
+        return False
+    if _GREETING_RE.match(q):
+        return True
+    words = re.sub(r"[^\w\s]", " ", q.lower()).split()
+    if not words or len(words) > 5:
+        return False
+    allowed = {
+        "hi", "hello", "hey", "hiya", "howdy", "yo", "sup", "thanks", "thank", "you",
+        "morning", "afternoon", "evening", "good", "day", "there", "dear",
+    }
+    return all(w in allowed for w in words)
+
+
+def _legacy(question: str):
+    # The ask path ran the image check once and the greeting check twice
+    return legacy_asks_for_image(question), legacy_is_simple_greeting(question), legacy_is_simple_greeting(question)
+
+
+def _time(fn, messages) -> float:
+    start = time.perf_counter()
+    for m in messages:
+        fn(m)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="messages per measurement")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    messages = [rng.choice(MESSAGES) for _ in range(args.n)]
+    # Unique texts so the cold run never hits the cache
+    unique = [f"{m} {i}" if i % 2 else m for i, m in enumerate(messages)]
+
+    classifier = IntentClassifier(cache_size=len(MESSAGES) * 2)
+    print(f"{args.n} messages")
+    print(f"  legacy checks        {_time(_legacy, messages):7.2f} µs/msg")
+    print(f"  single pass (cold)   {_time(classifier._classify, unique):7.2f} µs/msg")
+    print(f"  cached intent record {_time(classifier.classify, messages):7.2f} µs/msg")
+
+    print("\nDisagreements (legacy image/greeting vs new):")
+    for m in MESSAGES:
+        old = (legacy_asks_for_image(m), legacy_is_simple_greeting(m))
+        intent = classifier.classify(m)
+        new = (intent.image_request, intent.greeting)
+        if old != new:
+            print(f"  {m!r}: {old} -> {new}")
+
+
+if __name__ == "__main__":
+    main()
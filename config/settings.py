@@ -32,26 +32,137 @@ class Settings(BaseSettings):
     pinecone_host: Optional[str] = os.getenv("PINECONE_HOST")
     pinecone_environment: Optional[str] = os.getenv("PINECONE_ENVIRONMENT")
     pinecone_meta_path: str = os.getenv("PINECONE_META_PATH", "./pinecone_meta")
+    # Local runtime state (SQLite stores, local vector copies below); git-ignored
+    state_path: str = os.getenv("STATE_PATH", "./var")
+    # Local int8/binary copies of Pinecone vectors: MMR runs on these instead of pulling
+    # float values with every query. Leave the path empty to disable.
+    quantized_vector_path: str = os.getenv("QUANTIZED_VECTOR_PATH", os.path.join(state_path, "quantized_vectors"))
+    # Search tenants fully covered by the local copies without calling Pinecone at all
+    quantized_local_search: bool = os.getenv("QUANTIZED_LOCAL_SEARCH", "false").lower() == "true"
+    # SQLite file with per-tenant chunk/source/byte/token counters (shared by workers on a host)
+    tenant_stats_path: str = os.getenv("TENANT_STATS_PATH", os.path.join(state_path, "tenant_stats.sqlite3"))
+    # SQLite file with generated suggestions per tenant (survives restarts, shared by workers)
+    suggestion_store_path: str = os.getenv("SUGGESTION_STORE_PATH", os.path.join(state_path, "suggestions.sqlite3"))
+    # How long a worker trusts its in-memory copy before re-reading the file
+    suggestion_store_memory_ttl_seconds: float = float(os.getenv("SUGGESTION_STORE_MEMORY_TTL_SECONDS", "30"))
+    # Each tenant's suggestions are regenerated at most once per window (change signals are coalesced)
+    suggestion_refresh_min_interval_seconds: float = float(os.getenv("SUGGESTION_REFRESH_MIN_INTERVAL_SECONDS", "60"))
+    # Tenants refreshed concurrently (cap on background suggestion LLM calls per worker)
+    suggestion_refresh_concurrency: int = int(os.getenv("SUGGESTION_REFRESH_CONCURRENCY", "2"))
+
+    # Vector backend: "pinecone", "chroma" or "faiss". Empty keeps the default
+    # (Pinecone when its settings are present, Chroma otherwise).
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "")
+
+    # FAISS (local, in-process vector search; one HNSW index per tenant)
+    faiss_index_path: str = os.getenv("FAISS_INDEX_PATH", os.path.join(state_path, "faiss_index"))
+    faiss_hnsw_m: int = 32
+    faiss_ef_search: int = 64
+    # How often dirty tenant indexes are written back to disk
+    faiss_snapshot_interval_seconds: float = 30.0
+
+    # Tiered retrieval (Pinecone only): serve the busiest tenants from local memory
+    tiered_retrieval_enabled: bool = os.getenv("TIERED_RETRIEVAL_ENABLED", "false").lower() == "true"
+    tiered_memory_budget_mb: int = int(os.getenv("TIERED_MEMORY_BUDGET_MB", "512"))
+    tiered_rebalance_interval_seconds: float = 60.0
+    # Per-tenant query rates decay with this half-life
+    tiered_rate_half_life_seconds: float = 600.0
+    # Tenants with fewer (decayed) queries than this always stay on Pinecone
+    tiered_min_queries: float = 3.0
     
+    # Bot config cache (chat endpoints look bots up by tenant_id on every request)
+    bot_cache_ttl_seconds: float = float(os.getenv("BOT_CACHE_TTL_SECONDS", "60"))
+    # How long a tenant without a bot is remembered
+    bot_cache_negative_ttl_seconds: float = 5.0
+    # Invalidate cached bots on Postgres NOTIFY (needs the bots_notify_config_change trigger)
+    bot_cache_listen_enabled: bool = os.getenv("BOT_CACHE_LISTEN_ENABLED", "true").lower() == "true"
+
+    # Chat counters (bots.total*, bot_analytics) are buffered in memory and flushed this often
+    analytics_flush_interval_seconds: float = float(os.getenv("ANALYTICS_FLUSH_INTERVAL_SECONDS", "5"))
+
+    # Write-behind chat persistence: turns go to a local WAL and are group-committed to Postgres
+    conversation_wal_path: str = os.getenv("CONVERSATION_WAL_PATH", os.path.join(state_path, "conversation_wal"))
+    conversation_flush_interval_seconds: float = float(os.getenv("CONVERSATION_FLUSH_INTERVAL_SECONDS", "0.5"))
+    conversation_flush_batch_size: int = 200
+    # fsync every WAL append (turn off only if losing the last few turns on power loss is OK)
+    conversation_wal_fsync: bool = os.getenv("CONVERSATION_WAL_FSYNC", "true").lower() == "true"
+    # A conversation whose turns fail to write this many times (bad row, bot deleted) is moved
+    # to the dead-letter file next to the WAL instead of being retried forever
+    conversation_max_write_attempts: int = int(os.getenv("CONVERSATION_MAX_WRITE_ATTEMPTS", "5"))
+
+    # Uploaded files are spooled here (empty = system temp dir) and extracted page by page
+    upload_spool_path: str = os.getenv("UPLOAD_SPOOL_PATH", "")
+    # Extracted file text is appended to knowledge_sources.file_content in pieces of this size
+    file_content_flush_chars: int = 1_000_000
+
+    # PDF/DOCX parsing runs in a process pool (0 workers = min(4, CPU count))
+    extraction_max_workers: int = int(os.getenv("EXTRACTION_MAX_WORKERS", "0"))
+    # Address-space limit per extraction worker
+    extraction_worker_memory_mb: int = int(os.getenv("EXTRACTION_WORKER_MEMORY_MB", "1024"))
+    # Timeout for one extraction task (a range of PDF pages, or a whole DOCX)
+    extraction_task_timeout_seconds: float = 60.0
+    extraction_pages_per_task: int = 8
+    # Extracted text cached by file hash, so re-uploads skip parsing (empty path = disabled)
+    extraction_cache_path: str = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(state_path, "extraction_cache"))
+    extraction_cache_max_mb: int = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "2048"))
+    # Files from one batch upload processed at the same time
+    upload_batch_concurrency: int = 4
+
     # Model Settings
     embedding_model: str = "text-embedding-3-small"
     chat_model: str = "gpt-4o-mini"
     temperature: float = 0.0
+    # Shared HTTP pool for OpenAI calls (keep-alive; HTTP/2 when the `h2` package is installed)
+    llm_http2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    llm_max_connections: int = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+    llm_max_keepalive_connections: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    llm_request_timeout_seconds: float = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+    # Max concurrent upstream calls per model, e.g. "gpt-4o-mini=8,text-embedding-3-small=16";
+    # models not listed get llm_default_concurrency
+    llm_model_concurrency: str = os.getenv("LLM_MODEL_CONCURRENCY", "")
+    llm_default_concurrency: int = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "16"))
     
     # Retrieval Settings
-    dense_chunk_size: int = 800
-    dense_chunk_overlap: int = 100
-    sparse_chunk_size: int = 1600
-    sparse_chunk_overlap: int = 200
+    # Chunk sizes are in tokens (tiktoken cl100k_base); see services/chunking.py
+    dense_chunk_tokens: int = int(os.getenv("DENSE_CHUNK_TOKENS", "200"))
+    dense_chunk_overlap_tokens: int = int(os.getenv("DENSE_CHUNK_OVERLAP_TOKENS", "25"))
+    sparse_chunk_tokens: int = int(os.getenv("SPARSE_CHUNK_TOKENS", "400"))
+    sparse_chunk_overlap_tokens: int = int(os.getenv("SPARSE_CHUNK_OVERLAP_TOKENS", "50"))
     retrieval_k: int = 8
     # MMR: retrieve this many candidates first, then diversify down to retrieval_k
     retrieval_fetch_k: int = 32
     # MMR lambda: 1.0 = most relevant only, lower = more diverse excerpts (0.4–0.7 typical)
     mmr_lambda: float = 0.55
-    # Max characters per chunk in the LLM context (truncate very long chunks to save tokens)
-    context_max_chars_per_chunk: int = 2000
+    # Token budget for retrieved excerpts in the LLM prompt; filled by relevance, trimmed at sentences
+    context_max_tokens: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1800"))
+    # A chunk is only trimmed into the remaining budget if at least this many tokens of it fit
+    context_min_excerpt_tokens: int = int(os.getenv("CONTEXT_MIN_EXCERPT_TOKENS", "40"))
     # Max chunks to send to the model after retrieval (safety cap)
     context_max_chunks: int = 10
+    # Provider prompt caching (OpenAI): prompts of at least this many tokens are cached, in increments
+    prompt_cache_min_tokens: int = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+    prompt_cache_increment_tokens: int = int(os.getenv("PROMPT_CACHE_INCREMENT_TOKENS", "128"))
+    # Near-duplicate chunks (SimHash): skipped at ingestion per tenant and collapsed at query time
+    near_dedup_enabled: bool = os.getenv("NEAR_DEDUP_ENABLED", "true").lower() == "true"
+    # Max differing bits (of 64) for two chunks to count as near-duplicates. For ~200-token
+    # chunks, 6 catches a handful of changed words; unrelated chunks are ~20+ bits apart.
+    near_dedup_max_distance: int = int(os.getenv("NEAR_DEDUP_MAX_DISTANCE", "6"))
+    # Shorter chunks are only deduplicated when exactly equal
+    near_dedup_min_words: int = int(os.getenv("NEAR_DEDUP_MIN_WORDS", "12"))
+    # Suggestion verification pre-filter (services/answerability.py): candidates are scored by
+    # best cosine similarity to a knowledge chunk (text-embedding-3-small scale) and by the share
+    # of their content words found in one chunk. Clear cases skip the LLM verifier.
+    answerability_accept_similarity: float = float(os.getenv("ANSWERABILITY_ACCEPT_SIMILARITY", "0.55"))
+    answerability_reject_similarity: float = float(os.getenv("ANSWERABILITY_REJECT_SIMILARITY", "0.30"))
+    answerability_accept_overlap: float = float(os.getenv("ANSWERABILITY_ACCEPT_OVERLAP", "0.6"))
+    answerability_reject_overlap: float = float(os.getenv("ANSWERABILITY_REJECT_OVERLAP", "0.2"))
+    # Images are ranked by cosine similarity of their alt/title/filename embedding to question + answer
+    image_min_similarity: float = float(os.getenv("IMAGE_MIN_SIMILARITY", "0.3"))
+    # Scores this close to the threshold count as ties; the LLM settles them only when enabled
+    image_tie_margin: float = float(os.getenv("IMAGE_TIE_MARGIN", "0.03"))
+    image_llm_tiebreak: bool = os.getenv("IMAGE_LLM_TIEBREAK", "false").lower() == "true"
+    # Greetings / thanks are answered from tone-matched templates, skipping retrieval and the LLM
+    small_talk_fast_path_enabled: bool = os.getenv("SMALL_TALK_FAST_PATH_ENABLED", "true").lower() == "true"
     # Max chunks per embedding API call (avoids OpenAI 300k tokens/request limit)
     embedding_batch_size: int = 100
 
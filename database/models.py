@@ -2,7 +2,7 @@ from typing import Optional
 import datetime
 import uuid
 
-from sqlalchemy import Boolean, Date, DateTime, Enum, ForeignKeyConstraint, Index, Integer, PrimaryKeyConstraint, String, Text, Uuid, text
+from sqlalchemy import Boolean, Date, DateTime, Enum, ForeignKeyConstraint, Index, Integer, LargeBinary, PrimaryKeyConstraint, String, Text, Uuid, text
 from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -59,9 +59,10 @@ class KnowledgeSources(Base):
     tenant_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
     source_type: Mapped[str] = mapped_column(String, nullable=False)
     source_url: Mapped[Optional[str]] = mapped_column(Text)
-    source_content: Mapped[Optional[str]] = mapped_column(Text)
+    # Full page / file text: deferred so listing and status queries don't pull document bodies
+    source_content: Mapped[Optional[str]] = mapped_column(Text, deferred=True)
     file_name: Mapped[Optional[str]] = mapped_column(String)
-    file_content: Mapped[Optional[str]] = mapped_column(Text)
+    file_content: Mapped[Optional[str]] = mapped_column(Text, deferred=True)
     status: Mapped[Optional[str]] = mapped_column(String)
     error_message: Mapped[Optional[str]] = mapped_column(Text)
     source_metadata: Mapped[Optional[dict]] = mapped_column(JSONB)
@@ -69,6 +70,30 @@ class KnowledgeSources(Base):
     updated_at: Mapped[Optional[datetime.datetime]] = mapped_column(TIMESTAMP(True, 6), server_default=text('CURRENT_TIMESTAMP'))
 
     tenant: Mapped['Tenants'] = relationship('Tenants', back_populates='knowledge_sources')
+    images: Mapped[list['SourceImages']] = relationship('SourceImages', back_populates='source', cascade='all, delete-orphan', passive_deletes=True)
+
+
+class SourceImages(Base):
+    __tablename__ = 'source_images'
+    __table_args__ = (
+        ForeignKeyConstraint(['source_id'], ['knowledge_sources.source_id'], ondelete='CASCADE', name='source_images_source_id_fkey'),
+        PrimaryKeyConstraint('id', name='source_images_pkey'),
+        Index('source_images_tenant_id_source_url_idx', 'tenant_id', 'source_url'),
+        Index('source_images_source_id_idx', 'source_id')
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    source_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    tenant_id: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    source_url: Mapped[str] = mapped_column(Text, nullable=False)
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    alt: Mapped[Optional[str]] = mapped_column(Text)
+    title: Mapped[Optional[str]] = mapped_column(Text)
+    position: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text('0'))
+    # Unit-norm float16 embedding of alt/title/filename text (services/image_ranker.py)
+    embedding: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
+
+    source: Mapped['KnowledgeSources'] = relationship('KnowledgeSources', back_populates='images')
 
 
 class Users(Base):
@@ -104,6 +129,7 @@ class Bots(Base):
         PrimaryKeyConstraint('id', name='bots_pkey'),
         Index('bots_apiKey_key', 'apiKey', unique=True),
         Index('bots_isPublic_status_idx', 'isPublic', 'status'),
+        Index('bots_tenant_id_idx', 'tenant_id'),
         Index('bots_userId_idx', 'userId')
     )
 
@@ -152,13 +178,27 @@ class BotAnalytics(Base):
     bots: Mapped['Bots'] = relationship('Bots', back_populates='bot_analytics')
 
 
+class BotDailyUsers(Base):
+    """One row per (bot, day, user key): `bot_analytics.uniqueUsers` counts first inserts only."""
+    __tablename__ = 'bot_daily_users'
+    __table_args__ = (
+        ForeignKeyConstraint(['botId'], ['bots.id'], ondelete='CASCADE', onupdate='CASCADE', name='bot_daily_users_botId_fkey'),
+        PrimaryKeyConstraint('botId', 'date', 'userKey', name='bot_daily_users_pkey'),
+        Index('bot_daily_users_date_idx', 'date')
+    )
+
+    botId: Mapped[uuid.UUID] = mapped_column(Uuid, nullable=False)
+    date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    userKey: Mapped[str] = mapped_column(Text, nullable=False)
+
+
 class Conversations(Base):
     __tablename__ = 'conversations'
     __table_args__ = (
         ForeignKeyConstraint(['botId'], ['bots.id'], ondelete='CASCADE', onupdate='CASCADE', name='conversations_botId_fkey'),
         ForeignKeyConstraint(['userId'], ['users.id'], ondelete='SET NULL', onupdate='CASCADE', name='conversations_userId_fkey'),
         PrimaryKeyConstraint('id', name='conversations_pkey'),
-        Index('conversations_botId_sessionId_idx', 'botId', 'sessionId'),
+        Index('conversations_botId_sessionId_key', 'botId', 'sessionId', unique=True),
         Index('conversations_userId_idx', 'userId')
     )
 
@@ -21,6 +21,17 @@ except ImportError:
 from config.settings import settings
 from database.connection import create_tables
 from services.retrieval_service_v2 import retrieval_service
+from services.bot_config_cache import bot_cache
+from services.analytics_aggregator import analytics_aggregator
+from services.conversation_writer import conversation_writer
+from services.extraction_pool import extraction_pool
+from services.answerability import answerability_filter
+from services.near_dedup import near_dedup
+from services.prompt_assembly import prompt_assembler
+from services.llm_client import close_shared_client, single_flight
+from services.suggestion_scheduler import suggestion_scheduler
+from services.suggestion_store import suggestion_store
+from services.tenant_stats import tenant_stats
 from api.auth_routes import router as auth_router
 from api.chat_routes import router as chat_router
 from api.knowledge_routes import router as knowledge_router
@@ -42,17 +53,40 @@ async def lifespan(app: FastAPI):
     create_tables()
     print("Database tables created/verified")
     
+    # Local SQLite stores (under settings.state_path) are created here, not at import time
+    tenant_stats.open()
+    suggestion_store.open()
+
     # Initialize retrieval service
     success = retrieval_service.initialize_database()
     if not success:
         print("Warning: Failed to initialize retrieval database")
     else:
         print("Retrieval service initialized successfully")
+
+    # Stored suggestions for every tenant, so the first requests after a deploy need no LLM calls
+    print(f"Preloaded suggestions for {suggestion_store.preload()} tenants")
+    suggestion_scheduler.start(retrieval_service.update_tenant_suggestions)
+
+    # Keep cached bot configs in sync with edits made outside this service
+    if settings.bot_cache_listen_enabled and settings.database_url.startswith("postgresql"):
+        bot_cache.start_listener(settings.database_url.replace("postgresql+psycopg2://", "postgresql://"))
+    analytics_aggregator.start()
+    conversation_writer.start()
     
     yield
     
     # Shutdown
     print("Shutting down Multi-Tenant RAG Chatbot...")
+    # Refresh workers use the retrieval service, so they stop before it closes
+    suggestion_scheduler.stop()
+    retrieval_service.close()
+    bot_cache.stop_listener()
+    # Writer first: its final flush records analytics for the turns it commits
+    conversation_writer.stop()
+    analytics_aggregator.stop()
+    extraction_pool.shutdown()
+    close_shared_client()
 
 # Create FastAPI application
 app = FastAPI(
@@ -116,6 +150,18 @@ async def health_check():
         "version": "1.0.0"
     }
 
+
+@app.get("/internal/stats", include_in_schema=False)
+async def internal_stats(_: None = Depends(verify_swagger_admin)):
+    """Operational counters of the background services (admin only)."""
+    return {
+        "near_duplicates": near_dedup.stats(),
+        "suggestion_refresh": suggestion_scheduler.stats(),
+        "suggestion_prefilter": answerability_filter.stats(),
+        "prompt_cache": prompt_assembler.stats(),
+        "llm_clients": single_flight.stats(),
+    }
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
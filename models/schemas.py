@@ -69,7 +69,7 @@ class ConversationResponse(BaseModel):
 
 class ConversationListItem(BaseModel):
     """Summary of one conversation for the list view."""
-    conversation_id: UUID = Field(..., description="Conversation ID")
+    conversation_id: Optional[UUID] = Field(None, description="Conversation ID (null until the first turn is stored)")
     session_id: str = Field(..., description="Session ID; use this for GET /chat/conversation")
     tenant_id: str = Field(..., description="Tenant ID")
     messages: List[ConversationMessage] = Field(default_factory=list, description="Ordered list of user and bot messages")
@@ -0,0 +1,210 @@
+import datetime
+import threading
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.connection import SessionLocal
+from database.models import BotAnalytics, BotDailyUsers, Bots
+
+
+@dataclass
+class _DailyCounts:
+    conversations: int = 0
+    messages: int = 0
+    user_keys: Set[str] = field(default_factory=set)
+
+
+class AnalyticsAggregator:
+    """
+    Buffers chat counters in memory and flushes them in one short transaction per interval:
+      - `bots.totalMessages` / `bots.totalConversations` via batched `SET x = x + n`
+        (no read-modify-write, so concurrent requests can't lose increments);
+      - per-day rows in `bot_analytics` (conversations, messages, uniqueUsers) via upsert.
+
+    Unique users are deduplicated in the database: each flush inserts the day's user keys
+    (user id when known, otherwise the chat session) into `bot_daily_users` with
+    `ON CONFLICT DO NOTHING`, and only keys actually inserted are added to uniqueUsers, in
+    the same transaction. A user seen by several workers is counted once. Each process only
+    sends a key once per day; rows older than yesterday are pruned once a day.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_interval: float = 5.0,
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = float(flush_interval)
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[uuid.UUID, datetime.date], _DailyCounts] = defaultdict(_DailyCounts)
+        self._seen_users: Dict[Tuple[uuid.UUID, datetime.date], Set[str]] = defaultdict(set)
+        self._pruned_for: Optional[datetime.date] = None
+        # Serializes flushes (timer thread vs. shutdown) so counts are never applied twice.
+        self._flush_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --------------------------
+    # Recording (hot path: memory only)
+    # --------------------------
+    def record(
+        self,
+        bot_id: uuid.UUID,
+        *,
+        messages: int = 0,
+        new_conversation: bool = False,
+        user_key: Optional[str] = None,
+    ) -> None:
+        today = datetime.datetime.utcnow().date()
+        key = (bot_id, today)
+        with self._lock:
+            counts = self._pending[key]
+            counts.messages += messages
+            if new_conversation:
+                counts.conversations += 1
+            if user_key and user_key not in self._seen_users[key]:
+                self._seen_users[key].add(user_key)
+                counts.user_keys.add(user_key)
+
+    # --------------------------
+    # Flushing
+    # --------------------------
+    def flush(self) -> int:
+        """Write buffered counters; returns the number of (bot, day) rows flushed."""
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._pending)
+                self._pending.clear()
+                # Drop unique-user sets from previous days
+                today = datetime.datetime.utcnow().date()
+                for key in [k for k in self._seen_users if k[1] < today]:
+                    del self._seen_users[key]
+            if not batch:
+                return 0
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"❌ Analytics flush failed ({len(batch)} rows), will retry: {e}")
+                self._requeue(batch)
+                return 0
+            return len(batch)
+
+    def _write(self, batch: Dict[Tuple[uuid.UUID, datetime.date], _DailyCounts]) -> None:
+        # Sorted by bot id so concurrent flushers (other workers) lock rows in the same order
+        keys = sorted(batch, key=lambda k: (str(k[0]), k[1]))
+
+        totals: Dict[uuid.UUID, _DailyCounts] = defaultdict(_DailyCounts)
+        for bot_id, _day in keys:
+            totals[bot_id].messages += batch[(bot_id, _day)].messages
+            totals[bot_id].conversations += batch[(bot_id, _day)].conversations
+
+        bots = Bots.__table__
+        bump_bots = (
+            update(bots)
+            .where(bots.c.id == bindparam("b_id"))
+            .values(
+                totalMessages=bots.c.totalMessages + bindparam("b_messages"),
+                totalConversations=bots.c.totalConversations + bindparam("b_conversations"),
+            )
+        )
+        daily_users = BotDailyUsers.__table__
+        add_users = (
+            insert(daily_users)
+            .on_conflict_do_nothing(index_elements=[daily_users.c.botId, daily_users.c.date, daily_users.c.userKey])
+            .returning(daily_users.c.botId, daily_users.c.date)
+        )
+        user_rows = [
+            {"botId": bot_id, "date": day, "userKey": user_key}
+            for bot_id, day in keys
+            for user_key in sorted(batch[(bot_id, day)].user_keys)
+        ]
+        today = datetime.datetime.utcnow().date()
+
+        analytics = BotAnalytics.__table__
+        upsert = insert(analytics)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[analytics.c.botId, analytics.c.date],
+            set_={
+                "conversations": analytics.c.conversations + upsert.excluded.conversations,
+                "messages": analytics.c.messages + upsert.excluded.messages,
+                "uniqueUsers": analytics.c.uniqueUsers + upsert.excluded.uniqueUsers,
+            },
+        )
+
+        db = self.session_factory()
+        try:
+            # Keys already stored (seen by another worker) insert nothing and aren't counted
+            new_users: Dict[Tuple[uuid.UUID, datetime.date], int] = defaultdict(int)
+            if user_rows:
+                for bot_id, day in db.execute(add_users, user_rows):
+                    new_users[(bot_id, day)] += 1
+            if self._pruned_for != today:
+                db.execute(delete(daily_users).where(daily_users.c.date < today - datetime.timedelta(days=1)))
+            db.execute(bump_bots, [
+                {"b_id": bot_id, "b_messages": c.messages, "b_conversations": c.conversations}
+                for bot_id, c in totals.items()
+            ])
+            db.execute(upsert, [
+                {
+                    "botId": bot_id,
+                    "date": day,
+                    "conversations": batch[(bot_id, day)].conversations,
+                    "messages": batch[(bot_id, day)].messages,
+                    "uniqueUsers": new_users.get((bot_id, day), 0),
+                }
+                for bot_id, day in keys
+            ])
+            db.commit()
+            self._pruned_for = today
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _requeue(self, batch: Dict[Tuple[uuid.UUID, datetime.date], _DailyCounts]) -> None:
+        with self._lock:
+            for key, counts in batch.items():
+                pending = self._pending[key]
+                pending.conversations += counts.conversations
+                pending.messages += counts.messages
+                pending.user_keys |= counts.user_keys
+
+    def pending_rows(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # --------------------------
+    # Background flusher
+    # --------------------------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="analytics-flush", daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self) -> None:
+        """Stop the flusher and write whatever is still buffered."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5.0)
+        self.flush()
+
+
+analytics_aggregator = AnalyticsAggregator(flush_interval=settings.analytics_flush_interval_seconds)
@@ -0,0 +1,159 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+from langchain.schema import Document
+
+from config.settings import settings
+from services.vector_math import normalize_rows
+
+ACCEPT = "accept"
+REJECT = "reject"
+BORDERLINE = "borderline"
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Question scaffolding that says nothing about whether the knowledge covers the answer
+_STOPWORDS = frozenset(
+    """
+    a an and any are as at be by can could do does for from get have how i if in is it its
+    me my of on or our should than that the their there these this to us was we what when
+    where which who why will with you your yours about tell much many more most
+    """.split()
+)
+
+
+def _terms(text: str) -> set:
+    """Content words, reduced to a 4-letter prefix (price / pricing / prices match)."""
+    return {w[:4] for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+@dataclass(frozen=True)
+class Verdict:
+    question: str
+    decision: str  # ACCEPT / REJECT / BORDERLINE
+    similarity: float  # best cosine similarity to a knowledge chunk
+    overlap: float  # best share of the question's content words found in one chunk
+
+
+class AnswerabilityFilter:
+    """
+    Local first pass over candidate suggestions before the LLM verifier.
+
+    Each question is scored against the knowledge chunks by lexical coverage (share of its
+    content words present in the best chunk) and embedding similarity (best cosine to a
+    chunk). Clear cases are decided here: high similarity with good coverage is accepted,
+    low similarity without good coverage (or no coverage and middling similarity) is
+    rejected. Only the rest go to the LLM, so most refreshes need no verification call.
+
+    Chunk vectors are cached by content hash, so repeated refreshes over the same
+    knowledge only embed the (few, short) candidate questions.
+    """
+
+    def __init__(
+        self,
+        *,
+        accept_similarity: float,
+        reject_similarity: float,
+        accept_overlap: float,
+        reject_overlap: float,
+        cache_size: int = 20_000,
+    ):
+        self.accept_similarity = accept_similarity
+        self.reject_similarity = reject_similarity
+        self.accept_overlap = accept_overlap
+        self.reject_overlap = reject_overlap
+        self.cache_size = max(1, int(cache_size))
+        self._lock = threading.Lock()
+        self._vectors: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._stats = {"checked": 0, "accepted": 0, "rejected": 0, "borderline": 0, "vector_cache_hits": 0}
+
+    # --------------------------
+    # Chunk vector cache
+    # --------------------------
+    def _chunk_vectors(self, texts: Sequence[str], embeddings) -> np.ndarray:
+        keys = [hashlib.blake2b(t.encode("utf-8"), digest_size=16).digest() for t in texts]
+        found: Dict[int, np.ndarray] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._vectors.get(key)
+                if vec is not None:
+                    self._vectors.move_to_end(key)
+                    found[i] = vec
+            self._stats["vector_cache_hits"] += len(found)
+        missing = [i for i in range(len(texts)) if i not in found]
+        if missing:
+            fresh = normalize_rows(embeddings.embed_documents([texts[i] for i in missing]))
+            with self._lock:
+                for i, vec in zip(missing, fresh):
+                    found[i] = vec
+                    self._vectors[keys[i]] = vec
+                while len(self._vectors) > self.cache_size:
+                    self._vectors.popitem(last=False)
+        return np.vstack([found[i] for i in range(len(texts))])
+
+    # --------------------------
+    # Scoring
+    # --------------------------
+    def _decide(self, similarity: float, overlap: float) -> str:
+        if similarity >= self.accept_similarity and overlap >= self.accept_overlap:
+            return ACCEPT
+        # Strong lexical coverage overrides a low similarity (terse questions embed poorly)
+        if similarity < self.reject_similarity and overlap < self.accept_overlap:
+            return REJECT
+        if overlap < self.reject_overlap and similarity < self.accept_similarity:
+            return REJECT
+        return BORDERLINE
+
+    def triage(self, questions: Sequence[str], knowledge_docs: Sequence[Document], embeddings) -> List[Verdict]:
+        """Verdict per question (same order). Embedding failures leave every question borderline."""
+        texts = [(d.page_content or "").strip() for d in knowledge_docs]
+        texts = [t for t in texts if t]
+        if not questions:
+            return []
+        if not texts:
+            return [Verdict(q, REJECT, 0.0, 0.0) for q in questions]
+
+        chunk_terms = [_terms(t) for t in texts]
+        overlaps = []
+        for q in questions:
+            q_terms = _terms(q)
+            if not q_terms:
+                overlaps.append(0.0)
+                continue
+            overlaps.append(max(len(q_terms & c) for c in chunk_terms) / len(q_terms))
+
+        try:
+            chunk_vecs = self._chunk_vectors(texts, embeddings)
+            question_vecs = normalize_rows(embeddings.embed_documents(list(questions)))
+            similarities = (question_vecs @ chunk_vecs.T).max(axis=1)
+        except Exception as e:
+            print(f"Warning: answerability pre-filter unavailable, verifying all with the LLM: {e}")
+            return [Verdict(q, BORDERLINE, 0.0, o) for q, o in zip(questions, overlaps)]
+
+        verdicts = [
+            Verdict(q, self._decide(float(s), o), round(float(s), 4), round(o, 4))
+            for q, s, o in zip(questions, similarities, overlaps)
+        ]
+        with self._lock:
+            self._stats["checked"] += len(verdicts)
+            for v in verdicts:
+                self._stats[{ACCEPT: "accepted", REJECT: "rejected", BORDERLINE: "borderline"}[v.decision]] += 1
+        return verdicts
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            out["cached_vectors"] = len(self._vectors)
+        return out
+
+
+answerability_filter = AnswerabilityFilter(
+    accept_similarity=settings.answerability_accept_similarity,
+    reject_similarity=settings.answerability_reject_similarity,
+    accept_overlap=settings.answerability_accept_overlap,
+    reject_overlap=settings.answerability_reject_overlap,
+)
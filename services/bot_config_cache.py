@@ -0,0 +1,201 @@
+import select
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config.settings import settings
+from database.connection import SessionLocal
+from database.models import Bots
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+except Exception:  # pragma: no cover
+    psycopg2 = None
+
+# Channel written to by the `bots_notify_config_change` trigger (see alembic migration
+# b7d41e0c2a91); the payload is the bot's tenant_id.
+BOT_CONFIG_CHANNEL = "bot_config_changed"
+
+
+def behavior_from_config(cfg: Optional[dict]) -> Optional[dict]:
+    """Chatbot behavior (website type, goal, tone, extra instructions) from `bots.config`."""
+    try:
+        cfg = cfg or {}
+        website_type = cfg.get("websiteType") or cfg.get("website_type")
+        primary_goal = cfg.get("primaryGoal") or cfg.get("primary_goal")
+        tone = cfg.get("tone")
+        extra = cfg.get("extraInstructions") or cfg.get("extra_instructions")
+        if any([website_type, primary_goal, tone, extra]):
+            return {
+                "website_type": website_type,
+                "primary_goal": primary_goal,
+                "tone": tone,
+                "extra_instructions": extra,
+            }
+    except Exception:
+        pass
+    return None
+
+
+@dataclass(frozen=True)
+class CachedBot:
+    """Read-only snapshot of the `bots` columns the chat endpoints need."""
+    id: uuid.UUID
+    tenant_id: str
+    name: str
+    status: str
+    config: Dict[str, Any]
+    behavior: Optional[Dict[str, Any]]
+
+
+class BotConfigCache:
+    """
+    In-process cache of bot rows (and their parsed behavior config) keyed by tenant_id.
+
+    Entries expire after `ttl_seconds`; unknown tenants are remembered for
+    `negative_ttl_seconds` so bad tenant ids don't hit the database on every request.
+    `invalidate()` drops entries explicitly, and `start_listener()` subscribes to Postgres
+    NOTIFY on `BOT_CONFIG_CHANNEL` so edits made by other services show up immediately.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session] = SessionLocal,
+        ttl_seconds: float = 60.0,
+        negative_ttl_seconds: float = 5.0,
+    ):
+        self.session_factory = session_factory
+        self.ttl_seconds = float(ttl_seconds)
+        self.negative_ttl_seconds = float(negative_ttl_seconds)
+
+        self._lock = threading.Lock()
+        # tenant_id -> (bot or None, expires_at monotonic)
+        self._entries: Dict[str, Tuple[Optional[CachedBot], float]] = {}
+        # Bumped by invalidate() so a load that raced with an invalidation isn't cached.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    # --------------------------
+    # Lookups
+    # --------------------------
+    def get(self, tenant_id: str) -> Optional[CachedBot]:
+        """Bot for `tenant_id`, or None when the tenant has no bot."""
+        key = str(tenant_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        bot = self._load(key)
+        ttl = self.ttl_seconds if bot is not None else self.negative_ttl_seconds
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (bot, time.monotonic() + ttl)
+        return bot
+
+    def _load(self, tenant_id: str) -> Optional[CachedBot]:
+        db = self.session_factory()
+        try:
+            row = (
+                db.query(Bots.id, Bots.tenant_id, Bots.name, Bots.status, Bots.config)
+                .filter(Bots.tenant_id == tenant_id)
+                .first()
+            )
+        finally:
+            db.close()
+        if row is None:
+            return None
+        config = dict(row.config or {})
+        return CachedBot(
+            id=row.id,
+            tenant_id=row.tenant_id,
+            name=row.name,
+            status=row.status,
+            config=config,
+            behavior=behavior_from_config(config),
+        )
+
+    def invalidate(self, tenant_id: Optional[str] = None) -> None:
+        """Drop one tenant's entry, or every entry when `tenant_id` is None."""
+        with self._lock:
+            self._generation += 1
+            if tenant_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(tenant_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "listening": bool(self._listener and self._listener.is_alive()),
+            }
+
+    # --------------------------
+    # Postgres LISTEN/NOTIFY
+    # --------------------------
+    def start_listener(self, dsn: str, channel: str = BOT_CONFIG_CHANNEL) -> None:
+        """Invalidate entries when the database NOTIFYs a bot change (background thread)."""
+        if psycopg2 is None:
+            print("⚠️ psycopg2 not installed; bot config cache relies on TTL only")
+            return
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen_loop, args=(dsn, channel), name="bot-config-listener", daemon=True
+        )
+        self._listener.start()
+
+    def stop_listener(self) -> None:
+        self._stop.set()
+
+    def _listen_loop(self, dsn: str, channel: str) -> None:
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{channel}";')
+                # Notifications sent while we weren't listening are lost; start clean.
+                self.invalidate()
+                print(f"🟢 Listening for bot config changes on '{channel}'")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        self.invalidate(note.payload or None)
+            except Exception as e:
+                print(f"❌ Bot config listener error: {e}")
+                self._stop.wait(5.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+bot_cache = BotConfigCache(
+    ttl_seconds=settings.bot_cache_ttl_seconds,
+    negative_ttl_seconds=settings.bot_cache_negative_ttl_seconds,
+)
@@ -0,0 +1,326 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from langchain.schema import Document
+
+from config.settings import settings
+from services.tokenizer import count_tokens, split_by_tokens
+
+
+# --------------------------
+# Block classification
+# --------------------------
+_MD_HEADING = re.compile(r"^#{1,6}\s+\S")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+•▪◦‣–]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+\S")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_TERMINAL_PUNCT = ".!?,;"
+# Cost of the blank line joining two blocks of a chunk
+_JOIN_TOKENS = 1
+
+# Longest line that can be a heading, and the most words in it
+_HEADING_MAX_CHARS = 80
+_HEADING_MAX_WORDS = 10
+
+
+@dataclass
+class Block:
+    """A structural unit of the input: heading, paragraph, list or table."""
+    kind: str
+    text: str
+
+
+def _is_table_row(line: str) -> bool:
+    return line.count("|") >= 2 or line.count("\t") >= 1
+
+
+def _looks_like_title(line: str) -> bool:
+    """Short line without sentence punctuation, e.g. a scraped <h2> or a PDF section title."""
+    if len(line) > _HEADING_MAX_CHARS or len(line.split()) > _HEADING_MAX_WORDS:
+        return False
+    if line[-1] in _TERMINAL_PUNCT or not line[0].isalnum():
+        return False
+    return line[0].isupper() or line[0].isdigit()
+
+
+def _is_strong_heading(line: str) -> bool:
+    if _MD_HEADING.match(line):
+        return True
+    if len(line) > _HEADING_MAX_CHARS or len(line.split()) > _HEADING_MAX_WORDS:
+        return False
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 3 and line.isupper():
+        return True
+    return line.endswith(":") and len(line) <= 60
+
+
+def iter_blocks(pieces: Iterable[str], max_block_chars: int = 16_000) -> Iterator[Block]:
+    """
+    Group lines from `pieces` (pages / text blocks that end on line boundaries) into
+    headings, paragraphs, lists and tables. Paragraphs may continue across pieces.
+
+    A short title-like line only counts as a heading when prose follows it, so runs of
+    short lines (navigation menus, address blocks) stay ordinary text.
+    """
+    kind: Optional[str] = None
+    lines: List[str] = []
+    size = 0
+    candidate: Optional[str] = None  # possible heading, decided by the next line
+
+    def flush() -> Optional[Block]:
+        nonlocal kind, lines, size
+        block = Block(kind, "\n".join(lines)) if lines else None
+        kind, lines, size = None, [], 0
+        return block
+
+    for piece in pieces:
+        if not piece:
+            continue
+        for raw in piece.splitlines():
+            line = raw.strip()
+            if not line:
+                if candidate is not None:
+                    # A title line followed by a blank line is just a short paragraph
+                    if kind != "paragraph":
+                        block = flush()
+                        if block:
+                            yield block
+                        kind = "paragraph"
+                    lines.append(candidate)
+                    candidate = None
+                if kind != "table":
+                    block = flush()
+                    if block:
+                        yield block
+                continue
+
+            if candidate is not None:
+                if not _looks_like_title(line) and len(line) > len(candidate):
+                    block = flush()
+                    if block:
+                        yield block
+                    yield Block("heading", candidate)
+                else:
+                    if kind != "paragraph":
+                        block = flush()
+                        if block:
+                            yield block
+                        kind = "paragraph"
+                    lines.append(candidate)
+                    size += len(candidate) + 1
+                candidate = None
+
+            if _is_strong_heading(line):
+                block = flush()
+                if block:
+                    yield block
+                yield Block("heading", line.lstrip("#").strip())
+                continue
+
+            if _is_table_row(line) or (kind == "table" and _TABLE_SEPARATOR.match(line)):
+                line_kind = "table"
+            elif _LIST_ITEM.match(raw):
+                line_kind = "list"
+            elif kind == "list" and raw[:1].isspace():
+                line_kind = "list"  # indented continuation of a list item
+            elif _looks_like_title(line) and kind != "list":
+                candidate = line
+                continue
+            else:
+                line_kind = "paragraph"
+
+            if line_kind != kind or size + len(line) > max_block_chars:
+                block = flush()
+                if block:
+                    yield block
+                kind = line_kind
+            lines.append(line if line_kind != "list" else raw.rstrip())
+            size += len(line) + 1
+
+    if candidate is not None:
+        if kind != "paragraph":
+            block = flush()
+            if block:
+                yield block
+            kind = "paragraph"
+        lines.append(candidate)
+    block = flush()
+    if block:
+        yield block
+
+
+# --------------------------
+# Chunker
+# --------------------------
+class Chunker:
+    """
+    Token-budgeted, structure-aware text chunker.
+
+    Blocks from `iter_blocks` are packed greedily into chunks of at most `max_tokens`
+    tokens (tiktoken, see services/tokenizer.py). A heading always starts a new chunk and is
+    repeated at the top of every chunk its section spills into. Blocks larger than the
+    budget are split at list items, table rows (repeating the header row) or sentences,
+    and only then at raw token boundaries. Chunks continuing the same section start with
+    up to `overlap_tokens` tokens of trailing sentences from the previous chunk.
+
+    Everything is a generator: memory is bounded by one chunk plus one block, whatever the
+    input size.
+    """
+
+    def __init__(self, *, max_tokens: int, overlap_tokens: int = 0, max_block_chars: int = 16_000):
+        self.max_tokens = max(16, int(max_tokens))
+        self.overlap_tokens = max(0, min(int(overlap_tokens), self.max_tokens // 2))
+        self.max_block_chars = max_block_chars
+
+    # --------------------------
+    # Public API
+    # --------------------------
+    def split_stream(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Yield chunk texts for text arriving piece by piece (pages, file blocks)."""
+        heading: Optional[str] = None
+        heading_tokens = 0
+        parts: List[str] = []
+        tokens = 0
+        has_content = False
+        last_kind: Optional[str] = None
+
+        def start_chunk(overlap: Optional[str]) -> None:
+            nonlocal parts, tokens, has_content
+            parts = [heading] if heading else []
+            tokens = heading_tokens
+            if overlap:
+                parts.append(overlap)
+                tokens += count_tokens(overlap) + _JOIN_TOKENS
+            has_content = False
+
+        for block in iter_blocks(pieces, self.max_block_chars):
+            if block.kind == "heading":
+                if has_content:
+                    yield "\n\n".join(parts)
+                elif heading and parts and parts[-1] == heading:
+                    # Consecutive headings with nothing between: keep the outline together
+                    block.text = f"{heading}\n{block.text}"
+                heading = split_by_tokens(block.text, self.max_tokens // 4)[0]
+                heading_tokens = count_tokens(heading)
+                start_chunk(None)
+                continue
+
+            budget = self.max_tokens - heading_tokens - _JOIN_TOKENS
+            block_tokens = count_tokens(block.text)
+            if block_tokens <= budget:
+                fitted = [(block.text, block_tokens)]
+            else:
+                # Leave room for the overlap that prose pieces carry into the next chunk
+                reserve = self.overlap_tokens + _JOIN_TOKENS if block.kind == "paragraph" else 0
+                fitted = self._split_block(block, budget - reserve)
+            for text, n in fitted:
+                n += _JOIN_TOKENS
+                if has_content and tokens + n > self.max_tokens:
+                    yield "\n\n".join(parts)
+                    # Overlap only carries prose; repeating half a table or list reads badly
+                    start_chunk(self._overlap_tail(parts[-1]) if last_kind == "paragraph" else None)
+                    if tokens + n > self.max_tokens:
+                        start_chunk(None)
+                parts.append(text)
+                tokens += n
+                has_content = True
+                last_kind = block.kind
+
+        if has_content:
+            yield "\n\n".join(parts)
+
+    def split_text(self, text: str) -> List[str]:
+        return list(self.split_stream([text]))
+
+    def iter_documents(self, pieces: Iterable[str], metadata: Dict) -> Iterator[Document]:
+        for chunk in self.split_stream(pieces):
+            yield Document(page_content=chunk, metadata=dict(metadata))
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Drop-in for `TextSplitter.split_documents`: chunks keep their document's metadata."""
+        chunks: List[Document] = []
+        for doc in documents:
+            chunks.extend(self.iter_documents([doc.page_content], doc.metadata))
+        return chunks
+
+    # --------------------------
+    # Internals
+    # --------------------------
+    def _split_block(self, block: Block, budget: int) -> List[tuple]:
+        """Split an oversized block into (text, tokens) pieces that each fit `budget`."""
+        budget = max(budget, self.max_tokens // 2)
+        header: Optional[str] = None
+        if block.kind == "table":
+            rows = block.text.split("\n")
+            header_rows = 2 if len(rows) > 1 and _TABLE_SEPARATOR.match(rows[1]) else 1
+            header = "\n".join(rows[:header_rows])
+            units, sep = rows[header_rows:], "\n"
+        elif block.kind == "list":
+            units, sep = self._list_items(block.text), "\n"
+        else:
+            units, sep = [s for s in _SENTENCE_END.split(block.text) if s.strip()], " "
+
+        header_tokens = count_tokens(header) if header else 0
+        out: List[tuple] = []
+        group: List[str] = []
+        group_tokens = 0
+
+        def emit() -> None:
+            nonlocal group, group_tokens
+            if group:
+                text = sep.join(group)
+                if header:
+                    text = f"{header}\n{text}"
+                out.append((text, group_tokens + header_tokens))
+            group, group_tokens = [], 0
+
+        for unit in units:
+            n = count_tokens(unit)
+            if n + header_tokens > budget:
+                emit()
+                for piece in split_by_tokens(unit, max(1, budget - header_tokens)):
+                    group, group_tokens = [piece], count_tokens(piece)
+                    emit()
+                continue
+            if group and group_tokens + n + header_tokens > budget:
+                emit()
+            group.append(unit)
+            group_tokens += n
+        emit()
+        return out
+
+    @staticmethod
+    def _list_items(text: str) -> List[str]:
+        items: List[str] = []
+        for line in text.split("\n"):
+            if items and not _LIST_ITEM.match(line):
+                items[-1] += "\n" + line
+            else:
+                items.append(line)
+        return items
+
+    def _overlap_tail(self, text: str) -> Optional[str]:
+        """Trailing whole sentences of `text` within `overlap_tokens`."""
+        if not self.overlap_tokens:
+            return None
+        tail: List[str] = []
+        used = 0
+        for sentence in reversed([s for s in _SENTENCE_END.split(text) if s.strip()]):
+            n = count_tokens(sentence)
+            if used + n > self.overlap_tokens:
+                break
+            tail.append(sentence)
+            used += n
+        return " ".join(reversed(tail)) or None
+
+
+# Shared chunkers: dense chunks feed embeddings, sparse chunks feed keyword (BM25) retrieval
+dense_chunker = Chunker(
+    max_tokens=settings.dense_chunk_tokens,
+    overlap_tokens=settings.dense_chunk_overlap_tokens,
+)
+sparse_chunker = Chunker(
+    max_tokens=settings.sparse_chunk_tokens,
+    overlap_tokens=settings.sparse_chunk_overlap_tokens,
+)
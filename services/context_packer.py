@@ -0,0 +1,119 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from langchain.schema import Document
+
+from config.settings import settings
+from services.tokenizer import count_tokens, truncate_to_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_JOIN_TOKENS = 1  # blank line between excerpts
+
+
+@dataclass
+class PackedContext:
+    """Prompt context built by `ContextPacker.pack`, with its token accounting."""
+    text: str
+    tokens: int
+    budget: int
+    excerpts: int
+    trimmed: int
+    dropped: int
+    sources: List[str]
+
+    def summary(self) -> str:
+        return (
+            f"{self.tokens}/{self.budget} tokens, {self.excerpts} excerpts "
+            f"({self.trimmed} trimmed, {self.dropped} dropped)"
+        )
+
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into the LLM context under a token budget.
+
+    Chunks are taken greedily in relevance order (`relevance_score` metadata set by the
+    retrievers; retrieval order when it's missing). A chunk that doesn't fit whole is
+    trimmed at a sentence boundary to the remaining budget, provided at least
+    `min_excerpt_tokens` of it fit; otherwise it is skipped and smaller ones are tried.
+    """
+
+    def __init__(self, *, max_tokens: int, max_chunks: int, min_excerpt_tokens: int = 40):
+        self.max_tokens = max(1, int(max_tokens))
+        self.max_chunks = max(1, int(max_chunks))
+        self.min_excerpt_tokens = max(1, int(min_excerpt_tokens))
+
+    @staticmethod
+    def _ranked(docs: List[Document]) -> List[Document]:
+        scores = [(d.metadata or {}).get("relevance_score") for d in docs]
+        if any(not isinstance(s, (int, float)) for s in scores):
+            return list(docs)
+        # Stable: equal scores keep retrieval order
+        return [d for _s, d in sorted(zip(scores, docs), key=lambda p: -p[0])]
+
+    def _trim(self, body: str, max_tokens: int) -> Optional[str]:
+        """Leading whole sentences of `body` within `max_tokens`, or None if not even one fits."""
+        kept: List[str] = []
+        used = 1  # trailing ellipsis
+        for sentence in _SENTENCE_END.split(body):
+            if not sentence.strip():
+                continue
+            n = count_tokens(sentence) + 1
+            if used + n > max_tokens:
+                break
+            kept.append(sentence)
+            used += n
+        if kept:
+            return " ".join(kept) + " …"
+        # First sentence alone is too long: cut it at a token boundary
+        return truncate_to_tokens(body, max_tokens - 1).rstrip() + "…" if max_tokens > 1 else None
+
+    def pack(self, docs: List[Document], max_tokens: Optional[int] = None) -> PackedContext:
+        budget = max_tokens or self.max_tokens
+        blocks: List[str] = []
+        sources: List[str] = []
+        used = 0
+        trimmed = 0
+        dropped = 0
+        for doc in self._ranked(docs):
+            if len(blocks) >= self.max_chunks:
+                dropped += 1
+                continue
+            body = (doc.page_content or "").strip()
+            if not body:
+                continue
+            src = (doc.metadata or {}).get("source") or "unknown source"
+            header = f"--- Excerpt {len(blocks) + 1} (Source: {src}) ---\n"
+            fixed = count_tokens(header) + (_JOIN_TOKENS if blocks else 0)
+            room = budget - used - fixed
+            n = count_tokens(body)
+            if n > room:
+                if room < self.min_excerpt_tokens:
+                    dropped += 1
+                    continue
+                body = self._trim(body, room)
+                if not body:
+                    dropped += 1
+                    continue
+                n = count_tokens(body)
+                trimmed += 1
+            blocks.append(header + body)
+            sources.append((doc.metadata or {}).get("source", "Unknown"))
+            used += fixed + n
+        return PackedContext(
+            text="\n\n".join(blocks),
+            tokens=used,
+            budget=budget,
+            excerpts=len(blocks),
+            trimmed=trimmed,
+            dropped=dropped,
+            sources=sources,
+        )
+
+
+context_packer = ContextPacker(
+    max_tokens=settings.context_max_tokens,
+    max_chunks=settings.context_max_chunks,
+    min_excerpt_tokens=settings.context_min_excerpt_tokens,
+)
@@ -0,0 +1,457 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session, attributes
+
+from config.settings import settings
+from database.connection import SessionLocal
+from database.models import Conversations
+from services.analytics_aggregator import analytics_aggregator
+
+try:
+    import fcntl
+except Exception:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+@dataclass
+class _Append:
+    """One chat turn waiting to be written: messages appended to (bot_id, session_id)."""
+    bot_id: str
+    session_id: str
+    user_id: Optional[str]
+    messages: List[dict]
+
+
+def _is_transient(error: Exception) -> bool:
+    """Connection-level failures: retried without counting against the conversation."""
+    if isinstance(error, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(error, DBAPIError) and bool(error.connection_invalidated)
+
+
+def _user_uuid(user_id: Optional[str]) -> Optional[uuid.UUID]:
+    return uuid.UUID(user_id) if user_id else None
+
+
+def message_key(message: dict) -> Tuple:
+    """Identity of a stored message (timestamps are microsecond-precise per turn)."""
+    if not isinstance(message, dict):
+        return (None, None, None)
+    return (message.get("role"), message.get("timestamp"), message.get("text"))
+
+
+class ConversationWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    `append()` writes the turn to a local write-ahead log (one JSON line, fsync'd) and to an
+    in-memory pending list, then returns; a background thread group-commits pending turns
+    in batches (one transaction, one row lock per conversation). Once a batch commits, the
+    WAL is rewritten with only the turns still pending.
+
+    Conversations are created with `INSERT … ON CONFLICT DO NOTHING` on the unique
+    (botId, sessionId) index, so two workers never create the same conversation twice. If
+    a batch fails, each conversation is retried in its own transaction, so one bad turn
+    (a deleted bot, an invalid row) doesn't hold back the others. A conversation that keeps
+    failing for non-connection reasons is dead-lettered after `max_attempts` tries: its
+    turns move to `dead-letter.jsonl` in `wal_dir` with the last error.
+
+    Each process owns its own WAL file and holds an exclusive `flock` on it. On start, WAL
+    files not locked by a live process (left behind by a crash) are taken over and replayed.
+    Replays are idempotent: a turn whose first message is already stored is skipped.
+
+    `pending_messages()` / `pending_sessions()` give read-your-writes for turns that are not
+    in Postgres yet: this process's from memory, other workers' from their WAL files. That
+    covers every worker sharing `wal_dir` (one host); with workers on several hosts, a
+    read served by another host sees a turn only after its flush (normally well under a
+    second), unless requests of a session are routed to one host.
+    """
+
+    def __init__(
+        self,
+        *,
+        wal_dir: str,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_interval: float = 0.5,
+        batch_size: int = 200,
+        fsync: bool = True,
+        max_attempts: int = 5,
+    ):
+        self.wal_dir = os.path.abspath(wal_dir)
+        self.session_factory = session_factory
+        self.flush_interval = float(flush_interval)
+        self.batch_size = max(1, int(batch_size))
+        self.fsync = fsync
+        self.max_attempts = max(1, int(max_attempts))
+
+        self._lock = threading.Lock()
+        self._pending: List[_Append] = []
+        # (bot_id, session_id) -> failed write attempts since its last success
+        self._attempts: Dict[Tuple[str, str], int] = {}
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._wal_path: Optional[str] = None
+        self._wal = None
+        self.committed = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+
+    # --------------------------
+    # WAL files
+    # --------------------------
+    def _open_wal(self, path: str):
+        f = open(path, "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return f
+
+    def _write_lines(self, f, records: List[_Append]) -> None:
+        f.writelines(json.dumps(asdict(r), default=str) + "\n" for r in records)
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _read_wal(self, path: str) -> List[_Append]:
+        records: List[_Append] = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(_Append(**json.loads(line)))
+                except Exception:
+                    # Torn last line from a crash mid-write; everything before it is intact.
+                    break
+        return records
+
+    def _claim_orphans(self) -> List[_Append]:
+        """Take over WAL files whose owning process is gone."""
+        recovered: List[_Append] = []
+        if fcntl is None:
+            return recovered
+        for path in sorted(glob.glob(os.path.join(self.wal_dir, "wal-*.jsonl"))):
+            if path == self._wal_path:
+                continue
+            try:
+                with open(path, "r+", encoding="utf-8") as f:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # a live writer owns it
+                    records = self._read_wal(path)
+                    # Copy into our own WAL before deleting, so a crash right here loses nothing
+                    self._write_lines(self._wal, records)
+                    os.remove(path)
+                    recovered.extend(records)
+            except FileNotFoundError:
+                continue
+        if recovered:
+            print(f"🟢 Recovered {len(recovered)} pending chat turns from write-ahead log")
+        return recovered
+
+    def _rewrite_wal(self) -> None:
+        """Replace our WAL with just the still-pending turns (caller holds `_lock`)."""
+        tmp_path = self._wal_path + ".tmp"
+        new_wal = self._open_wal(tmp_path)
+        self._write_lines(new_wal, self._pending)
+        os.replace(tmp_path, self._wal_path)
+        self._wal.close()
+        self._wal = new_wal
+
+    # --------------------------
+    # Public API
+    # --------------------------
+    def append(self, *, bot_id, session_id: str, user_id: Optional[str], messages: List[dict]) -> None:
+        """Durably queue `messages` for the conversation; returns before Postgres is touched."""
+        record = _Append(
+            bot_id=str(bot_id),
+            session_id=session_id,
+            user_id=str(user_id) if user_id else None,
+            messages=messages,
+        )
+        with self._lock:
+            if self._wal is None:
+                raise RuntimeError("ConversationWriter is not started")
+            self._write_lines(self._wal, [record])
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def _pending_records(self, bot_id: str, session_id: Optional[str] = None) -> List[_Append]:
+        """
+        Turns not committed yet for the bot (one session, or all), oldest first per process:
+        ours from memory, other workers' from their WAL files in `wal_dir`.
+        """
+        def wanted(r: _Append) -> bool:
+            return r.bot_id == bot_id and (session_id is None or r.session_id == session_id)
+
+        with self._lock:
+            out = [r for r in self._pending if wanted(r)]
+            own_path = self._wal_path
+        for path in sorted(glob.glob(os.path.join(self.wal_dir, "wal-*.jsonl"))):
+            if path == own_path:
+                continue
+            try:
+                out.extend(r for r in self._read_wal(path) if wanted(r))
+            except FileNotFoundError:
+                continue  # compacted away or taken over meanwhile
+        return out
+
+    def pending_messages(self, bot_id, session_id: str) -> List[dict]:
+        """Messages accepted by `append()` (by any worker on this host) but not committed yet."""
+        out: List[dict] = []
+        for r in self._pending_records(str(bot_id), session_id):
+            out.extend(r.messages)
+        return out
+
+    def pending_sessions(self, bot_id) -> Dict[str, List[dict]]:
+        """Like `pending_messages`, for every session of the bot: session_id -> messages."""
+        out: Dict[str, List[dict]] = defaultdict(list)
+        for r in self._pending_records(str(bot_id)):
+            out[r.session_id].extend(r.messages)
+        return dict(out)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "committed": self.committed,
+                "dead_lettered": self.dead_lettered,
+                "failing_conversations": len(self._attempts),
+                "last_flush_ms": round(self.last_flush_ms, 1),
+            }
+
+    # --------------------------
+    # Group commit
+    # --------------------------
+    def flush(self) -> int:
+        """Commit up to `batch_size` pending turns; returns how many were committed."""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending[: self.batch_size])
+            if not batch:
+                return 0
+
+            t0 = time.perf_counter()
+            grouped = self._group(batch)
+            committed: List[_Append] = []
+            created: set = set()
+            failed: Dict[Tuple[str, str], Exception] = {}
+            try:
+                created = self._write(grouped)
+                committed = batch
+            except Exception as e:
+                if _is_transient(e):
+                    print(f"❌ Conversation flush failed ({len(batch)} turns), will retry: {e}")
+                    return 0
+                # Isolate the bad conversation(s): write each one in its own transaction
+                for key, records in grouped.items():
+                    try:
+                        created |= self._write({key: records})
+                        committed.extend(records)
+                    except Exception as key_error:
+                        failed[key] = key_error
+
+            with self._lock:
+                dead = self._note_failures(failed, grouped)
+                done = {id(r) for r in committed} | {id(r) for r in dead}
+                if done:
+                    self._pending = [r for r in self._pending if id(r) not in done]
+                    try:
+                        self._rewrite_wal()
+                    except Exception as e:
+                        # Committed turns stay in the WAL; replay skips them as duplicates.
+                        print(f"⚠️ Could not compact conversation WAL: {e}")
+                for key in grouped:
+                    if key not in failed:
+                        self._attempts.pop(key, None)
+                self.committed += len(committed)
+                self.last_flush_ms = (time.perf_counter() - t0) * 1000.0
+
+            for r in committed:
+                analytics_aggregator.record(
+                    uuid.UUID(r.bot_id),
+                    messages=len(r.messages),
+                    new_conversation=(r.bot_id, r.session_id) in created,
+                    user_key=r.user_id or r.session_id,
+                )
+                created.discard((r.bot_id, r.session_id))
+            return len(committed)
+
+    @staticmethod
+    def _group(batch: List[_Append]) -> Dict[Tuple[str, str], List[_Append]]:
+        grouped: Dict[Tuple[str, str], List[_Append]] = defaultdict(list)
+        for r in batch:
+            grouped[(r.bot_id, r.session_id)].append(r)
+        return grouped
+
+    def _note_failures(
+        self,
+        failed: Dict[Tuple[str, str], Exception],
+        grouped: Dict[Tuple[str, str], List[_Append]],
+    ) -> List[_Append]:
+        """Count failed attempts; returns turns to dead-letter (caller holds `_lock`)."""
+        dead: List[_Append] = []
+        for key, error in failed.items():
+            if _is_transient(error):
+                print(f"❌ Conversation write failed for session {key[1]}, will retry: {error}")
+                continue
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts < self.max_attempts:
+                self._attempts[key] = attempts
+                print(f"❌ Conversation write failed for session {key[1]} (attempt {attempts}/{self.max_attempts}): {error}")
+                continue
+            self._attempts.pop(key, None)
+            try:
+                self._dead_letter(grouped[key], error)
+            except Exception as e:
+                # Keep the turns pending (and in the WAL) rather than dropping them
+                print(f"⚠️ Could not dead-letter conversation turns for session {key[1]}: {e}")
+                continue
+            dead.extend(grouped[key])
+            self.dead_lettered += len(grouped[key])
+            print(
+                f"❌ Gave up on {len(grouped[key])} chat turns for session {key[1]} after "
+                f"{attempts} attempts; moved to dead-letter file: {error}"
+            )
+        return dead
+
+    def _dead_letter(self, records: List[_Append], error: Exception) -> None:
+        path = os.path.join(self.wal_dir, "dead-letter.jsonl")
+        failed_at = datetime.utcnow().isoformat()
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(
+                json.dumps({**asdict(r), "error": str(error), "failed_at": failed_at}, default=str) + "\n"
+                for r in records
+            )
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _write(self, grouped: Dict[Tuple[str, str], List[_Append]]) -> set:
+        """One transaction for the given conversations; returns the keys it created."""
+        # Sorted so concurrent writers (other workers) lock conversations in the same order
+        keys = sorted(grouped)
+
+        db = self.session_factory()
+        try:
+            # Create missing conversations first; the unique (botId, sessionId) index makes a
+            # concurrent create by another worker a no-op instead of a duplicate row
+            now = datetime.utcnow()
+            conversations = Conversations.__table__
+            create = (
+                insert(conversations)
+                .on_conflict_do_nothing(index_elements=[conversations.c.botId, conversations.c.sessionId])
+                .returning(conversations.c.botId, conversations.c.sessionId)
+            )
+            created = {
+                (str(bot_id), session_id)
+                for bot_id, session_id in db.execute(create, [
+                    {
+                        "id": uuid.uuid4(),
+                        "sessionId": session_id,
+                        "botId": uuid.UUID(bot_id),
+                        "userId": _user_uuid(grouped[(bot_id, session_id)][0].user_id),
+                        "messages": [],
+                        "createdAt": now,
+                        "updatedAt": now,
+                    }
+                    for bot_id, session_id in keys
+                ])
+            }
+
+            rows = (
+                db.query(Conversations)
+                .filter(tuple_(Conversations.botId, Conversations.sessionId).in_(
+                    [(uuid.UUID(b), s) for b, s in keys]
+                ))
+                .order_by(Conversations.botId, Conversations.sessionId)
+                .with_for_update()
+                .all()
+            )
+            existing = {(str(conv.botId), conv.sessionId): conv for conv in rows}
+
+            for key in keys:
+                conversation = existing[key]
+                # Assign new list so SQLAlchemy persists JSONB changes
+                msg_list = list(conversation.messages) if conversation.messages else []
+                applied = {message_key(m) for m in msg_list}
+                for r in grouped[key]:
+                    if r.messages and message_key(r.messages[0]) in applied:
+                        continue  # already applied (WAL replay after a crash)
+                    msg_list.extend(r.messages)
+                conversation.messages = msg_list
+                conversation.updatedAt = now
+                attributes.flag_modified(conversation, "messages")
+
+            db.commit()
+            return created
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # --------------------------
+    # Lifecycle
+    # --------------------------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self._wal_path = os.path.join(self.wal_dir, f"wal-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self._wal = self._open_wal(self._wal_path)
+        recovered = self._claim_orphans()
+        with self._lock:
+            self._pending[:0] = recovered
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="conversation-writer", daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self.flush() >= self.batch_size:
+                pass
+
+    def stop(self) -> None:
+        """Stop the writer after committing everything it can; leftovers stay in the WAL."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=30.0)
+        while self.flush():
+            pass
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+                if not self._pending and self._wal_path and os.path.exists(self._wal_path):
+                    os.remove(self._wal_path)
+
+
+conversation_writer = ConversationWriter(
+    wal_dir=settings.conversation_wal_path,
+    flush_interval=settings.conversation_flush_interval_seconds,
+    batch_size=settings.conversation_flush_batch_size,
+    fsync=settings.conversation_wal_fsync,
+    max_attempts=settings.conversation_max_write_attempts,
+)
@@ -3,27 +3,17 @@ import shutil
 from typing import List, Dict, Any
 from langchain_community.document_loaders import DirectoryLoader
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from config.settings import settings
+from services.chunking import dense_chunker, sparse_chunker
 
 class DataLoader:
     """Handles loading and processing documents for tenants."""
     
     def __init__(self):
         self.data_path = settings.data_path
-        self.dense_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.dense_chunk_size,
-            chunk_overlap=settings.dense_chunk_overlap,
-            length_function=len,
-            separators=[". ", "\n\n", "\n\n\n", "\n\n\n\n", " ", ""]
-        )
-        self.sparse_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.sparse_chunk_size,
-            chunk_overlap=settings.sparse_chunk_overlap,
-            length_function=len,
-            separators=[". ", "\n\n", "\n\n\n", "\n\n\n\n", " ", ""]
-        )
+        self.dense_splitter = dense_chunker
+        self.sparse_splitter = sparse_chunker
     
     def load_tenant_data(self, tenant_id: str) -> List[Document]:
         """Load documents for a specific tenant."""
@@ -1,10 +1,16 @@
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+import hashlib
 import io
+import os
 import re
+import shutil
+import tempfile
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from config.settings import settings
+from services.chunking import dense_chunker
+from services.extraction_pool import extraction_pool, parse_errors
+from services.extraction_cache import extraction_cache
+from services.llm_client import embedding_model
 
 try:
     import nltk
@@ -17,13 +23,8 @@ class DocumentProcessor:
     """Handles document processing, chunking, and embedding generation."""
 
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(model=settings.embedding_model)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=100,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.embeddings = embedding_model(settings.embedding_model)
+        self.text_splitter = dense_chunker
         self.batch_size = 100  # number of chunks per embedding request
 
     def sanitize_text(self, text: str) -> str:
@@ -87,4 +88,95 @@ class DocumentProcessor:
             print(f"Error extracting file content: {e}")
             return ""
 
+    # --------------------------
+    # Streaming uploads
+    # --------------------------
+    def spool_upload(self, upload_file, chunk_size: int = 1024 * 1024) -> Tuple[str, str]:
+        """
+        Copy an upload's file object to a temp file on disk in fixed-size chunks.
+        Returns (path, sha256 hex of the bytes).
+        """
+        spool_dir = settings.upload_spool_path or None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        suffix = os.path.splitext(getattr(upload_file, "filename", "") or "")[1]
+        upload_file.file.seek(0)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=spool_dir, suffix=suffix, delete=False) as out:
+            while True:
+                chunk = upload_file.file.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+            return out.name, digest.hexdigest()
+
+    def iter_file_text(
+        self,
+        path: str,
+        file_name: str,
+        block_chars: int = 200_000,
+        content_hash: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Yield sanitized text from a file on disk piece by piece: one PDF page at a time,
+        fixed-size blocks for text files, groups of paragraphs for DOCX.
+
+        With `content_hash` (sha256 of the file), results come from / go to the extraction
+        cache, so re-uploading the same file skips parsing.
+        """
+        if content_hash and extraction_cache is not None:
+            kind = self._extraction_kind(file_name)
+            cached = extraction_cache.get(content_hash, kind)
+            if cached is not None:
+                print(f"🟢 Extraction cache hit for {file_name}")
+                return cached
+            return extraction_cache.write_through(
+                content_hash, kind, self._extract_pages(path, file_name, block_chars)
+            )
+        return self._extract_pages(path, file_name, block_chars)
+
+    @staticmethod
+    def _extraction_kind(file_name: str) -> str:
+        name = file_name.lower()
+        if name.endswith('.pdf'):
+            return "pdf"
+        if name.endswith('.docx'):
+            return "docx"
+        return "text"
+
+    def _extract_pages(self, path: str, file_name: str, block_chars: int) -> Iterator[str]:
+        name = file_name.lower()
+        if name.endswith('.pdf'):
+            pages_read = 0
+            try:
+                # Parsed in the extraction process pool, page ranges in parallel
+                for page in extraction_pool.iter_pdf_pages(path):
+                    yield page
+                    pages_read += 1
+                return
+            except parse_errors("pdf") as e:
+                print(f"Error extracting PDF (after {pages_read} pages): {e}")
+                if pages_read:
+                    raise
+                # Not readable as a PDF at all: read it as text, like extract_file_content.
+                # Pool failures (timeouts, crashed workers) propagate instead.
+        elif name.endswith('.docx'):
+            try:
+                blocks = extraction_pool.extract_docx_blocks(path, block_chars)
+            except parse_errors("docx") as e:
+                print(f"Error extracting DOCX: {e}")
+            else:
+                yield from blocks
+                return
+
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            while True:
+                block_text = f.read(block_chars)
+                if not block_text:
+                    return
+                # Extend to the end of the line so blocks don't cut words in half
+                block_text += f.readline()
+                yield self.sanitize_text(block_text)
+
 document_processor = DocumentProcessor()
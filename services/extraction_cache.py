@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Iterable, Iterator, Optional
+
+from config.settings import settings
+
+try:
+    from importlib.metadata import version as _package_version
+except Exception:  # pragma: no cover
+    _package_version = None
+
+
+EXTRACTION_FORMAT = 1
+
+
+def _extractor_version() -> str:
+    """Bump `EXTRACTION_FORMAT` when extraction output changes; parser versions are folded in."""
+    parts = [f"format={EXTRACTION_FORMAT}"]
+    for package in ("pypdf", "python-docx"):
+        try:
+            parts.append(f"{package}={_package_version(package)}")
+        except Exception:
+            parts.append(f"{package}=?")
+    return ";".join(parts)
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted document text, keyed by sha256 of the uploaded bytes, the
+    file kind (pdf/docx/text) and the extractor version. Entries are gzip'd JSON lines,
+    one page (or text block) per line, so hits stream back page by page just like a fresh
+    extraction. Least recently used entries are evicted past `max_bytes`.
+    """
+
+    def __init__(self, *, path: str, max_bytes: int):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max(0, int(max_bytes))
+        self.version = _extractor_version()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, content_hash: str, kind: str) -> str:
+        key = hashlib.sha256(f"{content_hash}|{kind}|{self.version}".encode("utf-8")).hexdigest()
+        return os.path.join(self.path, key[:2], f"{key}.jsonl.gz")
+
+    def get(self, content_hash: str, kind: str) -> Optional[Iterator[str]]:
+        """Pages of a cached extraction, or None on a miss."""
+        path = self._entry_path(content_hash, kind)
+        if not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)  # LRU by mtime
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return self._read(path)
+
+    @staticmethod
+    def _read(path: str) -> Iterator[str]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def write_through(self, content_hash: str, kind: str, pages: Iterable[str]) -> Iterator[str]:
+        """
+        Yield `pages` unchanged while compressing them into a new entry; the entry becomes
+        visible only if the whole iteration completes (a failed extraction is never cached).
+        """
+        path = self._entry_path(content_hash, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        completed = False
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                for page in pages:
+                    f.write(json.dumps(page) + "\n")
+                    yield page
+            completed = True
+        finally:
+            if completed:
+                os.replace(tmp_path, path)
+            else:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        self._evict()
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith(".jsonl.gz"):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        for _mtime, size, full in sorted(entries):
+            try:
+                os.remove(full)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+extraction_cache = (
+    ExtractionCache(
+        path=settings.extraction_cache_path,
+        max_bytes=settings.extraction_cache_max_mb * 1024 * 1024,
+    )
+    if settings.extraction_cache_path
+    else None
+)
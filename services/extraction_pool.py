@@ -0,0 +1,190 @@
+import concurrent.futures
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Optional, Tuple, Type
+
+from config.settings import settings
+
+try:
+    import resource
+except Exception:  # pragma: no cover - not available on Windows
+    resource = None
+
+
+# --------------------------
+# Worker-side functions (run in the child processes; keep them importable and cheap)
+# --------------------------
+def _limit_worker_memory(memory_limit_bytes: int) -> None:
+    if resource is not None and memory_limit_bytes > 0:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Could not set extraction worker memory limit: {e}")
+
+
+def _sanitize(text: str) -> str:
+    return re.sub(r"[\x00]", "", text)
+
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [_sanitize(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def _extract_docx_blocks(path: str, block_chars: int) -> List[str]:
+    from docx import Document as DocxDocument
+    doc = DocxDocument(path)
+    blocks: List[str] = []
+    block: List[str] = []
+    size = 0
+    for p in doc.paragraphs:
+        block.append(p.text)
+        size += len(p.text) + 1
+        if size >= block_chars:
+            blocks.append(_sanitize("\n".join(block)))
+            block, size = [], 0
+    if block:
+        blocks.append(_sanitize("\n".join(block)))
+    return blocks
+
+
+def parse_errors(kind: str) -> Tuple[Type[BaseException], ...]:
+    """Errors meaning the file is not a readable PDF / DOCX (unlike pool or worker failures)."""
+    if kind == "pdf":
+        from pypdf.errors import PdfReadError
+        return (PdfReadError,)
+    if kind == "docx":
+        from docx.opc.exceptions import PackageNotFoundError
+        return (PackageNotFoundError, zipfile.BadZipFile)
+    return ()
+
+
+class ExtractionPool:
+    """
+    Bounded process pool for CPU-heavy document parsing (pypdf, python-docx), so a large
+    PDF never runs on the event loop or holds the GIL of the API process.
+
+    - Large PDFs are split into page ranges parsed in parallel; results are yielded in page
+      order with at most `2 * max_workers` ranges in flight.
+    - Each task has a timeout; a timed-out or crashed pool is torn down (workers killed)
+      and recreated on next use.
+    - Workers run with an address-space limit (`RLIMIT_AS`) and, on Python 3.11+, are
+      recycled after `max_tasks_per_child` tasks (older versions keep workers for the life
+      of the pool). They are started with "spawn": forking a process that runs threads
+      (vector store snapshots, writers, ...) is not safe.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        memory_limit_mb: int = 1024,
+        task_timeout: float = 60.0,
+        pages_per_task: int = 8,
+        max_tasks_per_child: int = 50,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.memory_limit_bytes = max(0, int(memory_limit_mb)) * 1024 * 1024
+        self.task_timeout = float(task_timeout)
+        self.pages_per_task = max(1, int(pages_per_task))
+        self.max_tasks_per_child = max_tasks_per_child or None
+
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                kwargs = {}
+                # `max_tasks_per_child` was added to ProcessPoolExecutor in Python 3.11
+                if sys.version_info >= (3, 11):
+                    kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_limit_worker_memory,
+                    initargs=(self.memory_limit_bytes,),
+                    **kwargs,
+                )
+            return self._executor
+
+    def _reset(self, executor: concurrent.futures.ProcessPoolExecutor) -> None:
+        """Kill a pool whose worker hung or died; the next call starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # ProcessPoolExecutor can't cancel a running task, so stuck workers are terminated.
+        for process in list(getattr(executor, "_processes", {}).values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args, timeout: Optional[float] = None):
+        executor = self._get_executor()
+        future = executor.submit(fn, *args)
+        try:
+            return future.result(timeout=timeout or self.task_timeout)
+        except (concurrent.futures.TimeoutError, BrokenProcessPool):
+            self._reset(executor)
+            raise
+
+    # --------------------------
+    # Public API (blocking; call from a worker thread, not the event loop)
+    # --------------------------
+    def iter_pdf_pages(self, path: str) -> Iterator[str]:
+        """Yield the text of each page of the PDF at `path`, in order."""
+        page_count = self._run(_pdf_page_count, path)
+        executor = self._get_executor()
+        ranges = deque(
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        )
+        in_flight: deque = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * self.max_workers:
+                    start, end = ranges.popleft()
+                    in_flight.append(executor.submit(_extract_pdf_pages, path, start, end))
+                future = in_flight.popleft()
+                try:
+                    pages = future.result(timeout=self.task_timeout)
+                except (concurrent.futures.TimeoutError, BrokenProcessPool):
+                    self._reset(executor)
+                    raise
+                for page in pages:
+                    yield page
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def extract_docx_blocks(self, path: str, block_chars: int = 200_000) -> List[str]:
+        """Paragraph text of the DOCX at `path`, grouped into blocks of ~`block_chars`."""
+        return self._run(_extract_docx_blocks, path, block_chars)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+extraction_pool = ExtractionPool(
+    max_workers=settings.extraction_max_workers or min(4, os.cpu_count() or 1),
+    memory_limit_mb=settings.extraction_worker_memory_mb,
+    task_timeout=settings.extraction_task_timeout_seconds,
+    pages_per_task=settings.extraction_pages_per_task,
+)
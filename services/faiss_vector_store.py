@@ -0,0 +1,485 @@
+import json
+import os
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from services.near_dedup import near_dedup
+from services.pinecone_vector_store import (
+    PineconeVectorStore,
+    _allowed_tenant_ids_from_filter,
+    _sha256_hex,
+)
+from services.sampling import rows_by_key, stratified_sample
+from services.tenant_stats import TenantStatsStore
+from services.vector_math import mmr_select, normalize_rows
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+
+
+INDEX_FILE_NAME = "index.faiss"
+META_FILE_NAME = "meta.json"
+# Original tenant id, for tenants whose directory name is a hash
+TENANT_FILE_NAME = "tenant_id"
+
+
+@dataclass
+class _TenantIndex:
+    index: Any
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    id_set: Set[str] = field(default_factory=set)
+    # Loaded with IO_FLAG_MMAP: fine for search, re-read into memory before mutating.
+    mmapped: bool = False
+    dirty: bool = False
+    # source -> rows, built on first `sample()` and dropped on any mutation
+    source_rows: Optional[Dict[str, List[int]]] = None
+    # Guards the index and the row-aligned lists; searches of different tenants run in parallel
+    lock: Any = field(default_factory=threading.RLock, repr=False)
+
+
+class FaissVectorStore:
+    """
+    Local FAISS-backed vector store with the same Chroma-like interface as
+    `PineconeVectorStore`:
+      - add_documents(docs)
+      - get(where={"tenant_id": ...})
+      - delete(ids=[...])
+      - sample(tenant_id, k)
+      - indexed_ids(tenant_id, ids)
+      - as_retriever(search_type=..., search_kwargs=...).invoke(query)
+
+    Each tenant gets its own HNSW index (inner product over normalized vectors, i.e. cosine)
+    under `index_path/<tenant>/`, next to a JSON file holding chunk ids, text and metadata
+    row-aligned with the index. Index files are mmap-loaded on first use, adds are applied
+    in memory straight away, and a background thread snapshots dirty tenants to disk every
+    `snapshot_interval` seconds (`flush()`/`close()` force a snapshot); snapshots copy under
+    the lock and write outside it. A tenant whose on-disk index and metadata disagree raises
+    instead of being served as empty. With `tenant_stats`, per-tenant counters are updated
+    on every add/delete.
+
+    Locking: the store lock only guards the tenant table (lookups and loads); each tenant's
+    index and rows are guarded by that tenant's own lock, so a query waits only for writes
+    to the tenants it searches. Lock order is store lock, then tenant lock.
+    """
+
+    def __init__(
+        self,
+        *,
+        embeddings: Any,
+        index_path: str,
+        hnsw_m: int = 32,
+        ef_search: int = 64,
+        snapshot_interval: float = 30.0,
+        embedding_batch_size: int = 100,
+        tenant_stats: Optional[TenantStatsStore] = None,
+    ):
+        if faiss is None:
+            raise ImportError(
+                "FAISS is not installed. Add `faiss-cpu` to requirements.txt and reinstall."
+            )
+
+        self.embeddings = embeddings
+        self.index_path = os.path.abspath(index_path)
+        self.hnsw_m = max(4, int(hnsw_m))
+        self.ef_search = max(16, int(ef_search))
+        self.snapshot_interval = float(snapshot_interval)
+        self.embedding_batch_size = max(1, int(embedding_batch_size))
+        self.tenant_stats = tenant_stats
+
+        os.makedirs(self.index_path, exist_ok=True)
+        self._tenants: Dict[str, _TenantIndex] = {}
+        # Tenant directory name -> tenant id (names of ids containing "/" are hashes)
+        self._dir_tenant_ids: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._snapshot_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        if self.snapshot_interval > 0:
+            self._snapshot_thread = threading.Thread(
+                target=self._snapshot_loop, name="faiss-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+
+    # --------------------------
+    # Tenant files / loading
+    # --------------------------
+    def _tenant_dir(self, tenant_id: str) -> str:
+        safe_name = tenant_id if "/" not in tenant_id else _sha256_hex(tenant_id)
+        return os.path.join(self.index_path, safe_name)
+
+    def _new_index(self, dim: int) -> Any:
+        index = faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = self.ef_search
+        return index
+
+    def _load_tenant(self, tenant_id: str) -> Optional[_TenantIndex]:
+        if tenant_id in self._tenants:
+            return self._tenants[tenant_id]
+
+        tenant_dir = self._tenant_dir(tenant_id)
+        index_file = os.path.join(tenant_dir, INDEX_FILE_NAME)
+        meta_file = os.path.join(tenant_dir, META_FILE_NAME)
+        if not (os.path.exists(index_file) and os.path.exists(meta_file)):
+            return None
+
+        index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP)
+        with open(meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        ids = meta.get("ids") or []
+        if index.ntotal != len(ids):
+            # A crash between the index and meta writes. Treating the tenant as empty would let
+            # the next add overwrite the files and drop the corpus, so refuse to serve it
+            # until the files are repaired (or the tenant is rebuilt from its sources).
+            message = (
+                f"FAISS index/meta mismatch for tenant {tenant_id} "
+                f"({index.ntotal} vectors, {len(ids)} chunks in {tenant_dir})"
+            )
+            print(f"❌ {message}; refusing to serve it")
+            raise RuntimeError(message)
+        tenant = _TenantIndex(
+            index=index,
+            ids=ids,
+            documents=meta.get("documents") or [],
+            metadatas=meta.get("metadatas") or [],
+            id_set=set(ids),
+            mmapped=True,
+        )
+        self._tenants[tenant_id] = tenant
+        return tenant
+
+    def _tenant(self, tenant_id: str) -> Optional[_TenantIndex]:
+        with self._lock:
+            return self._load_tenant(tenant_id)
+
+    def _ensure_writable(self, tenant_id: str, tenant: _TenantIndex) -> None:
+        if not tenant.mmapped:
+            return
+        index_file = os.path.join(self._tenant_dir(tenant_id), INDEX_FILE_NAME)
+        tenant.index = faiss.read_index(index_file)
+        tenant.index.hnsw.efSearch = self.ef_search
+        tenant.mmapped = False
+
+    @staticmethod
+    def _tenant_chunks(tenant: _TenantIndex) -> List[Tuple[str, str]]:
+        """(source, text) of every chunk of the tenant (stats backfill)."""
+        return [
+            (str((md or {}).get("source", "unknown")), doc or "")
+            for doc, md in zip(tenant.documents, tenant.metadatas)
+        ]
+
+    def _dir_tenant_id(self, name: str) -> Optional[str]:
+        """Tenant id stored in directory `name` (read once, then cached)."""
+        tenant_id = self._dir_tenant_ids.get(name)
+        if tenant_id is not None:
+            return tenant_id
+        tenant_dir = os.path.join(self.index_path, name)
+        tenant_file = os.path.join(tenant_dir, TENANT_FILE_NAME)
+        if os.path.exists(tenant_file):
+            with open(tenant_file, "r", encoding="utf-8") as f:
+                tenant_id = f.read()
+        else:
+            # Older snapshots: only the chunk metadata carries the id of a hashed directory
+            tenant_id = name
+            if len(name) == 64:
+                with open(os.path.join(tenant_dir, META_FILE_NAME), "r", encoding="utf-8") as f:
+                    metadatas = json.load(f).get("metadatas") or []
+                if metadatas and (metadatas[0] or {}).get("tenant_id"):
+                    tenant_id = str(metadatas[0]["tenant_id"])
+        self._dir_tenant_ids[name] = tenant_id
+        return tenant_id
+
+    def _known_tenant_ids(self) -> Set[str]:
+        out = set(self._tenants.keys())
+        try:
+            for name in os.listdir(self.index_path):
+                if os.path.exists(os.path.join(self.index_path, name, META_FILE_NAME)):
+                    out.add(self._dir_tenant_id(name))
+        except FileNotFoundError:
+            pass
+        return out
+
+    # --------------------------
+    # Snapshots
+    # --------------------------
+    def _write_snapshot(self, tenant_id: str, index_bytes: Any, meta: Dict[str, Any]) -> None:
+        tenant_dir = self._tenant_dir(tenant_id)
+        os.makedirs(tenant_dir, exist_ok=True)
+        index_file = os.path.join(tenant_dir, INDEX_FILE_NAME)
+        meta_file = os.path.join(tenant_dir, META_FILE_NAME)
+
+        with open(index_file + ".tmp", "wb") as f:
+            f.write(index_bytes.tobytes())
+        with open(meta_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        tenant_file = os.path.join(tenant_dir, TENANT_FILE_NAME)
+        if not os.path.exists(tenant_file):
+            with open(tenant_file, "w", encoding="utf-8") as f:
+                f.write(tenant_id)
+        os.replace(index_file + ".tmp", index_file)
+        os.replace(meta_file + ".tmp", meta_file)
+
+    def _snapshot_dirty(self) -> None:
+        # One snapshot at a time (background loop vs flush/close share the .tmp files)
+        with self._snapshot_lock:
+            with self._lock:
+                tenants = list(self._tenants.items())
+            for tenant_id, tenant in tenants:
+                # Serialize under the tenant lock (a memory copy); write to disk outside it so
+                # searches and adds are not blocked by file I/O.
+                with tenant.lock:
+                    if not tenant.dirty:
+                        continue
+                    try:
+                        index_bytes = faiss.serialize_index(tenant.index)
+                    except Exception as e:
+                        print(f"❌ FAISS snapshot failed for tenant {tenant_id}: {e}")
+                        continue
+                    meta = {
+                        "ids": list(tenant.ids),
+                        "documents": list(tenant.documents),
+                        "metadatas": list(tenant.metadatas),
+                    }
+                    tenant.dirty = False
+                try:
+                    self._write_snapshot(tenant_id, index_bytes, meta)
+                except Exception as e:
+                    print(f"❌ FAISS snapshot failed for tenant {tenant_id}: {e}")
+                    with tenant.lock:
+                        tenant.dirty = True
+
+    def _snapshot_loop(self) -> None:
+        while not self._stop.wait(self.snapshot_interval):
+            self._snapshot_dirty()
+
+    def persist(self) -> None:
+        # Called after every add by `RetrievalServiceV2`; snapshots stay on the background
+        # schedule so bulk ingestion doesn't rewrite the index file per source.
+        return
+
+    def flush(self) -> None:
+        self._snapshot_dirty()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._snapshot_dirty()
+
+    # --------------------------
+    # Chroma-like interface
+    # --------------------------
+    def add_documents(self, documents: List[Document]) -> None:
+        if not documents:
+            return
+
+        records_by_tenant: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = {}
+        for doc in documents:
+            tenant_id = str((doc.metadata or {}).get("tenant_id", ""))
+            source = str((doc.metadata or {}).get("source", "unknown"))
+            content = (doc.page_content or "").strip()
+            chunk_id = PineconeVectorStore._make_chunk_id(
+                tenant_id=tenant_id, source=source, content=content
+            )
+            records = records_by_tenant.setdefault(tenant_id, [])
+            if any(r[0] == chunk_id for r in records):
+                continue
+            records.append((chunk_id, content, {"tenant_id": tenant_id, "source": source}))
+
+        for tenant_id, records in list(records_by_tenant.items()):
+            tenant = self._tenant(tenant_id)
+            if tenant is not None:
+                with tenant.lock:
+                    # Same tenant/source/content: already embedded, nothing to do.
+                    records = [r for r in records if r[0] not in tenant.id_set]
+            if records:
+                records_by_tenant[tenant_id] = records
+            else:
+                del records_by_tenant[tenant_id]
+
+        # Embed outside the lock; only index mutation needs it.
+        for tenant_id, records in records_by_tenant.items():
+            texts = [r[1] for r in records]
+            vectors: List[List[float]] = []
+            for i in range(0, len(texts), self.embedding_batch_size):
+                vectors.extend(self.embeddings.embed_documents(texts[i : i + self.embedding_batch_size]))
+            mat = normalize_rows(vectors)
+
+            with self._lock:
+                tenant = self._load_tenant(tenant_id)
+                if tenant is None:
+                    tenant = _TenantIndex(index=self._new_index(mat.shape[1]))
+                    self._tenants[tenant_id] = tenant
+            with tenant.lock:
+                self._ensure_writable(tenant_id, tenant)
+
+                keep_rows: List[int] = []
+                for row, (chunk_id, _content, _md) in enumerate(records):
+                    if chunk_id not in tenant.id_set:
+                        keep_rows.append(row)
+                if not keep_rows:
+                    continue
+
+                tenant.index.add(mat[keep_rows])
+                for row in keep_rows:
+                    chunk_id, content, md = records[row]
+                    tenant.ids.append(chunk_id)
+                    tenant.documents.append(content)
+                    tenant.metadatas.append(md)
+                    tenant.id_set.add(chunk_id)
+                tenant.dirty = True
+                tenant.source_rows = None
+                if self.tenant_stats is not None:
+                    self.tenant_stats.apply(
+                        tenant_id,
+                        added=[(records[row][2]["source"], records[row][1]) for row in keep_rows],
+                        current=lambda t=tenant: self._tenant_chunks(t),
+                    )
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+
+        ids_set = set(ids)
+        tenants = {PineconeVectorStore._tenant_id_from_chunk_id(cid) for cid in ids}
+        for tenant_id in tenants:
+            tenant = self._tenant(tenant_id)
+            if tenant is None:
+                continue
+            with tenant.lock:
+                keep_rows = [i for i, cid in enumerate(tenant.ids) if cid not in ids_set]
+                if len(keep_rows) == len(tenant.ids):
+                    continue
+
+                # HNSW has no removal; rebuild from the stored vectors of the surviving rows.
+                dim = tenant.index.d
+                new_index = self._new_index(dim)
+                if keep_rows:
+                    all_vectors = tenant.index.reconstruct_n(0, tenant.index.ntotal)
+                    new_index.add(np.ascontiguousarray(all_vectors[keep_rows]))
+
+                keep_set = set(keep_rows)
+                removed = [
+                    (str((tenant.metadatas[i] or {}).get("source", "unknown")), tenant.documents[i])
+                    for i in range(len(tenant.ids))
+                    if i not in keep_set
+                ]
+                tenant.index = new_index
+                tenant.mmapped = False
+                tenant.ids = [tenant.ids[i] for i in keep_rows]
+                tenant.documents = [tenant.documents[i] for i in keep_rows]
+                tenant.metadatas = [tenant.metadatas[i] for i in keep_rows]
+                tenant.id_set = set(tenant.ids)
+                tenant.dirty = True
+                tenant.source_rows = None
+                if self.tenant_stats is not None:
+                    self.tenant_stats.apply(tenant_id, removed=removed, current=lambda t=tenant: self._tenant_chunks(t))
+
+    def indexed_ids(self, tenant_id: str, ids: List[str]) -> Set[str]:
+        """Those of `ids` already stored for the tenant."""
+        tenant = self._tenant(str(tenant_id))
+        if tenant is None:
+            return set()
+        with tenant.lock:
+            return {cid for cid in ids if cid in tenant.id_set}
+
+    def get(self, *, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        tenant_id = None
+        if where and isinstance(where, dict):
+            tenant_id = where.get("tenant_id")
+        tenant_id_str = str(tenant_id) if tenant_id is not None else ""
+        tenant = self._tenant(tenant_id_str) if tenant_id_str else None
+        if tenant is None:
+            return {"ids": [], "documents": [], "metadatas": []}
+        with tenant.lock:
+            return {
+                "ids": list(tenant.ids),
+                "documents": list(tenant.documents),
+                "metadatas": list(tenant.metadatas),
+            }
+
+    def sample(self, tenant_id: str, k: int, seed: Optional[int] = None) -> Dict[str, Any]:
+        """Up to `k` of the tenant's chunks, stratified by source, in the shape of `get()`."""
+        tenant = self._tenant(str(tenant_id))
+        if tenant is None:
+            return {"ids": [], "documents": [], "metadatas": []}
+        with tenant.lock:
+            if tenant.source_rows is None:
+                tenant.source_rows = rows_by_key(tenant.metadatas)
+            rows = sorted(stratified_sample(tenant.source_rows, k, random.Random(seed)))
+            return {
+                "ids": [tenant.ids[i] for i in rows],
+                "documents": [tenant.documents[i] for i in rows],
+                "metadatas": [tenant.metadatas[i] for i in rows],
+            }
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[Dict[str, Any]] = None) -> Any:
+        search_kwargs = search_kwargs or {}
+        return _FaissRetriever(store=self, search_type=search_type, search_kwargs=search_kwargs)
+
+
+class _FaissRetriever:
+    def __init__(self, *, store: FaissVectorStore, search_type: str, search_kwargs: Dict[str, Any]):
+        self.store = store
+        self.search_type = search_type
+        self.search_kwargs = search_kwargs
+
+    def invoke(self, query: str) -> List[Document]:
+        k = int(self.search_kwargs.get("k", 4))
+        fetch_k = max(k, int(self.search_kwargs.get("fetch_k", k)))
+        lambda_mult = float(self.search_kwargs.get("lambda_mult", 0.5))
+        allowed_tenants = _allowed_tenant_ids_from_filter(self.search_kwargs.get("filter"))
+
+        query_vec = normalize_rows(self.store.embeddings.embed_query(query))
+
+        with self.store._lock:
+            tenant_ids = allowed_tenants if allowed_tenants is not None else self.store._known_tenant_ids()
+            tenants = [(tenant_id, self.store._load_tenant(tenant_id)) for tenant_id in tenant_ids]
+
+        # (score, tenant_id, text, metadata, vector); each tenant is searched under its own lock
+        candidates: List[Tuple[float, str, str, Dict[str, Any], Any]] = []
+        for tenant_id, tenant in tenants:
+            if tenant is None:
+                continue
+            with tenant.lock:
+                if tenant.index.ntotal == 0:
+                    continue
+                tenant.index.hnsw.efSearch = max(self.store.ef_search, fetch_k)
+                scores, rows = tenant.index.search(query_vec, min(fetch_k, tenant.index.ntotal))
+                for score, row in zip(scores[0], rows[0]):
+                    if row < 0:
+                        continue
+                    vec = tenant.index.reconstruct(int(row)) if self.search_type == "mmr" else None
+                    candidates.append(
+                        (float(score), tenant_id, tenant.documents[row], tenant.metadatas[row], vec)
+                    )
+
+        if not candidates:
+            return []
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:fetch_k]
+        # Collapse near-duplicate chunks (templated boilerplate) before MMR
+        keep = near_dedup.collapse_indices([c[2] for c in candidates])
+        candidates = [candidates[i] for i in keep]
+
+        if self.search_type == "mmr":
+            picked = mmr_select(query_vec[0], np.stack([c[4] for c in candidates]), k, lambda_mult)
+            selected = [candidates[i] for i in picked]
+        else:
+            selected = candidates[:k]
+
+        out_docs: List[Document] = []
+        for score, tenant_id, text, metadata, _vec in selected:
+            md = dict(metadata or {})
+            md.setdefault("tenant_id", tenant_id)
+            md["relevance_score"] = score
+            out_docs.append(Document(page_content=text, metadata=md))
+        return out_docs
@@ -0,0 +1,80 @@
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+from services.intent import Intent
+
+# Reply templates by tone style
+_TEMPLATES: Dict[str, Dict[str, str]] = {
+    "formal": {
+        "greeting": "Good day. I can assist with questions based on the information we have on file. How may I help you?",
+        "thanks": "You are welcome. Please let me know if there is anything else I can assist you with.",
+    },
+    "casual": {
+        "greeting": "Hey there! Ask me anything about what we have on file and I'll help you out.",
+        "thanks": "Anytime! Anything else you want to know?",
+    },
+    "friendly": {
+        "greeting": (
+            "Hello! I can help with questions about our services, contact details, and other topics "
+            "from the information we have on file. What would you like to know?"
+        ),
+        "thanks": "You're welcome! Is there anything else I can help you with?",
+    },
+}
+_NO_KNOWLEDGE = (
+    "Hello! There are no knowledge sources loaded for this assistant yet, "
+    "so I can't answer detailed questions. Once your team adds website pages or documents, "
+    "I'll be able to help from that content."
+)
+# Tone words (from `bots.config.tone`) that pick a template style; first match wins
+_STYLE_WORDS = (
+    ("formal", ("formal", "corporate", "professional", "polite", "respectful", "serious")),
+    ("casual", ("casual", "playful", "fun", "relaxed", "witty", "informal", "humorous")),
+)
+
+
+def tone_style(tone: Optional[str]) -> str:
+    t = (tone or "").lower()
+    for style, words in _STYLE_WORDS:
+        if any(w in t for w in words):
+            return style
+    return "friendly"
+
+
+@lru_cache(maxsize=4096)
+def _render(kind: str, tone: Optional[str], has_knowledge: bool) -> str:
+    if kind == "greeting" and not has_knowledge:
+        return _NO_KNOWLEDGE
+    return _TEMPLATES[tone_style(tone)][kind]
+
+
+class SmallTalkResponder:
+    """
+    Instant replies to greetings and thanks, without retrieval or an LLM call.
+
+    Replies come from templates matching the bot's configured tone (`bots.config`), rendered
+    once per (tone, knowledge present) and cached; callers attach the tenant's stored
+    suggestions. Anything that isn't pure small talk (see services/intent.py) returns None
+    and takes the normal path.
+    """
+
+    def __init__(self, *, enabled: bool = True):
+        self.enabled = enabled
+
+    def applies(self, intent: Intent) -> bool:
+        return self.enabled and intent.greeting
+
+    def reply(self, intent: Intent, behavior: Dict[str, Any] | None, has_knowledge: bool) -> Optional[str]:
+        if not self.applies(intent):
+            return None
+        return self.template(intent, behavior, has_knowledge)
+
+    def template(self, intent: Intent, behavior: Dict[str, Any] | None, has_knowledge: bool) -> str:
+        """The template reply for `intent`, also when the fast path is disabled."""
+        behavior = behavior or {}
+        kind = "thanks" if intent.thanks else "greeting"
+        return _render(kind, behavior.get("tone"), bool(has_knowledge))
+
+
+small_talk = SmallTalkResponder(enabled=settings.small_talk_fast_path_enabled)
@@ -0,0 +1,128 @@
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from database.models import KnowledgeSources, SourceImages
+from services.image_ranker import embed_image_texts
+
+
+class SourceImageIndex:
+    """
+    Images found on scraped pages, one `source_images` row per image. Written at ingestion
+    time so answering "show me a picture" only reads (url, alt, title) rows instead of
+    whole `knowledge_sources` rows with their page text.
+
+    Each row also stores an embedding of the image's alt/title/filename text (see
+    services/image_ranker.py), computed once here so ranking images for an answer needs no
+    per-request LLM call.
+    """
+
+    def set_source_images(
+        self,
+        db: Session,
+        source: KnowledgeSources,
+        images: Sequence[Dict[str, Any]],
+        embeddings=None,
+    ) -> int:
+        """
+        Replace the indexed images of `source` (caller commits). Returns how many were stored.
+        With `embeddings`, their text vectors are stored too (otherwise filled in on first lookup).
+        """
+        db.query(SourceImages).filter(SourceImages.source_id == source.source_id).delete(synchronize_session=False)
+        if not source.source_url:
+            return 0
+
+        seen_urls: set = set()
+        rows: List[SourceImages] = []
+        for img in images or []:
+            if not isinstance(img, dict) or not img.get("url") or img["url"] in seen_urls:
+                continue
+            seen_urls.add(img["url"])
+            rows.append(SourceImages(
+                source_id=source.source_id,
+                tenant_id=source.tenant_id,
+                source_url=source.source_url,
+                url=img["url"],
+                alt=img.get("alt") or "",
+                title=img.get("title") or None,
+                position=len(rows),
+            ))
+        if embeddings is not None and rows:
+            try:
+                vectors = embed_image_texts(
+                    [{"url": r.url, "alt": r.alt, "title": r.title} for r in rows], embeddings
+                )
+                for row, vec in zip(rows, vectors):
+                    row.embedding = vec
+            except Exception as e:
+                print(f"Warning: image embeddings for {source.source_url} deferred to first lookup: {e}")
+        db.add_all(rows)
+        return len(rows)
+
+    def lookup(
+        self,
+        db: Session,
+        tenant_id: str,
+        source_urls: Sequence[str],
+        embeddings=None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Images for the given sources, in `source_urls` order then page order, deduplicated by URL.
+        With `embeddings`, rows stored without a text vector (older rows, failed ingestion
+        embeds) get one now, saved for later lookups.
+        """
+        if not source_urls:
+            return []
+        rows = (
+            db.query(
+                SourceImages.id, SourceImages.source_url, SourceImages.url,
+                SourceImages.alt, SourceImages.title, SourceImages.embedding,
+            )
+            .filter(
+                SourceImages.tenant_id == tenant_id,
+                SourceImages.source_url.in_(list(source_urls)),
+            )
+            .order_by(SourceImages.position)
+            .all()
+        )
+        rank = {url: i for i, url in enumerate(source_urls)}
+        rows.sort(key=lambda r: rank.get(r.source_url, len(rank)))
+
+        images: List[Dict[str, Any]] = []
+        seen_urls: set = set()
+        for row in rows:
+            if row.url in seen_urls:
+                continue
+            seen_urls.add(row.url)
+            images.append({
+                "id": row.id, "url": row.url, "alt": row.alt or "", "title": row.title, "embedding": row.embedding,
+                "source_url": row.source_url,
+            })
+        if embeddings is not None:
+            self._backfill_embeddings(db, [img for img in images if img["embedding"] is None], embeddings)
+        return images
+
+    def _backfill_embeddings(self, db: Session, images: List[Dict[str, Any]], embeddings) -> None:
+        if not images:
+            return
+        try:
+            vectors = embed_image_texts(images, embeddings)
+            params = []
+            for img, vec in zip(images, vectors):
+                img["embedding"] = vec
+                if vec is not None:
+                    params.append({"i_id": img["id"], "i_embedding": vec})
+            if params:
+                table = SourceImages.__table__
+                db.execute(
+                    update(table).where(table.c.id == bindparam("i_id")).values(embedding=bindparam("i_embedding")),
+                    params,
+                )
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: image embedding backfill failed: {e}")
+
+
+image_index = SourceImageIndex()
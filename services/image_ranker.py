@@ -0,0 +1,113 @@
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+
+from config.settings import settings
+from services.vector_math import normalize_rows
+
+_FILENAME_SPLIT = re.compile(r"[-_.+\s]+")
+# Filename tokens that describe the file, not the picture (IMG_1234, 300x200, scaled, hashes)
+_FILENAME_NOISE = re.compile(r"^(\d+|\d+x\d+|[0-9a-f]{8,}|img|image|dsc|pic|photo|scaled|thumb|thumbnail|large|small|medium|copy|final|web)$", re.I)
+_IMAGE_EXTENSIONS = re.compile(r"\.(jpe?g|png|gif|webp|svg|avif|bmp|tiff?)$", re.I)
+
+
+def image_text(img: Dict[str, Any]) -> str:
+    """What we know about an image without looking at it: alt, title and filename words."""
+    path = unquote(urlparse(img.get("url") or "").path)
+    name = _IMAGE_EXTENSIONS.sub("", path.rsplit("/", 1)[-1])
+    words = [w for w in _FILENAME_SPLIT.split(name) if w and not _FILENAME_NOISE.match(w)]
+    parts = [(img.get("alt") or "").strip(), (img.get("title") or "").strip(), " ".join(words)]
+    return " | ".join(p for p in parts if p)
+
+
+def encode_vector(vec: Sequence[float]) -> bytes:
+    """Unit-norm float16 bytes for `source_images.embedding` (3 KB for 1536 dims)."""
+    return normalize_rows(vec)[0].astype(np.float16).tobytes()
+
+
+def decode_vector(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    if not blob:
+        return None
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+
+def embed_image_texts(images: Sequence[Dict[str, Any]], embeddings) -> List[Optional[bytes]]:
+    """Encoded vectors for `images` (one embedding call); None for images with no usable text."""
+    texts = [image_text(img) for img in images]
+    todo = [i for i, t in enumerate(texts) if t]
+    out: List[Optional[bytes]] = [None] * len(images)
+    if todo:
+        vectors = embeddings.embed_documents([texts[i] for i in todo])
+        for i, vec in zip(todo, vectors):
+            out[i] = encode_vector(vec)
+    return out
+
+
+class ImageRanker:
+    """
+    Ranks candidate images for an answer by cosine similarity between their stored
+    alt/title/filename vector and the embedding of question + answer.
+
+    Images scoring at least `min_similarity` are matches. Scores within `tie_margin` of the
+    threshold are ambiguous; callers may settle those with the LLM (opt-in), otherwise the
+    threshold alone decides.
+
+    Images with no alt, title or usable filename have no vector. They take the relevance
+    of the page they come from (`source_scores`: best chunk score per source of the
+    answer), or sit exactly at the threshold when that is unknown, so a picture-only page
+    the answer cites can still supply images (settled by the LLM when the tie-break is on).
+    """
+
+    def __init__(self, *, min_similarity: float, tie_margin: float):
+        self.min_similarity = min_similarity
+        self.tie_margin = max(0.0, tie_margin)
+
+    def score(
+        self,
+        question: str,
+        answer: str,
+        images: Sequence[Dict[str, Any]],
+        embeddings,
+        source_scores: Optional[Dict[str, float]] = None,
+    ) -> List[float]:
+        """Similarity per image (same order); images without a usable vector get their source's score."""
+        query = f"{question[:300]}\n{answer[:600]}".strip()
+        query_vec = normalize_rows(embeddings.embed_query(query))[0]
+        scores = []
+        for img in images:
+            vec = decode_vector(img.get("embedding"))
+            if vec is None or vec.shape[0] != query_vec.shape[0]:
+                scores.append(self.source_score(img, source_scores))
+                continue
+            scores.append(float(vec @ query_vec))
+        return scores
+
+    def source_score(self, img: Dict[str, Any], source_scores: Optional[Dict[str, float]]) -> float:
+        score = (source_scores or {}).get(img.get("source_url") or "")
+        return float(score) if isinstance(score, (int, float)) else self.min_similarity
+
+    def rank(
+        self,
+        question: str,
+        answer: str,
+        images: Sequence[Dict[str, Any]],
+        embeddings,
+        source_scores: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """(image, score) pairs, best first."""
+        scores = self.score(question, answer, images, embeddings, source_scores)
+        return sorted(zip(images, scores), key=lambda p: -p[1])
+
+    def is_match(self, score: float) -> bool:
+        return score >= self.min_similarity
+
+    def is_ambiguous(self, score: float) -> bool:
+        return abs(score - self.min_similarity) < self.tie_margin
+
+
+image_ranker = ImageRanker(
+    min_similarity=settings.image_min_similarity,
+    tie_margin=settings.image_tie_margin,
+)
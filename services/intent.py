@@ -0,0 +1,152 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, Mapping, Tuple
+
+# Recommended max question length for best results; longer questions get a friendly hint
+MAX_RECOMMENDED_QUESTION_LENGTH = 400
+# Longer messages are never treated as greetings
+MAX_GREETING_LENGTH = 72
+
+# Keyword phrase -> labels it contributes. Matched at word starts, so "images" hits "image"
+# and "photography" hits "photo". Multi-word phrases match across any whitespace.
+KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    **{w: ("image_word",) for w in (
+        "image", "photo", "picture", "visual", "diagram", "screenshot", "illustration",
+        "graphic", "chart",
+    )},
+    "what does": ("what_does",),
+    "how does": ("how_does",),
+    "look like": ("look", "look_like"),
+    "look": ("look",),
+}
+
+# Like KEYWORDS, but only whole words match ("yo" must not hit "you")
+WHOLE_WORD_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    **{w: ("hello_word",) for w in (
+        "hi", "hello", "hey", "hiya", "howdy", "yo", "sup", "greeting", "greetings", "namaste",
+        "morning", "afternoon", "evening", "day",
+    )},
+    **{w: ("thanks_word",) for w in ("thanks", "thank", "thx", "cheers")},
+}
+
+# A short message made only of these words (1-5 of them) is small talk: label "small_talk"
+SMALL_TALK_WORDS = (
+    "hi", "hello", "hey", "hiya", "howdy", "yo", "sup", "greeting", "greetings", "namaste",
+    "good", "morning", "afternoon", "evening", "day", "there", "dear", "thanks", "thank", "you",
+    "thx", "cheers", "so", "much", "very", "a", "lot", "how", "are",
+)
+_SMALL_TALK = re.compile(
+    r"\W*(?:(?:" + "|".join(sorted(SMALL_TALK_WORDS, key=len, reverse=True)) + r")\b\W*){1,5}"
+)
+
+
+@dataclass(frozen=True)
+class Scan:
+    """One pass over a message: keyword labels found and its length."""
+    labels: FrozenSet[str]
+    chars: int
+
+
+def _greeting(s: Scan) -> bool:
+    # Small talk with an actual hello / thanks in it ("so much" alone is not a greeting)
+    return "small_talk" in s.labels and ("hello_word" in s.labels or "thanks_word" in s.labels)
+
+
+def _thanks(s: Scan) -> bool:
+    return "small_talk" in s.labels and "thanks_word" in s.labels
+
+
+def _image_request(s: Scan) -> bool:
+    return "image_word" in s.labels or (
+        "look" in s.labels and ("how_does" in s.labels or ("what_does" in s.labels and "look_like" in s.labels))
+    )
+
+
+# Intent name -> rule over the scan. New intents add keywords + a rule, not another pass.
+RULES: Dict[str, Callable[[Scan], bool]] = {
+    "greeting": _greeting,
+    "thanks": _thanks,
+    "image_request": _image_request,
+    "long_question": lambda s: s.chars > MAX_RECOMMENDED_QUESTION_LENGTH,
+}
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Intents detected in a user message (see `IntentClassifier`)."""
+    intents: FrozenSet[str]
+    scan: Scan
+
+    def has(self, name: str) -> bool:
+        return name in self.intents
+
+    @property
+    def greeting(self) -> bool:
+        return "greeting" in self.intents
+
+    @property
+    def thanks(self) -> bool:
+        return "thanks" in self.intents
+
+    @property
+    def image_request(self) -> bool:
+        return "image_request" in self.intents
+
+    @property
+    def long_question(self) -> bool:
+        return "long_question" in self.intents
+
+
+class IntentClassifier:
+    """
+    Rule-based intents of a user message from a single regex pass.
+
+    All keyword phrases are compiled into one alternation anchored at word starts (longest
+    phrase first; whole-word keywords also anchored at the word end), so one `findall`
+    yields every keyword label; messages short enough to be small talk get one more
+    anchored match. Every rule in `rules` is evaluated on that `Scan`. Results are
+    memoized per message text.
+    """
+
+    def __init__(
+        self,
+        keywords: Mapping[str, Iterable[str]] = KEYWORDS,
+        rules: Mapping[str, Callable[[Scan], bool]] = RULES,
+        whole_word_keywords: Mapping[str, Iterable[str]] = WHOLE_WORD_KEYWORDS,
+        cache_size: int = 4096,
+    ):
+        whole = {" ".join(k.lower().split()) for k in whole_word_keywords}
+        self.keywords = {
+            " ".join(k.lower().split()): tuple(v)
+            for k, v in list(keywords.items()) + list(whole_word_keywords.items())
+        }
+        self.rules = dict(rules)
+        phrases = sorted(self.keywords, key=len, reverse=True)
+        alternation = "|".join(
+            r"\s+".join(map(re.escape, p.split())) + (r"\b" if p in whole else "") for p in phrases
+        )
+        self._pattern = re.compile(rf"\b(?:{alternation})")
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def scan(self, text: str) -> Scan:
+        lower = text.lower()
+        labels = set()
+        for phrase in set(self._pattern.findall(lower)):
+            found = self.keywords.get(phrase)
+            labels.update(found if found is not None else self.keywords[" ".join(phrase.split())])
+        if len(text) <= MAX_GREETING_LENGTH and _SMALL_TALK.fullmatch(lower):
+            labels.add("small_talk")
+        return Scan(frozenset(labels), len(text))
+
+    def _classify(self, text: str) -> Intent:
+        scan = self.scan((text or "").strip())
+        return Intent(frozenset(name for name, rule in self.rules.items() if rule(scan)), scan)
+
+
+intent_classifier = IntentClassifier()
+
+
+def classify_intent(text: str) -> Intent:
+    """Cached intent record for a user message."""
+    return intent_classifier.classify(text or "")
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import openai
+from langchain.schema import BaseMessage
+from langchain_core.embeddings import Embeddings
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from config.settings import settings
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    _HTTP2 = True
+except Exception:  # pragma: no cover
+    _HTTP2 = False
+
+
+# --------------------------
+# Shared HTTP pool
+# --------------------------
+_pool_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_openai_client: Optional[openai.OpenAI] = None
+
+
+def shared_openai_client() -> openai.OpenAI:
+    """One OpenAI client per process over a keep-alive (HTTP/2 when `h2` is installed) pool."""
+    global _http_client, _openai_client
+    with _pool_lock:
+        if _openai_client is None:
+            _http_client = httpx.Client(
+                http2=_HTTP2 and settings.llm_http2,
+                limits=httpx.Limits(
+                    max_connections=settings.llm_max_connections,
+                    max_keepalive_connections=settings.llm_max_keepalive_connections,
+                    keepalive_expiry=60.0,
+                ),
+                timeout=httpx.Timeout(settings.llm_request_timeout_seconds, connect=10.0),
+            )
+            _openai_client = openai.OpenAI(api_key=settings.openai_api_key or None, http_client=_http_client)
+        return _openai_client
+
+
+def close_shared_client() -> None:
+    global _http_client, _openai_client
+    with _pool_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = None
+        _openai_client = None
+
+
+# --------------------------
+# Single-flight + per-model limits
+# --------------------------
+def _model_limits(spec: str) -> Dict[str, int]:
+    """Parse "gpt-4o-mini=8,text-embedding-3-small=16" into {model: limit}."""
+    limits: Dict[str, int] = {}
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip().isdigit():
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls: while a call for `key` is in flight, other callers
+    with the same key wait for its result (or exception) instead of starting their own.
+    Upstream calls are capped per model by a semaphore (`model_limits`, else `default_limit`).
+    """
+
+    def __init__(self, *, model_limits: Dict[str, int], default_limit: int):
+        self.model_limits = dict(model_limits)
+        self.default_limit = max(1, int(default_limit))
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _model(self, model: str) -> Dict[str, int]:
+        if model not in self._stats:
+            self._stats[model] = {"calls": 0, "coalesced": 0, "failed": 0, "active": 0}
+            self._semaphores[model] = threading.BoundedSemaphore(self.model_limits.get(model, self.default_limit))
+        return self._stats[model]
+
+    def do(self, model: str, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            stats = self._model(model)
+            future = self._in_flight.get(key)
+            if future is not None:
+                stats["coalesced"] += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+        if not leader:
+            return future.result()
+
+        try:
+            with self._semaphores[model]:
+                with self._lock:
+                    stats["calls"] += 1
+                    stats["active"] += 1
+                try:
+                    result = fn()
+                finally:
+                    with self._lock:
+                        stats["active"] -= 1
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            with self._lock:
+                stats["failed"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "http2": _HTTP2 and settings.llm_http2,
+                "models": {
+                    m: {**s, "limit": self.model_limits.get(m, self.default_limit)} for m, s in self._stats.items()
+                },
+            }
+
+
+single_flight = SingleFlight(
+    model_limits=_model_limits(settings.llm_model_concurrency),
+    default_limit=settings.llm_default_concurrency,
+)
+
+
+def _key(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _prompt_payload(prompt: Any) -> Any:
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return [(m.type, m.content) if isinstance(m, BaseMessage) else m for m in prompt]
+    return repr(prompt)
+
+
+# --------------------------
+# Wrapped clients
+# --------------------------
+class CoalescingChatModel:
+    """`ChatOpenAI` whose `invoke` goes through `single_flight`; other attributes pass through."""
+
+    def __init__(self, llm: ChatOpenAI):
+        self.llm = llm
+
+    def invoke(self, prompt: Any, **kwargs: Any):
+        key = _key("chat", self.llm.model_name, self.llm.temperature, _prompt_payload(prompt), kwargs)
+        return single_flight.do(self.llm.model_name, key, lambda: self.llm.invoke(prompt, **kwargs))
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+
+class CoalescingEmbeddings(Embeddings):
+    """`OpenAIEmbeddings` behind `single_flight` (async methods run the sync path in a thread)."""
+
+    def __init__(self, embeddings: OpenAIEmbeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        model = self.embeddings.model
+        return single_flight.do(
+            model, _key("embed", model, list(texts)), lambda: self.embeddings.embed_documents(texts)
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        model = self.embeddings.model
+        return single_flight.do(model, _key("query", model, text), lambda: self.embeddings.embed_query(text))
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+
+def chat_model(model: str, temperature: float) -> CoalescingChatModel:
+    client = shared_openai_client()
+    return CoalescingChatModel(ChatOpenAI(model=model, temperature=temperature, client=client.chat.completions))
+
+
+def embedding_model(model: str) -> CoalescingEmbeddings:
+    client = shared_openai_client()
+    return CoalescingEmbeddings(OpenAIEmbeddings(model=model, client=client.embeddings))
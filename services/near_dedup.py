@@ -0,0 +1,220 @@
+import hashlib
+import re
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from config.settings import settings
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=50_000)
+def simhash(text: str, shingle_words: int = 3) -> Optional[int]:
+    """64-bit SimHash over word shingles; None for text too short to fingerprint reliably."""
+    words = _WORD.findall(text.lower())
+    if len(words) < settings.near_dedup_min_words:
+        return None
+    shingles = {" ".join(words[i:i + shingle_words]) for i in range(max(1, len(words) - shingle_words + 1))}
+    digests = b"".join(
+        hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles
+    )
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(shingles), 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int32)
+    packed = np.packbits(votes * 2 > len(shingles))
+    return int.from_bytes(packed.tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """
+    Lookup of fingerprints within `max_distance` bits. The 64 bits are split into
+    `max_distance + 1` bands; two fingerprints that close always agree on at least one
+    whole band, so band buckets find every candidate.
+    """
+
+    def __init__(self, max_distance: int = 6):
+        self.max_distance = max(0, min(int(max_distance), 15))
+        self._band_count = self.max_distance + 1
+        self._band_bits = 64 // self._band_count
+        self._band_mask = (1 << self._band_bits) - 1
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(self._band_count)]
+        self.size = 0
+
+    def _keys(self, fp: int):
+        return ((fp >> (band * self._band_bits)) & self._band_mask for band in range(self._band_count))
+
+    def find(self, fp: int) -> Optional[int]:
+        for buckets, key in zip(self._bands, self._keys(fp)):
+            for other in buckets.get(key, ()):
+                if hamming(fp, other) <= self.max_distance:
+                    return other
+        return None
+
+    def add(self, fp: int) -> None:
+        for buckets, key in zip(self._bands, self._keys(fp)):
+            buckets.setdefault(key, []).append(fp)
+        self.size += 1
+
+    def remove(self, fp: int) -> None:
+        for buckets, key in zip(self._bands, self._keys(fp)):
+            bucket = buckets.get(key)
+            if bucket and fp in bucket:
+                bucket.remove(fp)
+                if not bucket:
+                    del buckets[key]
+        self.size -= 1
+
+
+class _TenantFingerprints:
+    """A tenant's fingerprint index plus, per fingerprint, the sources whose chunks carry it."""
+
+    def __init__(self, max_distance: int):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.index = SimHashIndex(max_distance)
+        self.sources: Dict[int, Set[str]] = {}
+
+    def reset(self) -> None:
+        self.index = SimHashIndex(self.index.max_distance)
+        self.sources = {}
+
+    def claim(self, fp: int, source: str) -> bool:
+        """Record that `source` has a chunk with `fp`; True if the chunk is new to the tenant."""
+        match = self.index.find(fp)
+        if match is not None:
+            self.sources[match].add(source)
+            return False
+        self.index.add(fp)
+        self.sources[fp] = {source}
+        return True
+
+    def release(self, source: str) -> None:
+        for fp in [fp for fp, owners in self.sources.items() if source in owners]:
+            owners = self.sources[fp]
+            owners.discard(source)
+            if not owners:
+                del self.sources[fp]
+                self.index.remove(fp)
+
+
+class NearDuplicateDetector:
+    """
+    SimHash near-duplicate detection for chunks.
+
+    - Ingestion (`filter_new`): chunks that near-duplicate an indexed chunk of the tenant,
+      or an earlier chunk of the batch, are skipped (templated footers, nav and boilerplate
+      repeated across the pages of a site crawl or inside one file). Exact re-uploads are
+      excluded by the caller beforehand (the stores dedupe by content-hash id). Each
+      fingerprint remembers every source that had a chunk with it, indexed or skipped;
+      `forget_source` drops a source from those sets, and a fingerprint is only forgotten
+      once no source that contained it is left.
+    - Query time (`collapse`): among ranked candidates, later near-duplicates of a kept
+      candidate are removed, so the MMR pool / prompt gets distinct evidence.
+
+    The per-tenant index is built lazily from the tenant's stored chunks under that
+    tenant's lock, so building one tenant never blocks ingest for another. Chunks shorter
+    than `near_dedup_min_words` words are left alone (exact dedupe only).
+    """
+
+    def __init__(self, *, max_distance: int = 6, enabled: bool = True):
+        self.max_distance = max_distance
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._tenants: Dict[str, _TenantFingerprints] = {}
+        self._stats = {"ingest_checked": 0, "ingest_skipped": 0, "query_checked": 0, "query_collapsed": 0}
+
+    def _tenant(self, tenant_id: str) -> _TenantFingerprints:
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                tenant = self._tenants[tenant_id] = _TenantFingerprints(self.max_distance)
+            return tenant
+
+    def filter_new(
+        self,
+        tenant_id: str,
+        chunks: Sequence[Document],
+        load_existing: Callable[[], Iterable[Tuple[str, str]]],
+    ) -> List[Document]:
+        """Chunks worth indexing for `tenant_id`; `load_existing` yields (source, text) of stored chunks."""
+        if not self.enabled or not chunks:
+            return list(chunks)
+        kept: List[Document] = []
+        tenant = self._tenant(str(tenant_id))
+        with tenant.lock:
+            if not tenant.loaded:
+                try:
+                    for source, text in load_existing():
+                        fp = simhash((text or "").strip())
+                        if fp is not None:
+                            tenant.claim(fp, source)
+                except BaseException:
+                    tenant.reset()
+                    raise
+                tenant.loaded = True
+            for chunk in chunks:
+                fp = simhash((chunk.page_content or "").strip())
+                if fp is not None and not tenant.claim(fp, str((chunk.metadata or {}).get("source", "unknown"))):
+                    continue
+                kept.append(chunk)
+        with self._lock:
+            self._stats["ingest_checked"] += len(chunks)
+            self._stats["ingest_skipped"] += len(chunks) - len(kept)
+        if len(kept) < len(chunks):
+            print(f"🧹 Skipped {len(chunks) - len(kept)} near-duplicate chunks for tenant {tenant_id}")
+        return kept
+
+    def collapse_indices(self, texts: Sequence[str]) -> List[int]:
+        """Indices of `texts` (best first) to keep, dropping near-duplicates of earlier ones."""
+        if not self.enabled:
+            return list(range(len(texts)))
+        index = SimHashIndex(self.max_distance)
+        keep: List[int] = []
+        for i, text in enumerate(texts):
+            fp = simhash((text or "").strip())
+            if fp is not None:
+                if index.find(fp) is not None:
+                    continue
+                index.add(fp)
+            keep.append(i)
+        with self._lock:
+            self._stats["query_checked"] += len(texts)
+            self._stats["query_collapsed"] += len(texts) - len(keep)
+        return keep
+
+    def collapse(self, docs: Sequence[Document]) -> List[Document]:
+        return [docs[i] for i in self.collapse_indices([d.page_content for d in docs])]
+
+    def forget_source(self, tenant_id: str, source: str) -> None:
+        """Drop `source` from the tenant's fingerprints (after the source is deleted)."""
+        with self._lock:
+            tenant = self._tenants.get(str(tenant_id))
+        if tenant is None:
+            return
+        with tenant.lock:
+            if tenant.loaded:
+                tenant.release(str(source))
+
+    def forget_tenant(self, tenant_id: str) -> None:
+        """Drop the tenant's fingerprints (after deletes); rebuilt on the next ingest."""
+        with self._lock:
+            self._tenants.pop(str(tenant_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            out["tenants_indexed"] = len(self._tenants)
+        return out
+
+
+near_dedup = NearDuplicateDetector(
+    max_distance=settings.near_dedup_max_distance,
+    enabled=settings.near_dedup_enabled,
+)
@@ -1,12 +1,20 @@
 import hashlib
 import json
-import math
 import os
+import random
+import tempfile
+import threading
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 
 from langchain.schema import Document
 
+from services.near_dedup import near_dedup
+from services.quantized_vector_store import QuantizedVectorStore
+from services.sampling import rows_by_key, stratified_sample
+from services.tenant_stats import TenantStatsStore
+from services.vector_math import mmr_select
+
 try:
     # Pinecone SDK
     from pinecone import Pinecone  # type: ignore
@@ -18,20 +26,6 @@ def _sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()
 
 
-def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
-    # Small, allocation-light cosine similarity for MMR re-ranking.
-    dot = 0.0
-    a_norm = 0.0
-    b_norm = 0.0
-    for x, y in zip(a, b):
-        dot += x * y
-        a_norm += x * x
-        b_norm += y * y
-    if a_norm <= 0.0 or b_norm <= 0.0:
-        return 0.0
-    return dot / (math.sqrt(a_norm) * math.sqrt(b_norm))
-
-
 def _allowed_tenant_ids_from_filter(filter_dict: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
     """
     Your current code passes Chroma-style filters like:
@@ -63,7 +57,7 @@ def _allowed_tenant_ids_from_filter(filter_dict: Optional[Dict[str, Any]]) -> Op
 class _Candidate:
     id: str
     score: float
-    values: Optional[List[float]]
+    values: Optional[Sequence[float]]
     metadata: Dict[str, Any]
 
 
@@ -74,11 +68,24 @@ class PineconeVectorStore:
       - add_documents(docs)
       - get(where={"tenant_id": ...})
       - delete(ids=[...])
+      - sample(tenant_id, k): chunks sampled per source, in the shape of `get()`
+      - indexed_ids(tenant_id, ids): which content-hash chunk ids are already stored
       - as_retriever(search_type=..., search_kwargs=...).invoke(query)
 
     NOTE: Pinecone does not provide a "get all vectors by metadata" API.
     To keep your current suggestion/count logic working, we persist chunk
     text + metadata in a local JSON file per tenant under `meta_path`.
+
+    With `tenant_stats`, per-tenant counters (chunks, sources, bytes, tokens) are updated
+    on every add/delete, so counting a tenant's chunks never reads its meta file.
+
+    Meta updates hold a per-tenant lock (uploads for one tenant ingest concurrently) and are
+    copy-on-write: a new meta dict replaces the cached one, so readers always see ids,
+    documents and metadatas aligned without taking the lock.
+
+    With a `quantized_store`, int8/binary copies of every upserted vector are also
+    kept locally, so MMR no longer needs `include_values=True` on queries (and,
+    with `local_search`, fully covered tenants are searched without Pinecone).
     """
 
     def __init__(
@@ -91,6 +98,9 @@ class PineconeVectorStore:
         host: Optional[str] = None,
         environment: Optional[str] = None,
         embedding_batch_size: int = 100,
+        quantized_store: Optional[QuantizedVectorStore] = None,
+        local_search: bool = False,
+        tenant_stats: Optional[TenantStatsStore] = None,
     ):
         if Pinecone is None:
             raise ImportError(
@@ -108,6 +118,9 @@ class PineconeVectorStore:
         self.host = host
         self.environment = environment
         self.embedding_batch_size = max(1, int(embedding_batch_size))
+        self.quantized_store = quantized_store
+        self.local_search = bool(local_search and quantized_store is not None)
+        self.tenant_stats = tenant_stats
 
         os.makedirs(self.meta_path, exist_ok=True)
         self._index = self._init_index()
@@ -115,6 +128,11 @@ class PineconeVectorStore:
         # Simple in-process cache to avoid re-reading the same tenant file repeatedly.
         # Key: tenant_id -> {"ids": [...], "documents": [...], "metadatas": [...]}
         self._tenant_meta_cache: Dict[str, Dict[str, Any]] = {}
+        # Derived per-tenant views, tagged with the meta dict they were built from
+        self._tenant_id_sets: Dict[str, Tuple[Dict[str, Any], Set[str]]] = {}
+        self._tenant_source_rows: Dict[str, Tuple[Dict[str, Any], Dict[str, List[int]]]] = {}
+        self._tenant_locks: Dict[str, threading.RLock] = {}
+        self._tenant_locks_lock = threading.Lock()
 
     def _init_index(self) -> Any:
         # Pinecone SDK has evolved; we support both "host" targeting and older "environment".
@@ -137,34 +155,82 @@ class PineconeVectorStore:
         safe_name = tenant_id if "/" not in tenant_id else _sha256_hex(tenant_id)
         return os.path.join(self.meta_path, f"{safe_name}.json")
 
-    def _load_tenant_meta(self, tenant_id: str) -> Dict[str, Any]:
-        if tenant_id in self._tenant_meta_cache:
-            return self._tenant_meta_cache[tenant_id]
+    def _tenant_lock(self, tenant_id: str) -> threading.RLock:
+        with self._tenant_locks_lock:
+            lock = self._tenant_locks.get(tenant_id)
+            if lock is None:
+                lock = self._tenant_locks[tenant_id] = threading.RLock()
+            return lock
 
-        path = self._meta_file(tenant_id)
-        if not os.path.exists(path):
-            meta = {"ids": [], "documents": [], "metadatas": []}
-            self._tenant_meta_cache[tenant_id] = meta
+    def _load_tenant_meta(self, tenant_id: str) -> Dict[str, Any]:
+        meta = self._tenant_meta_cache.get(tenant_id)
+        if meta is not None:
             return meta
 
-        with open(path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
-        # Normalize expected shape.
-        meta.setdefault("ids", [])
-        meta.setdefault("documents", [])
-        meta.setdefault("metadatas", [])
+        # Under the tenant lock so a concurrent writer's newer meta is never replaced by a
+        # copy read from disk before its save
+        with self._tenant_lock(tenant_id):
+            if tenant_id in self._tenant_meta_cache:
+                return self._tenant_meta_cache[tenant_id]
+
+            path = self._meta_file(tenant_id)
+            if not os.path.exists(path):
+                meta = {"ids": [], "documents": [], "metadatas": []}
+                self._tenant_meta_cache[tenant_id] = meta
+                return meta
+
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # Normalize expected shape.
+            meta.setdefault("ids", [])
+            meta.setdefault("documents", [])
+            meta.setdefault("metadatas", [])
 
-        self._tenant_meta_cache[tenant_id] = meta
-        return meta
+            self._tenant_meta_cache[tenant_id] = meta
+            return meta
 
     def _save_tenant_meta(self, tenant_id: str, meta: Dict[str, Any]) -> None:
+        """Write and cache a new meta dict for the tenant (caller holds the tenant lock)."""
         path = self._meta_file(tenant_id)
         os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        tmp_path = path + ".tmp"
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            json.dump(meta, f)
-        os.replace(tmp_path, path)
+        # Unique temp file: other workers on the host may be saving the same tenant
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
         self._tenant_meta_cache[tenant_id] = meta
+        self._tenant_id_sets.pop(tenant_id, None)
+        self._tenant_source_rows.pop(tenant_id, None)
+
+    def _tenant_id_set(self, tenant_id: str) -> Set[str]:
+        """Chunk ids stored for the tenant (cached alongside the tenant meta)."""
+        meta = self._load_tenant_meta(tenant_id)
+        cached = self._tenant_id_sets.get(tenant_id)
+        if cached is not None and cached[0] is meta:
+            return cached[1]
+        ids = set(meta["ids"])
+        self._tenant_id_sets[tenant_id] = (meta, ids)
+        return ids
+
+    def indexed_ids(self, tenant_id: str, ids: Sequence[str]) -> Set[str]:
+        """Those of `ids` already stored for the tenant."""
+        known = self._tenant_id_set(str(tenant_id))
+        return {cid for cid in ids if cid in known}
+
+    def _tenant_chunks(self, tenant_id: str) -> List[Tuple[str, str]]:
+        """(source, text) of every stored chunk of the tenant (stats backfill)."""
+        meta = self._load_tenant_meta(tenant_id)
+        return [
+            (str((md or {}).get("source", "unknown")), doc or "")
+            for doc, md in zip(meta["documents"], meta["metadatas"])
+        ]
 
     @staticmethod
     def _make_chunk_id(tenant_id: str, source: str, content: str) -> str:
@@ -195,17 +261,30 @@ class PineconeVectorStore:
         # Track meta store updates per tenant.
         new_records_by_tenant: Dict[str, List[Tuple[str, str, Dict[str, Any]]]] = {}
 
+        # Chunk ids are content hashes: anything already stored (re-uploaded file, rebuilt
+        # source) is skipped instead of being embedded and upserted again.
+        seen_ids: Set[str] = set()
+        skipped = 0
         for doc in all_docs:
             tenant_id = str((doc.metadata or {}).get("tenant_id", ""))
             source = str((doc.metadata or {}).get("source", "unknown"))
             content = (doc.page_content or "").strip()
 
             chunk_id = self._make_chunk_id(tenant_id=tenant_id, source=source, content=content)
+            if chunk_id in seen_ids or chunk_id in self._tenant_id_set(tenant_id):
+                skipped += 1
+                continue
+            seen_ids.add(chunk_id)
             meta = {"tenant_id": tenant_id, "source": source}
 
             new_records_by_tenant.setdefault(tenant_id, []).append((chunk_id, content, meta))
             to_upsert.append({"id": chunk_id, "metadata": meta, "content": content})
 
+        if skipped:
+            print(f"🟢 Skipped {skipped} already-indexed chunks")
+        if not to_upsert:
+            return
+
         # Embed in batches; keep ordering aligned with `to_upsert`.
         texts = [item["content"] for item in to_upsert]
         vectors: List[List[float]] = []
@@ -224,18 +303,39 @@ class PineconeVectorStore:
         ]
         self._index.upsert(vectors=pinecone_vectors)
 
-        # Update local meta store.
+        if self.quantized_store is not None:
+            by_tenant: Dict[str, List[Dict[str, Any]]] = {}
+            for item in to_upsert:
+                by_tenant.setdefault(item["metadata"]["tenant_id"], []).append(item)
+            for tenant_id, items in by_tenant.items():
+                self.quantized_store.add(
+                    tenant_id, [it["id"] for it in items], [it["values"] for it in items]
+                )
+
+        # Update local meta store (copy-on-write under the tenant lock).
         for tenant_id, records in new_records_by_tenant.items():
-            meta = self._load_tenant_meta(tenant_id)
-            existing_ids = set(meta.get("ids") or [])
-            for chunk_id, content, md in records:
-                if chunk_id in existing_ids:
+            with self._tenant_lock(tenant_id):
+                meta = self._load_tenant_meta(tenant_id)
+                existing_ids = set(meta.get("ids") or [])
+                new_meta = {
+                    "ids": list(meta["ids"]),
+                    "documents": list(meta["documents"]),
+                    "metadatas": list(meta["metadatas"]),
+                }
+                added: List[Tuple[str, str]] = []
+                for chunk_id, content, md in records:
+                    if chunk_id in existing_ids:
+                        continue
+                    new_meta["ids"].append(chunk_id)
+                    new_meta["documents"].append(content)
+                    new_meta["metadatas"].append(md)
+                    existing_ids.add(chunk_id)
+                    added.append((md["source"], content))
+                if not added:
                     continue
-                meta["ids"].append(chunk_id)
-                meta["documents"].append(content)
-                meta["metadatas"].append(md)
-                existing_ids.add(chunk_id)
-            self._save_tenant_meta(tenant_id, meta)
+                self._save_tenant_meta(tenant_id, new_meta)
+                if self.tenant_stats is not None:
+                    self.tenant_stats.apply(tenant_id, added=added, current=lambda t=tenant_id: self._tenant_chunks(t))
 
     def delete(self, ids: List[str]) -> None:
         if not ids:
@@ -248,19 +348,32 @@ class PineconeVectorStore:
         ids_set = set(ids)
         tenants = {self._tenant_id_from_chunk_id(cid) for cid in ids}
         for tenant_id in tenants:
-            meta = self._load_tenant_meta(tenant_id)
-            keep_indices: List[int] = []
-            for idx, cid in enumerate(meta.get("ids") or []):
-                if cid not in ids_set:
-                    keep_indices.append(idx)
-
-            if len(keep_indices) == len(meta.get("ids") or []):
-                continue
+            if self.quantized_store is not None:
+                self.quantized_store.delete(tenant_id, ids_set)
+            with self._tenant_lock(tenant_id):
+                meta = self._load_tenant_meta(tenant_id)
+                keep_indices: List[int] = []
+                for idx, cid in enumerate(meta.get("ids") or []):
+                    if cid not in ids_set:
+                        keep_indices.append(idx)
+
+                if len(keep_indices) == len(meta.get("ids") or []):
+                    continue
 
-            meta["ids"] = [meta["ids"][i] for i in keep_indices]
-            meta["documents"] = [meta["documents"][i] for i in keep_indices]
-            meta["metadatas"] = [meta["metadatas"][i] for i in keep_indices]
-            self._save_tenant_meta(tenant_id, meta)
+                keep_set = set(keep_indices)
+                removed = [
+                    (str((meta["metadatas"][i] or {}).get("source", "unknown")), meta["documents"][i])
+                    for i in range(len(meta["ids"]))
+                    if i not in keep_set
+                ]
+                new_meta = {
+                    "ids": [meta["ids"][i] for i in keep_indices],
+                    "documents": [meta["documents"][i] for i in keep_indices],
+                    "metadatas": [meta["metadatas"][i] for i in keep_indices],
+                }
+                self._save_tenant_meta(tenant_id, new_meta)
+                if self.tenant_stats is not None:
+                    self.tenant_stats.apply(tenant_id, removed=removed, current=lambda t=tenant_id: self._tenant_chunks(t))
 
     def get(self, *, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         tenant_id = None
@@ -274,6 +387,22 @@ class PineconeVectorStore:
             "metadatas": meta.get("metadatas") or [],
         }
 
+    def sample(self, tenant_id: str, k: int, seed: Optional[int] = None) -> Dict[str, Any]:
+        """Up to `k` of the tenant's chunks, stratified by source; only those are copied out."""
+        meta = self._load_tenant_meta(str(tenant_id))
+        cached = self._tenant_source_rows.get(str(tenant_id))
+        if cached is not None and cached[0] is meta:
+            groups = cached[1]
+        else:
+            groups = rows_by_key(meta["metadatas"])
+            self._tenant_source_rows[str(tenant_id)] = (meta, groups)
+        rows = sorted(stratified_sample(groups, k, random.Random(seed)))
+        return {
+            "ids": [meta["ids"][i] for i in rows],
+            "documents": [meta["documents"][i] for i in rows],
+            "metadatas": [meta["metadatas"][i] for i in rows],
+        }
+
     def _get_docs_for_ids(self, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
         # Returns chunk_id -> (page_content, metadata)
         by_tenant: Dict[str, List[str]] = {}
@@ -297,6 +426,18 @@ class PineconeVectorStore:
 
         return out
 
+    def fetch_vectors(self, ids: List[str], batch_size: int = 100) -> Dict[str, List[float]]:
+        """Fetch stored embedding values by chunk id (batched; missing ids are omitted)."""
+        out: Dict[str, List[float]] = {}
+        for i in range(0, len(ids), batch_size):
+            resp = self._index.fetch(ids=ids[i : i + batch_size])
+            vectors = resp.get("vectors") if isinstance(resp, dict) else getattr(resp, "vectors", None)
+            for cid, vec in (vectors or {}).items():
+                values = vec.get("values") if isinstance(vec, dict) else getattr(vec, "values", None)
+                if values:
+                    out[str(cid)] = list(values)
+        return out
+
     def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[Dict[str, Any]] = None) -> Any:
         search_kwargs = search_kwargs or {}
         return _PineconeRetriever(store=self, search_type=search_type, search_kwargs=search_kwargs)
@@ -319,43 +460,29 @@ class _PineconeRetriever:
         pool_k = min(200, max(fetch_k, k) * 4)
 
         query_vec = self.store.embeddings.embed_query(query)
-        include_values = True
-
-        resp = self.store._index.query(
-            vector=query_vec,
-            top_k=pool_k,
-            include_metadata=True,
-            include_values=include_values,
-        )
-        matches = getattr(resp, "matches", None) or resp.get("matches") or []
 
-        candidates: List[_Candidate] = []
-        candidate_ids: List[str] = []
-        for m in matches:
-            md = getattr(m, "metadata", None) or m.get("metadata") or {}
-            tenant_id = md.get("tenant_id")
-            if allowed_tenants is not None and tenant_id not in allowed_tenants:
-                continue
-
-            cid = getattr(m, "id", None) or m.get("id")
-            if not cid:
-                continue
-
-            values = getattr(m, "values", None) or m.get("values")  # list[float] or None
-            score = float(getattr(m, "score", None) or m.get("score", 0.0))
-            candidates.append(_Candidate(id=str(cid), score=score, values=values, metadata=md))
-            candidate_ids.append(str(cid))
+        candidates = None
+        if self.store.local_search and allowed_tenants is not None:
+            candidates = self._local_candidates(query_vec, allowed_tenants, max(fetch_k, k))
+        if candidates is None:
+            candidates = self._pinecone_candidates(query_vec, allowed_tenants, pool_k)
 
         # Map chunk ids -> (page_content, metadata)
-        id_to_payload = self.store._get_docs_for_ids(candidate_ids)
+        id_to_payload = self.store._get_docs_for_ids([c.id for c in candidates])
 
         # If we don't have values/embeddings, degrade gracefully to similarity ranking.
         if not candidates:
             return []
 
+        # Collapse near-duplicate chunks (templated boilerplate) before MMR
+        candidates = sorted(candidates, key=lambda c: c.score, reverse=True)
+        keep = near_dedup.collapse_indices([(id_to_payload.get(c.id) or ("", None))[0] for c in candidates])
+        candidates = [candidates[i] for i in keep]
+
         if self.search_type != "mmr":
             selected = sorted(candidates, key=lambda c: c.score, reverse=True)[:k]
         else:
+            candidates = self._with_values(candidates)
             # If values are missing, we can't compute doc-doc similarity; fallback.
             if any(c.values is None for c in candidates):
                 selected = sorted(candidates, key=lambda c: c.score, reverse=True)[:k]
@@ -377,9 +504,87 @@ class _PineconeRetriever:
             md2 = dict(md or {})
             md2.setdefault("tenant_id", c.metadata.get("tenant_id"))
             md2.setdefault("source", c.metadata.get("source"))
+            md2["relevance_score"] = c.score
             out_docs.append(Document(page_content=content, metadata=md2))
         return out_docs
 
+    def _pinecone_candidates(
+        self, query_vec: List[float], allowed_tenants: Optional[Set[str]], pool_k: int
+    ) -> List[_Candidate]:
+        # With a local quantized copy, MMR doesn't need the float values over the wire.
+        include_values = self.store.quantized_store is None
+
+        resp = self.store._index.query(
+            vector=query_vec,
+            top_k=pool_k,
+            include_metadata=True,
+            include_values=include_values,
+        )
+        matches = getattr(resp, "matches", None) or resp.get("matches") or []
+
+        candidates: List[_Candidate] = []
+        for m in matches:
+            md = getattr(m, "metadata", None) or m.get("metadata") or {}
+            tenant_id = md.get("tenant_id")
+            if allowed_tenants is not None and tenant_id not in allowed_tenants:
+                continue
+
+            cid = getattr(m, "id", None) or m.get("id")
+            if not cid:
+                continue
+
+            # `dict.values` is a method, so check for plain-dict matches first.
+            values = m.get("values") if isinstance(m, dict) else getattr(m, "values", None)
+            score = float(getattr(m, "score", None) or m.get("score", 0.0))
+            candidates.append(_Candidate(id=str(cid), score=score, values=values or None, metadata=md))
+        return candidates
+
+    def _local_candidates(
+        self, query_vec: List[float], allowed_tenants: Set[str], top_k: int
+    ) -> Optional[List[_Candidate]]:
+        """Binary-code search + exact re-rank on the local quantized store, or None if it
+        doesn't cover every chunk of the requested tenants yet."""
+        quantized = self.store.quantized_store
+        for tenant_id in allowed_tenants:
+            if quantized.count(tenant_id) != len(self.store._load_tenant_meta(tenant_id).get("ids") or []):
+                return None
+
+        candidates: List[_Candidate] = []
+        for tenant_id in allowed_tenants:
+            for cid, score in quantized.search(tenant_id, query_vec, top_k):
+                md = {"tenant_id": tenant_id}
+                candidates.append(_Candidate(id=cid, score=score, values=None, metadata=md))
+        return candidates
+
+    def _with_values(self, candidates: List[_Candidate]) -> List[_Candidate]:
+        """Fill candidate values from the local quantized store, backfilling it from
+        Pinecone for chunks upserted before the store existed."""
+        quantized = self.store.quantized_store
+        if quantized is None or all(c.values is not None for c in candidates):
+            return candidates
+
+        by_tenant: Dict[str, List[str]] = {}
+        for c in candidates:
+            by_tenant.setdefault(self.store._tenant_id_from_chunk_id(c.id), []).append(c.id)
+
+        values: Dict[str, Any] = {}
+        for tenant_id, ids in by_tenant.items():
+            found = quantized.get_vectors(tenant_id, ids)
+            missing = [cid for cid in ids if cid not in found]
+            if missing:
+                fetched = self.store.fetch_vectors(missing)
+                if fetched:
+                    quantized.add(tenant_id, list(fetched.keys()), list(fetched.values()))
+                    found.update(quantized.get_vectors(tenant_id, list(fetched.keys())))
+            values.update(found)
+
+        return [
+            c if c.values is not None else _Candidate(
+                id=c.id, score=c.score, values=values.get(c.id), metadata=c.metadata
+            )
+            for c in candidates
+        ]
+
     def _mmr_select(
         self,
         *,
@@ -391,51 +596,8 @@ class _PineconeRetriever:
         # MMR selection over candidate set using cosine similarity.
         # Formula:
         #   MMR = lambda * sim(query, doc) - (1 - lambda) * max_{sel in selected} sim(doc, sel)
-
-        # Precompute candidate vectors once.
-        cand_vectors = [c.values or [] for c in candidates]
-        if any(len(v) == 0 for v in cand_vectors):
+        cand_vectors = [c.values for c in candidates]
+        if any(v is None or len(v) == 0 for v in cand_vectors):
             return sorted(candidates, key=lambda c: c.score, reverse=True)[:k]
-
-        n = len(candidates)
-        remaining_indices: List[int] = list(range(n))
-        selected_indices: List[int] = []
-
-        # Similarity between query and each candidate
-        query_sims: List[float] = [_cosine_similarity(query_vec, v) for v in cand_vectors]
-
-        # Memo for doc-doc cosine similarities.
-        sim_cache: Dict[Tuple[int, int], float] = {}
-
-        def doc_doc_sim(i: int, j: int) -> float:
-            key = (i, j) if i <= j else (j, i)
-            if key in sim_cache:
-                return sim_cache[key]
-            sim = _cosine_similarity(cand_vectors[i], cand_vectors[j])
-            sim_cache[key] = sim
-            return sim
-
-        while remaining_indices and len(selected_indices) < k:
-            if not selected_indices:
-                # Choose best candidate by query relevance.
-                best_i = max(remaining_indices, key=lambda i: query_sims[i])
-            else:
-                best_i = None
-                best_mmr = float("-inf")
-                for i in remaining_indices:
-                    relevance = query_sims[i]
-                    diversity_penalty = 0.0
-                    for sj in selected_indices:
-                        diversity_penalty = max(diversity_penalty, doc_doc_sim(i, sj))
-                    mmr = lambda_mult * relevance - (1.0 - lambda_mult) * diversity_penalty
-                    if mmr > best_mmr:
-                        best_mmr = mmr
-                        best_i = i
-                if best_i is None:
-                    break
-
-            selected_indices.append(best_i)
-            remaining_indices = [i for i in remaining_indices if i != best_i]
-
-        return [candidates[i] for i in selected_indices]
-
+        picked = mmr_select(query_vec, cand_vectors, k, lambda_mult)
+        return [candidates[i] for i in picked]
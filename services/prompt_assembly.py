@@ -0,0 +1,178 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+
+from config.settings import settings
+from services.tokenizer import count_tokens
+
+# Same for every bot and request: the start of every answer prompt
+ANSWER_RULES = """You are a helpful AI assistant.
+
+Answer using ONLY the numbered excerpts in the user's message. Each excerpt may be from a different page or document (source name is shown).
+
+Rules:
+- Give a direct, complete answer. When listing several items, services, or steps, use either short plain lines starting with "- " (label, then colon, then text — no asterisks) or one or two clear paragraphs. Avoid long symbol-heavy lists.
+- Writing style (required): professional, conversational, and easy to read in a chat window. Do NOT use markdown bold (**), italics (*), underscore emphasis, or # headings. Do NOT wrap labels in asterisks. Do NOT use emoji unless the user's question explicitly asks for them.
+- Prefer concrete details from the excerpts (names, numbers, dates, URLs) over vague summaries.
+- If excerpts only partially answer the question, state what is known from them and what is not covered.
+- If nothing in the excerpts answers a factual question, say clearly that you don't have that information. Do not invent facts or use outside knowledge.
+- Simple greetings (hi, hello, good morning, etc.) never require facts from the excerpts: reply briefly and warmly in the configured tone. Do not refuse or say you lack information "about" their greeting.
+- For links and emails only, you may use markdown links: [visible text](https://example.com/path) or [email us](mailto:name@example.com). Do not put a closing parenthesis or period inside the URL; put punctuation after the final ) of the link."""
+
+
+def behavior_instructions(behavior: Dict[str, Any] | None) -> str:
+    """
+    Build a short, focused behavior block based on website/chatbot config.
+
+    Expected behavior dict keys (all optional):
+    - website_type: e.g. "service_business", "ecommerce"
+    - primary_goal: e.g. "Sales + Support"
+    - tone: e.g. "Friendly, professional, slightly persuasive"
+    - extra_instructions: long free‑text instructions
+    """
+    if not behavior:
+        return (
+            "Website type: General website\n"
+            "Primary goal: Answer questions based on the site's content.\n"
+            "Tone: Friendly and neutral.\n"
+        )
+
+    website_type = (behavior.get("website_type") or "General website").strip()
+    primary_goal = (behavior.get("primary_goal") or "Answer questions based on the site's content.").strip()
+    tone = (behavior.get("tone") or "Friendly and professional.").strip()
+    extra = (behavior.get("extra_instructions") or "").strip()
+
+    lines = [
+        f"Website type: {website_type}",
+        f"Primary goal: {primary_goal}",
+        f"Tone: {tone}",
+    ]
+    if extra:
+        lines.append("Additional instructions:")
+        lines.append(extra)
+    return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    """Static system message for one bot config, compiled once."""
+    key: str
+    text: str
+    tokens: int
+
+
+@dataclass
+class AssembledPrompt:
+    messages: List[BaseMessage]
+    prefix_tokens: int
+    variable_tokens: int
+    # Prefix tokens the provider can serve from its prompt cache (0 below its minimum)
+    cacheable_tokens: int
+
+    def summary(self) -> str:
+        return (
+            f"{self.prefix_tokens} static prefix tokens ({self.cacheable_tokens} cacheable), "
+            f"{self.variable_tokens} variable"
+        )
+
+
+class PromptAssembler:
+    """
+    Builds answer prompts as [system: rules + bot behavior] + [user: context + question].
+
+    Everything that doesn't change between requests of a bot comes first, so consecutive
+    prompts share a byte-identical prefix. The system message is compiled once per bot
+    config (keyed by a hash of it) and kept in a small LRU.
+
+    Provider caching is limited: OpenAI only caches prompts of `cache_min_tokens`+ (in
+    `cache_increment`-token steps), and the rules plus a typical behavior block come to
+    about 400 tokens. So for most bots `cacheable_tokens` is 0 and the provider caches
+    nothing; only bots with long extra instructions clear the minimum. The win for the rest
+    is compiling the prefix once per config. `stats()["below_cache_min"]` counts the
+    requests whose prefix was too short to be cached.
+    """
+
+    def __init__(self, *, cache_min_tokens: int = 1024, cache_increment: int = 128, max_prefixes: int = 1024):
+        self.cache_min_tokens = max(0, int(cache_min_tokens))
+        self.cache_increment = max(1, int(cache_increment))
+        self.max_prefixes = max(1, int(max_prefixes))
+        self._lock = threading.Lock()
+        self._prefixes: "OrderedDict[str, PromptPrefix]" = OrderedDict()
+        self._stats = {
+            "requests": 0, "prefix_hits": 0, "prefix_tokens": 0, "cacheable_tokens": 0, "variable_tokens": 0,
+            "provider_cached_tokens": 0, "below_cache_min": 0,
+        }
+
+    @staticmethod
+    def config_key(behavior: Dict[str, Any] | None) -> str:
+        raw = json.dumps(behavior or {}, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def prefix(self, behavior: Dict[str, Any] | None) -> PromptPrefix:
+        key = self.config_key(behavior)
+        with self._lock:
+            cached = self._prefixes.get(key)
+            if cached is not None:
+                self._prefixes.move_to_end(key)
+                self._stats["prefix_hits"] += 1
+                return cached
+        text = f"{ANSWER_RULES}\n\nChatbot behavior mode:\n{behavior_instructions(behavior)}"
+        compiled = PromptPrefix(key=key, text=text, tokens=count_tokens(text))
+        with self._lock:
+            self._prefixes[key] = compiled
+            while len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        return compiled
+
+    def cacheable(self, prefix_tokens: int) -> int:
+        if prefix_tokens < self.cache_min_tokens:
+            return 0
+        return prefix_tokens - prefix_tokens % self.cache_increment
+
+    def assemble(self, behavior: Dict[str, Any] | None, context: str, question: str) -> AssembledPrompt:
+        prefix = self.prefix(behavior)
+        variable = f"Context:\n{context}\n\nQuestion: {question}\n\nAnswer:"
+        assembled = AssembledPrompt(
+            messages=[SystemMessage(content=prefix.text), HumanMessage(content=variable)],
+            prefix_tokens=prefix.tokens,
+            variable_tokens=count_tokens(variable),
+            cacheable_tokens=self.cacheable(prefix.tokens),
+        )
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["prefix_tokens"] += assembled.prefix_tokens
+            self._stats["cacheable_tokens"] += assembled.cacheable_tokens
+            self._stats["variable_tokens"] += assembled.variable_tokens
+            if not assembled.cacheable_tokens:
+                self._stats["below_cache_min"] += 1
+        return assembled
+
+    def record_usage(self, response: Any) -> Optional[int]:
+        """Prompt tokens the provider reports as served from its cache, when it reports them."""
+        try:
+            usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        except Exception:
+            cached = None
+        if isinstance(cached, int):
+            with self._lock:
+                self._stats["provider_cached_tokens"] += cached
+            return cached
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+            out["compiled_prefixes"] = len(self._prefixes)
+        return out
+
+
+prompt_assembler = PromptAssembler(
+    cache_min_tokens=settings.prompt_cache_min_tokens,
+    cache_increment=settings.prompt_cache_increment_tokens,
+)
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.vector_math import normalize_rows
+
+IDS_FILE = "ids.jsonl"
+CODES_FILE = "codes.i8"      # int8 scalar codes, n x dim
+SCALES_FILE = "scales.f32"   # one float32 scale per row
+BITS_FILE = "bits.u8"        # packed sign bits, n x ceil(dim / 8)
+FLOATS_FILE = "floats.f32"   # original normalized float32 rows, read through np.memmap
+DIM_FILE = "dim"
+
+# Popcount lookup for Hamming distance over packed bits.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row scalar quantization: row ~= codes * scale."""
+    max_abs = np.abs(vectors).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+
+@dataclass
+class _TenantCodes:
+    dim: int
+    ids: List[str] = field(default_factory=list)
+    rows: Dict[str, int] = field(default_factory=dict)
+    codes: np.ndarray = None  # type: ignore[assignment]
+    scales: np.ndarray = None  # type: ignore[assignment]
+    bits: np.ndarray = None  # type: ignore[assignment]
+
+
+class QuantizedVectorStore:
+    """
+    Local, per-tenant copies of chunk vectors keyed by chunk id, kept small enough to hold
+    in memory for every tenant:
+      - int8 scalar codes (+ one scale per row, ~4x smaller than float32) for MMR
+        doc-doc similarity, so Pinecone queries can skip `include_values`;
+      - 1-bit sign codes (~32x smaller) for a fully local Hamming candidate search;
+      - the normalized float32 rows on disk, read through `np.memmap` only for the
+        shortlist when re-ranking exactly.
+
+    Files are append-only per tenant (adds are a cheap append); deletes compact the tenant.
+    """
+
+    def __init__(self, *, path: str):
+        self.path = os.path.abspath(path)
+        os.makedirs(self.path, exist_ok=True)
+        self._tenants: Dict[str, _TenantCodes] = {}
+        self._lock = threading.RLock()
+
+    # --------------------------
+    # Files / loading
+    # --------------------------
+    def _tenant_dir(self, tenant_id: str) -> str:
+        safe_name = tenant_id if "/" not in tenant_id else hashlib.sha256(tenant_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, safe_name)
+
+    def _read_dim(self, tenant_dir: str) -> Optional[int]:
+        meta_file = os.path.join(tenant_dir, DIM_FILE)
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0) or None
+
+    def _load(self, tenant_id: str) -> Optional[_TenantCodes]:
+        if tenant_id in self._tenants:
+            return self._tenants[tenant_id]
+
+        tenant_dir = self._tenant_dir(tenant_id)
+        dim = self._read_dim(tenant_dir)
+        if not dim:
+            return None
+
+        ids: List[str] = []
+        with open(os.path.join(tenant_dir, IDS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # torn last line from a crash mid-append
+                if line.strip():
+                    ids.append(json.loads(line))
+        row_bytes = self._row_bytes(dim)
+        n = min(
+            [len(ids)]
+            + [os.path.getsize(os.path.join(tenant_dir, name)) // size for name, size in row_bytes.items()]
+        )
+        # A crash mid-append can leave files of different lengths. Cut every file back to the
+        # common prefix so the next append lines up with ids.jsonl again.
+        self._truncate(tenant_dir, ids, n, row_bytes)
+
+        codes = np.fromfile(os.path.join(tenant_dir, CODES_FILE), dtype=np.int8).reshape(-1, dim)
+        scales = np.fromfile(os.path.join(tenant_dir, SCALES_FILE), dtype=np.float32)
+        bits = np.fromfile(os.path.join(tenant_dir, BITS_FILE), dtype=np.uint8).reshape(-1, (dim + 7) // 8)
+        tenant = _TenantCodes(
+            dim=dim,
+            ids=ids[:n],
+            rows={cid: i for i, cid in enumerate(ids[:n])},
+            codes=codes[:n],
+            scales=scales[:n],
+            bits=bits[:n],
+        )
+        self._tenants[tenant_id] = tenant
+        return tenant
+
+    @staticmethod
+    def _row_bytes(dim: int) -> Dict[str, int]:
+        return {CODES_FILE: dim, SCALES_FILE: 4, BITS_FILE: (dim + 7) // 8, FLOATS_FILE: 4 * dim}
+
+    @staticmethod
+    def _truncate(tenant_dir: str, ids: List[str], n: int, row_bytes: Dict[str, int]) -> None:
+        for name, size in row_bytes.items():
+            path = os.path.join(tenant_dir, name)
+            if os.path.getsize(path) != n * size:
+                print(f"⚠️ Truncating {path} to {n} rows after an interrupted append")
+                os.truncate(path, n * size)
+        ids_path = os.path.join(tenant_dir, IDS_FILE)
+        expected = sum(len((json.dumps(cid) + "\n").encode("utf-8")) for cid in ids[:n])
+        if os.path.getsize(ids_path) != expected:
+            print(f"⚠️ Rewriting {ids_path} with {n} ids after an interrupted append")
+            with open(ids_path + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(cid) + "\n" for cid in ids[:n])
+            os.replace(ids_path + ".tmp", ids_path)
+
+    def _floats(self, tenant_id: str, tenant: _TenantCodes) -> np.ndarray:
+        path = os.path.join(self._tenant_dir(tenant_id), FLOATS_FILE)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(len(tenant.ids), tenant.dim))
+
+    def _write_all(self, tenant_id: str, tenant: _TenantCodes, floats: np.ndarray) -> None:
+        tenant_dir = self._tenant_dir(tenant_id)
+        os.makedirs(tenant_dir, exist_ok=True)
+        for name, arr in (
+            (CODES_FILE, tenant.codes),
+            (SCALES_FILE, tenant.scales),
+            (BITS_FILE, tenant.bits),
+            (FLOATS_FILE, floats),
+        ):
+            np.ascontiguousarray(arr).tofile(os.path.join(tenant_dir, name + ".tmp"))
+            os.replace(os.path.join(tenant_dir, name + ".tmp"), os.path.join(tenant_dir, name))
+        with open(os.path.join(tenant_dir, IDS_FILE + ".tmp"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(cid) + "\n" for cid in tenant.ids)
+        os.replace(os.path.join(tenant_dir, IDS_FILE + ".tmp"), os.path.join(tenant_dir, IDS_FILE))
+        with open(os.path.join(tenant_dir, DIM_FILE), "w", encoding="utf-8") as f:
+            f.write(str(tenant.dim))
+
+    # --------------------------
+    # Writes
+    # --------------------------
+    def add(self, tenant_id: str, ids: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Append vectors for `ids` (already-present ids are skipped)."""
+        if not ids:
+            return
+        with self._lock:
+            tenant = self._load(tenant_id)
+            keep: List[int] = []
+            seen: set = set()
+            for i, cid in enumerate(ids):
+                if cid in seen or (tenant is not None and cid in tenant.rows):
+                    continue
+                seen.add(cid)
+                keep.append(i)
+            if not keep:
+                return
+
+            mat = normalize_rows([vectors[i] for i in keep])
+            codes, scales = quantize_int8(mat)
+            bits = binarize(mat)
+            new_ids = [ids[i] for i in keep]
+
+            if tenant is None:
+                tenant = _TenantCodes(
+                    dim=mat.shape[1], ids=new_ids, rows={cid: i for i, cid in enumerate(new_ids)},
+                    codes=codes, scales=scales, bits=bits,
+                )
+                self._write_all(tenant_id, tenant, mat)
+                self._tenants[tenant_id] = tenant
+                return
+
+            if mat.shape[1] != tenant.dim:
+                raise ValueError(f"Vector dim {mat.shape[1]} does not match tenant dim {tenant.dim}")
+
+            tenant_dir = self._tenant_dir(tenant_id)
+            for name, arr in ((CODES_FILE, codes), (SCALES_FILE, scales), (BITS_FILE, bits), (FLOATS_FILE, mat)):
+                with open(os.path.join(tenant_dir, name), "ab") as f:
+                    np.ascontiguousarray(arr).tofile(f)
+            with open(os.path.join(tenant_dir, IDS_FILE), "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(cid) + "\n" for cid in new_ids)
+
+            start = len(tenant.ids)
+            tenant.ids.extend(new_ids)
+            tenant.rows.update({cid: start + i for i, cid in enumerate(new_ids)})
+            tenant.codes = np.concatenate([tenant.codes, codes])
+            tenant.scales = np.concatenate([tenant.scales, scales])
+            tenant.bits = np.concatenate([tenant.bits, bits])
+
+    def delete(self, tenant_id: str, ids: Iterable[str]) -> None:
+        ids_set = set(ids)
+        with self._lock:
+            tenant = self._load(tenant_id)
+            if tenant is None:
+                return
+            keep = [i for i, cid in enumerate(tenant.ids) if cid not in ids_set]
+            if len(keep) == len(tenant.ids):
+                return
+            floats = np.array(self._floats(tenant_id, tenant)[keep])
+            tenant.ids = [tenant.ids[i] for i in keep]
+            tenant.rows = {cid: i for i, cid in enumerate(tenant.ids)}
+            tenant.codes = tenant.codes[keep]
+            tenant.scales = tenant.scales[keep]
+            tenant.bits = tenant.bits[keep]
+            self._write_all(tenant_id, tenant, floats)
+
+    # --------------------------
+    # Reads
+    # --------------------------
+    def count(self, tenant_id: str) -> int:
+        with self._lock:
+            tenant = self._load(tenant_id)
+            return len(tenant.ids) if tenant else 0
+
+    def get_vectors(self, tenant_id: str, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Dequantized (int8) vectors for the ids present in the store."""
+        with self._lock:
+            tenant = self._load(tenant_id)
+            if tenant is None:
+                return {}
+            rows = [(cid, tenant.rows[cid]) for cid in ids if cid in tenant.rows]
+            if not rows:
+                return {}
+            idx = [r for _cid, r in rows]
+            mat = dequantize_int8(tenant.codes[idx], tenant.scales[idx])
+            return {cid: mat[i] for i, (cid, _r) in enumerate(rows)}
+
+    def search(
+        self,
+        tenant_id: str,
+        query_vec: Sequence[float],
+        top_k: int,
+        shortlist_factor: int = 8,
+    ) -> List[Tuple[str, float]]:
+        """
+        Hamming search over sign bits for a shortlist of `top_k * shortlist_factor` rows,
+        then exact cosine re-rank of the shortlist against the float32 rows.
+        """
+        with self._lock:
+            tenant = self._load(tenant_id)
+            if tenant is None or not tenant.ids:
+                return []
+            query = normalize_rows(query_vec)
+            query_bits = binarize(query)[0]
+
+            n = len(tenant.ids)
+            shortlist = min(n, max(top_k, top_k * shortlist_factor))
+            hamming = _POPCOUNT[np.bitwise_xor(tenant.bits, query_bits)].sum(axis=1, dtype=np.int32)
+            rows = np.argpartition(hamming, shortlist - 1)[:shortlist] if shortlist < n else np.arange(n)
+            rows = np.sort(rows)
+
+            exact = np.asarray(self._floats(tenant_id, tenant)[rows]) @ query[0]
+            order = np.argsort(-exact)[:top_k]
+            return [(tenant.ids[int(rows[i])], float(exact[i])) for i in order]
@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class StageSpan:
+    """Timing of one stage, in milliseconds relative to the start of the pipeline run."""
+    name: str
+    deps: Tuple[str, ...]
+    start_ms: float
+    end_ms: float
+
+    @property
+    def duration_ms(self) -> float:
+        return self.end_ms - self.start_ms
+
+
+@dataclass
+class _Stage:
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...]
+    blocking: bool
+
+
+class RequestPipeline:
+    """
+    Small per-request dependency graph. Each stage starts as soon as all of its dependencies
+    have finished, so independent DB / vector / LLM round trips overlap instead of adding up.
+
+    Stage functions receive their dependencies' results as keyword arguments. Blocking
+    (sync) stages run in a worker thread via `asyncio.to_thread`; stages that share a
+    SQLAlchemy session must be chained through `deps` so they never run at the same time.
+    """
+
+    def __init__(self) -> None:
+        self._stages: Dict[str, _Stage] = {}
+        self.spans: Dict[str, StageSpan] = {}
+        self.results: Dict[str, Any] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        deps: Sequence[str] = (),
+        blocking: bool = True,
+    ) -> "RequestPipeline":
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        missing = [d for d in deps if d not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on undefined stage(s): {', '.join(missing)}")
+        self._stages[name] = _Stage(name=name, fn=fn, deps=tuple(deps), blocking=blocking)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every stage; returns stage name -> result. The first failure cancels the rest."""
+        t0 = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: _Stage) -> Any:
+            dep_results = {}
+            for dep in stage.deps:
+                dep_results[dep] = await tasks[dep]
+            start = (time.perf_counter() - t0) * 1000.0
+            try:
+                if stage.blocking:
+                    result = await asyncio.to_thread(stage.fn, **dep_results)
+                else:
+                    result = stage.fn(**dep_results)
+                    if inspect.isawaitable(result):
+                        result = await result
+            finally:
+                end = (time.perf_counter() - t0) * 1000.0
+                self.spans[stage.name] = StageSpan(stage.name, stage.deps, start, end)
+            return result
+
+        for stage in self._stages.values():
+            tasks[stage.name] = asyncio.create_task(run_stage(stage))
+
+        try:
+            values = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        self.results = dict(zip(tasks.keys(), values))
+        return self.results
+
+    def critical_path(self) -> List[StageSpan]:
+        """Chain of stages that determined total latency: from the last stage to finish,
+        repeatedly follow the dependency that finished last."""
+        if not self.spans:
+            return []
+        current: Optional[StageSpan] = max(self.spans.values(), key=lambda s: s.end_ms)
+        path: List[StageSpan] = []
+        while current is not None:
+            path.append(current)
+            deps = [self.spans[d] for d in current.deps if d in self.spans]
+            current = max(deps, key=lambda s: s.end_ms) if deps else None
+        return list(reversed(path))
+
+    def total_ms(self) -> float:
+        return max((s.end_ms for s in self.spans.values()), default=0.0)
+
+    def server_timing(self) -> str:
+        """`Server-Timing` header value: one metric per stage plus the critical path."""
+        parts = [f"{s.name};dur={s.duration_ms:.1f}" for s in self.spans.values()]
+        path = ">".join(s.name for s in self.critical_path())
+        parts.append(f'critical;desc="{path}";dur={self.total_ms():.1f}')
+        return ", ".join(parts)
@@ -1,9 +1,12 @@
 import sys
 import re
 import json
+import asyncio
 import hashlib
-from typing import List, Dict, Any
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import threading
+import concurrent.futures
+from dataclasses import dataclass
+from typing import List, Dict, Any, Iterable
 try:
     # Optional fallback if you don't set Pinecone env vars.
     from langchain_community.vectorstores import Chroma  # type: ignore
@@ -11,9 +14,24 @@ except Exception:  # pragma: no cover
     Chroma = None  # type: ignore
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config.settings import settings
+from services.answerability import ACCEPT, BORDERLINE, answerability_filter
+from services.chunking import dense_chunker
+from services.context_packer import PackedContext, context_packer
+from services.image_ranker import image_ranker
+from services.fast_path import small_talk
+from services.intent import Intent, classify_intent
+from services.llm_client import chat_model, embedding_model
+from services.near_dedup import near_dedup
+from services.prompt_assembly import prompt_assembler
+from services.sampling import rows_by_key, stratified_sample
+from services.suggestion_scheduler import suggestion_scheduler
+from services.suggestion_store import suggestion_store
+from services.tenant_stats import TenantStats, tenant_stats
 from services.pinecone_vector_store import PineconeVectorStore
+from services.faiss_vector_store import FaissVectorStore
+from services.tiered_vector_store import TieredVectorStore
+from services.quantized_vector_store import QuantizedVectorStore
 
 # URL patterns that usually indicate non-content images (tracking, logos, icons)
 JUNK_IMAGE_PATTERNS = re.compile(
@@ -24,16 +42,6 @@ JUNK_IMAGE_PATTERNS = re.compile(
 )
 MAX_IMAGES_TO_SHOW = 8  # cap so the UI stays readable
 
-# Recommended max question length for best results; longer questions get a friendly hint
-MAX_RECOMMENDED_QUESTION_LENGTH = 400
-
-# Short openers like "hi" — not answerable from KB but should not get "I don't have that information"
-_SIMPLE_GREETING_RE = re.compile(
-    r"^(hi|hello|hey|hiya|howdy|yo|sup|good\s+(morning|afternoon|evening|day)|greetings?|namaste)"
-    r"[\s!?.,]*$",
-    re.I,
-)
-
 # ✅ Fix SQLite for ChromaDB compatibility
 try:
     __import__('pysqlite3')
@@ -49,6 +57,15 @@ SUGGESTION_POOL_MAX_DOCS = 35
 SUGGESTION_CONTEXT_CHARS_PER_CHUNK = 700
 
 
+@dataclass(frozen=True)
+class StreamIngestResult:
+    """Outcome of `add_text_stream_to_index`."""
+    # Chunks the extracted text split into (0: no text at all)
+    chunks: int
+    # Chunks newly indexed; the rest were already indexed (re-upload) or duplicates
+    added: int
+
+
 # ===============================
 # 🚀 Suggestion Question Generator
 # ===============================
@@ -57,7 +74,7 @@ class SuggestionQuestionGenerator:
 
     def __init__(self, llm_model: str):
         # Low temperature: avoid hypothetical questions not present in the knowledge text
-        self.llm = ChatOpenAI(model=llm_model, temperature=0.15)
+        self.llm = chat_model(llm_model, temperature=0.15)
         self.prompt_template = ChatPromptTemplate.from_template("""
 You write short follow-up questions for a chatbot. The chatbot may ONLY use the KNOWLEDGE TEXT below — no other information.
 
@@ -120,84 +137,21 @@ class RetrievalServiceV2:
     """Enhanced retrieval service with dynamic knowledge & suggestions."""
 
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(model=settings.embedding_model)
-        self.llm = ChatOpenAI(model=settings.chat_model, temperature=settings.temperature)
+        # Pooled clients; identical in-flight requests share one upstream call
+        self.embeddings = embedding_model(settings.embedding_model)
+        self.llm = chat_model(settings.chat_model, temperature=settings.temperature)
         self.chroma_path = settings.chroma_path
         self.vector_db = None
         self.pinecone_enabled = bool(settings.pinecone_api_key and settings.pinecone_index_name)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.dense_chunk_size,
-            chunk_overlap=settings.dense_chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
-
-        # Prompt for answering user queries – behavior is injected dynamically
-        self.prompt_template = """You are a helpful AI assistant.
-
-Chatbot behavior mode:
-{behavior}
-
-Answer using ONLY the numbered excerpts below. Each excerpt may be from a different page or document (source name is shown).
+        self.text_splitter = dense_chunker
 
-Rules:
-- Give a direct, complete answer. When listing several items, services, or steps, use either short plain lines starting with "- " (label, then colon, then text — no asterisks) or one or two clear paragraphs. Avoid long symbol-heavy lists.
-- Writing style (required): professional, conversational, and easy to read in a chat window. Do NOT use markdown bold (**), italics (*), underscore emphasis, or # headings. Do NOT wrap labels in asterisks. Do NOT use emoji unless the user's question explicitly asks for them.
-- Prefer concrete details from the excerpts (names, numbers, dates, URLs) over vague summaries.
-- If excerpts only partially answer the question, state what is known from them and what is not covered.
-- If nothing in the excerpts answers a factual question, say clearly that you don't have that information. Do not invent facts or use outside knowledge.
-- Simple greetings (hi, hello, good morning, etc.) never require facts from the excerpts: reply briefly and warmly in the configured tone. Do not refuse or say you lack information "about" their greeting.
-- For links and emails only, you may use markdown links: [visible text](https://example.com/path) or [email us](mailto:name@example.com). Do not put a closing parenthesis or period inside the URL; put punctuation after the final ) of the link.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-        self.prompt = ChatPromptTemplate.from_template(self.prompt_template)
+        # Answer prompts: static rules + per-bot behavior prefix, then context/question (see prompt_assembly)
+        self.prompt_assembler = prompt_assembler
 
         # Suggestion question generator
         self.suggestion_generator = SuggestionQuestionGenerator(settings.chat_model)
 
-        # Temporary in-memory store for suggestions
-        # In production, replace this with a database or Redis
-        self.suggestion_cache: Dict[str, List[str]] = {}
-
-    # --------------------------
-    # 🎛️ Chatbot Behavior Modes
-    # --------------------------
-    def _build_behavior_instructions(self, behavior: Dict[str, Any] | None) -> str:
-        """
-        Build a short, focused behavior block based on website/chatbot config.
-
-        Expected behavior dict keys (all optional):
-        - website_type: e.g. "service_business", "ecommerce"
-        - primary_goal: e.g. "Sales + Support"
-        - tone: e.g. "Friendly, professional, slightly persuasive"
-        - extra_instructions: long free‑text instructions
-        """
-        if not behavior:
-            return (
-                "Website type: General website\n"
-                "Primary goal: Answer questions based on the site's content.\n"
-                "Tone: Friendly and neutral.\n"
-            )
-
-        website_type = (behavior.get("website_type") or "General website").strip()
-        primary_goal = (behavior.get("primary_goal") or "Answer questions based on the site's content.").strip()
-        tone = (behavior.get("tone") or "Friendly and professional.").strip()
-        extra = (behavior.get("extra_instructions") or "").strip()
-
-        lines = [
-            f"Website type: {website_type}",
-            f"Primary goal: {primary_goal}",
-            f"Tone: {tone}",
-        ]
-        if extra:
-            lines.append("Additional instructions:")
-            lines.append(extra)
-        return "\n".join(lines)
+        # Suggestions live in the persistent suggestion store and are refreshed by suggestion_scheduler
 
     @staticmethod
     def _normalize_answer_text(text: str) -> str:
@@ -218,22 +172,6 @@ Answer:"""
         s = re.sub(r"(?<!\*)\*([^*\n]+)\*(?!\*)", r"\1", s)
         return s.strip()
 
-    @staticmethod
-    def _is_simple_greeting(question: str) -> bool:
-        q = (question or "").strip()
-        if not q or len(q) > 72:
-            return False
-        if _SIMPLE_GREETING_RE.match(q):
-            return True
-        words = re.sub(r"[^\w\s]", " ", q.lower()).split()
-        if not words or len(words) > 5:
-            return False
-        allowed = {
-            "hi", "hello", "hey", "hiya", "howdy", "yo", "sup", "thanks", "thank", "you",
-            "morning", "afternoon", "evening", "good", "day", "there", "dear",
-        }
-        return all(w in allowed for w in words)
-
     def _tenant_metadata_filter(self, tenant_id_str: str) -> Dict[str, Any]:
         """Chroma filter: this tenant's chunks plus optional shared `tenant_all` index."""
         return {
@@ -245,7 +183,7 @@ Answer:"""
 
     @staticmethod
     def _dedupe_documents(docs: List[Document]) -> List[Document]:
-        """Drop near-duplicate chunks so the model gets distinct evidence."""
+        """Drop exact and near-duplicate (SimHash) chunks so the model gets distinct evidence."""
         seen: set[str] = set()
         out: List[Document] = []
         for d in docs:
@@ -254,7 +192,47 @@ Answer:"""
                 continue
             seen.add(key)
             out.append(d)
-        return out
+        return near_dedup.collapse(out)
+
+    def _stored_chunks(self, tenant_id_str: str) -> List[tuple]:
+        """(source, text) of every indexed chunk of the tenant (full read: stats backfill, near-dedup index)."""
+        results = self.vector_db.get(where={"tenant_id": tenant_id_str}) or {}
+        documents = results.get("documents") or []
+        metas = results.get("metadatas") or [{}] * len(documents)
+        return [
+            (str((m or {}).get("source", "unknown")), d or "")
+            for d, m in zip(documents, metas)
+        ]
+
+    def _record_added(self, tenant_id_str: str, chunks: List[Document]) -> None:
+        """Update tenant counters for stores that don't maintain them (Chroma)."""
+        if getattr(self.vector_db, "tenant_stats", None) is not None or not chunks:
+            return
+        tenant_stats.apply(
+            tenant_id_str,
+            added=[(str(c.metadata.get("source", "unknown")), c.page_content) for c in chunks],
+            current=lambda: self._stored_chunks(tenant_id_str),
+        )
+
+    def _new_chunks(self, tenant_id_str: str, chunks: List[Document]) -> List[Document]:
+        """
+        Chunks worth indexing: chunks already stored (same content-hash id, e.g. a re-upload)
+        are dropped first, then near-duplicates of any chunk the tenant has indexed.
+        """
+        indexed_ids = getattr(self.vector_db, "indexed_ids", None)
+        if indexed_ids is not None and chunks:
+            ids = [
+                PineconeVectorStore._make_chunk_id(
+                    tenant_id=tenant_id_str,
+                    source=str((c.metadata or {}).get("source", "unknown")),
+                    content=(c.page_content or "").strip(),
+                )
+                for c in chunks
+            ]
+            known = indexed_ids(tenant_id_str, ids)
+            if known:
+                chunks = [c for c, chunk_id in zip(chunks, ids) if chunk_id not in known]
+        return near_dedup.filter_new(tenant_id_str, chunks, lambda: self._stored_chunks(tenant_id_str))
 
     @staticmethod
     def _sample_docs_evenly(docs: List[Document], max_docs: int) -> List[Document]:
@@ -266,40 +244,67 @@ Answer:"""
         step = max(1, len(docs) // max_docs)
         return docs[::step][:max_docs]
 
-    def _docs_for_suggestion_generation(
-        self, tenant_id_str: str, retrieved_docs: List[Document]
-    ) -> List[Document]:
+    def _sample_tenant_docs(self, tenant_id_str: str, k: int) -> List[Document]:
         """
-        Merge chunks from the current answer retrieval with a spread sample of all tenant
-        chunks so suggested questions match what is actually in the knowledge base.
+        Up to `k` of the tenant's chunks, stratified by source so every page/file is
+        represented. Stores with `sample()` hydrate only the sampled chunks; for Chroma,
+        ids and metadata are read first and only the sampled documents are fetched.
         """
-        merged: List[Document] = list(retrieved_docs)
-        try:
-            batch = self.vector_db.get(where={"tenant_id": tenant_id_str})
-            if batch and batch.get("documents"):
-                metas = batch.get("metadatas") or [{}] * len(batch["documents"])
-                for d, m in zip(batch["documents"], metas):
-                    merged.append(
-                        Document(
-                            page_content=d or "",
-                            metadata=m if isinstance(m, dict) else {},
-                        )
-                    )
-        except Exception as e:
-            print(f"Warning: tenant chunk sample for suggestions failed: {e}")
-        merged = self._dedupe_documents(merged)
-        return self._sample_docs_evenly(merged, SUGGESTION_POOL_MAX_DOCS)
+        if hasattr(self.vector_db, "sample"):
+            batch = self.vector_db.sample(tenant_id_str, k)
+        else:
+            listing = self.vector_db.get(where={"tenant_id": tenant_id_str}, include=["metadatas"])
+            ids = listing.get("ids") or []
+            rows = stratified_sample(rows_by_key(listing.get("metadatas") or [{}] * len(ids)), k)
+            batch = self.vector_db.get(ids=[ids[i] for i in rows]) if rows else {}
+        documents = batch.get("documents") or []
+        metas = batch.get("metadatas") or [{}] * len(documents)
+        return [
+            Document(page_content=d or "", metadata=m if isinstance(m, dict) else {})
+            for d, m in zip(documents, metas)
+        ]
 
     def _keep_answerable_suggestions(
         self, questions: List[str], knowledge_docs: List[Document]
     ) -> List[str]:
         """
         Drop any suggestion that cannot be answered strictly from the given knowledge chunks.
+        Clear cases are decided locally (services/answerability.py); only borderline
+        candidates go to the LLM verifier.
         """
         questions = [q.strip() for q in questions if q and str(q).strip()]
         if not questions or not knowledge_docs:
             return []
 
+        verdicts = answerability_filter.triage(questions, knowledge_docs, self.embeddings)
+        accepted = [v.question for v in verdicts if v.decision == ACCEPT]
+        borderline = [v.question for v in verdicts if v.decision == BORDERLINE]
+        verified = set(self._verify_suggestions_with_llm(borderline, knowledge_docs)) if borderline else set()
+        print(
+            f"🔎 Suggestion check: {len(accepted)} accepted / "
+            f"{len(verdicts) - len(accepted) - len(borderline)} rejected locally, {len(borderline)} sent to LLM"
+        )
+
+        # Dedupe while preserving order
+        seen_q: set[str] = set()
+        final = []
+        for v in verdicts:
+            if v.decision == ACCEPT or v.question in verified:
+                k = v.question.lower()
+                if k in seen_q:
+                    continue
+                seen_q.add(k)
+                final.append(v.question)
+        return final[:5]
+
+    def _verify_suggestions_with_llm(
+        self, questions: List[str], knowledge_docs: List[Document]
+    ) -> List[str]:
+        """LLM verifier: the questions fully supported by the knowledge chunks."""
+        questions = [q.strip() for q in questions if q and str(q).strip()]
+        if not questions or not knowledge_docs:
+            return []
+
         picked = self._sample_docs_evenly(knowledge_docs, 18)
         parts: List[str] = []
         total = 0
@@ -345,32 +350,14 @@ Include only the numbers of questions whose answers are fully supported by the K
                     j = int(i)
                     if 1 <= j <= len(questions):
                         out.append(questions[j - 1])
-            # Dedupe while preserving order
-            seen_q: set[str] = set()
-            final = []
-            for q in out:
-                k = q.lower()
-                if k in seen_q:
-                    continue
-                seen_q.add(k)
-                final.append(q)
-            return final[:5]
+            return out
         except Exception as e:
             print(f"Suggestion verification failed (dropping suggestions): {e}")
             return []
 
-    def _format_context_for_prompt(self, docs: List[Document]) -> str:
-        """Numbered excerpts with source labels for clearer grounding."""
-        max_c = min(settings.context_max_chunks, len(docs))
-        per_chunk = settings.context_max_chars_per_chunk
-        blocks = []
-        for i, doc in enumerate(docs[:max_c], start=1):
-            src = doc.metadata.get("source") or "unknown source"
-            body = doc.page_content.strip()
-            if len(body) > per_chunk:
-                body = body[: per_chunk - 1].rstrip() + "…"
-            blocks.append(f"--- Excerpt {i} (Source: {src}) ---\n{body}")
-        return "\n\n".join(blocks)
+    def _format_context_for_prompt(self, docs: List[Document]) -> PackedContext:
+        """Numbered excerpts with source labels, packed into the context token budget."""
+        return context_packer.pack(docs)
 
     def _retrieve_for_tenant(self, question: str, tenant_id_str: str) -> List[Document]:
         """MMR retrieval over tenant + shared docs for better coverage than flat top-k."""
@@ -400,13 +387,41 @@ Include only the numbers of questions whose answers are fully supported by the K
         allowed = {tenant_id_str, "tenant_all"}
         return [d for d in docs if (d.metadata or {}).get("tenant_id") in allowed]
 
+    def retrieve_documents(self, question: str, tenant_id: str) -> List[Document]:
+        """
+        Embed the question and run tenant-filtered retrieval only (no LLM call).
+        Vector store / embedding failures raise, so callers report an error instead of
+        answering as if the knowledge base were empty.
+        """
+        if not self.vector_db:
+            self.initialize_database()
+        try:
+            return self._retrieve_for_tenant(question, str(tenant_id))
+        except Exception as e:
+            print(f"❌ Error retrieving documents: {e}")
+            raise
+
     # --------------------------
     # 🧱 Initialize / Load DB
     # --------------------------
     def initialize_database(self) -> bool:
         """Initialize or load the vector database."""
+        backend = (settings.vector_backend or "").strip().lower()
         try:
-            if self.pinecone_enabled:
+            if backend == "faiss":
+                self.vector_db = FaissVectorStore(
+                    embeddings=self.embeddings,
+                    index_path=settings.faiss_index_path,
+                    hnsw_m=settings.faiss_hnsw_m,
+                    ef_search=settings.faiss_ef_search,
+                    snapshot_interval=settings.faiss_snapshot_interval_seconds,
+                    embedding_batch_size=settings.embedding_batch_size,
+                    tenant_stats=tenant_stats,
+                )
+                print(f"✅ Loaded/Created FAISS indexes at {settings.faiss_index_path}")
+                return True
+
+            if self.pinecone_enabled and backend in ("", "pinecone"):
                 self.vector_db = PineconeVectorStore(
                     embeddings=self.embeddings,
                     pinecone_api_key=settings.pinecone_api_key,
@@ -415,11 +430,27 @@ Include only the numbers of questions whose answers are fully supported by the K
                     environment=settings.pinecone_environment,
                     meta_path=settings.pinecone_meta_path,
                     embedding_batch_size=settings.embedding_batch_size,
+                    quantized_store=(
+                        QuantizedVectorStore(path=settings.quantized_vector_path)
+                        if settings.quantized_vector_path
+                        else None
+                    ),
+                    local_search=settings.quantized_local_search,
+                    tenant_stats=tenant_stats,
                 )
                 print(
                     f"✅ Connected Pinecone index '{settings.pinecone_index_name}' "
                     f"(meta cache at {settings.pinecone_meta_path})"
                 )
+                if settings.tiered_retrieval_enabled:
+                    self.vector_db = TieredVectorStore(
+                        remote=self.vector_db,
+                        memory_budget_bytes=settings.tiered_memory_budget_mb * 1024 * 1024,
+                        rebalance_interval=settings.tiered_rebalance_interval_seconds,
+                        rate_half_life=settings.tiered_rate_half_life_seconds,
+                        min_queries=settings.tiered_min_queries,
+                    )
+                    print(f"✅ Tiered retrieval enabled ({settings.tiered_memory_budget_mb} MB local budget)")
                 return True
 
             if Chroma is None:
@@ -436,6 +467,15 @@ Include only the numbers of questions whose answers are fully supported by the K
             print(f"❌ Error initializing database: {e}")
             return False
 
+    def close(self) -> None:
+        """Flush anything the vector store buffers in memory (called on app shutdown)."""
+        close = getattr(self.vector_db, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"❌ Error closing vector store: {e}")
+
     # --------------------------
     # ➕ Add Documents
     # --------------------------
@@ -451,21 +491,114 @@ Include only the numbers of questions whose answers are fully supported by the K
                 metadata={"source": source, "tenant_id": tenant_id_str}
             )
 
-            chunks = self.text_splitter.split_documents([document])
+            chunks = self._new_chunks(tenant_id_str, self.text_splitter.split_documents([document]))
             if chunks:
                 self.vector_db.add_documents(chunks)
                 self.vector_db.persist()
+                self._record_added(tenant_id_str, chunks)
                 print(f"🟢 Added {len(chunks)} chunks for tenant {tenant_id_str} from {source}")
 
-                # Generate suggestions after adding
-                self.update_tenant_suggestions(tenant_id_str)
+                # Refresh suggestions in the background (coalesced per tenant)
+                suggestion_scheduler.mark_dirty(tenant_id_str)
                 return True
 
             return False
         except Exception as e:
             print(f"❌ Error adding documents to index: {e}")
+            near_dedup.forget_tenant(str(tenant_id))
             return False
 
+    async def add_text_stream_to_index(
+        self,
+        pages: Iterable[str],
+        source: str,
+        tenant_id: str,
+        max_pending_batches: int = 2,
+    ) -> StreamIngestResult:
+        """
+        Index text arriving piece by piece (e.g. PDF pages). Splitting runs in a worker thread
+        and hands full embedding batches to the event loop through a small bounded queue, so
+        embedding starts with the first pages and memory stays bounded by a few batches.
+        Returns how many chunks the text produced and how many were newly added (a file
+        whose chunks are all indexed already has `chunks > 0`, `added == 0`); raises on failure.
+        """
+        if not self.vector_db:
+            self.initialize_database()
+
+        tenant_id_str = str(tenant_id)
+        batch_size = max(1, settings.embedding_batch_size)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_pending_batches))
+        cancelled = threading.Event()
+        done = object()
+        produced = 0
+
+        def put(item) -> None:
+            # Blocks the splitter while the queue is full (back-pressure from embedding)
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while not cancelled.is_set():
+                try:
+                    future.result(timeout=0.5)
+                    return
+                except concurrent.futures.TimeoutError:
+                    continue
+            future.cancel()
+
+        def split_pages() -> None:
+            nonlocal produced
+            raw: List[Document] = []
+            pending: List[Document] = []
+            metadata = {"source": source, "tenant_id": tenant_id_str}
+            try:
+                # One stream over all pages, so a section running across a page break
+                # stays in one chunk
+                for chunk in self.text_splitter.iter_documents(pages, metadata):
+                    if cancelled.is_set():
+                        return
+                    raw.append(chunk)
+                    produced += 1
+                    if len(raw) >= batch_size:
+                        pending.extend(self._new_chunks(tenant_id_str, raw))
+                        raw = []
+                    while len(pending) >= batch_size:
+                        put(pending[:batch_size])
+                        pending = pending[batch_size:]
+                pending.extend(self._new_chunks(tenant_id_str, raw))
+                if pending:
+                    put(pending)
+            except BaseException as e:
+                put(e)
+            finally:
+                put(done)
+
+        splitter = asyncio.create_task(asyncio.to_thread(split_pages))
+        added = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                await asyncio.to_thread(self.vector_db.add_documents, item)
+                self._record_added(tenant_id_str, item)
+                added += len(item)
+        except BaseException:
+            # Fingerprints of chunks that never made it into the index must not block a retry
+            near_dedup.forget_tenant(tenant_id_str)
+            raise
+        finally:
+            cancelled.set()
+            await splitter
+
+        if added:
+            self.vector_db.persist()
+            print(f"🟢 Added {added} chunks for tenant {tenant_id_str} from {source} (streamed)")
+            suggestion_scheduler.mark_dirty(tenant_id_str)
+        elif produced:
+            print(f"🟢 Nothing new to index for tenant {tenant_id_str} from {source} ({produced} chunks already indexed)")
+        return StreamIngestResult(chunks=produced, added=added)
+
     # --------------------------
     # 🧹 Clear Documents
     # --------------------------
@@ -482,9 +615,13 @@ Include only the numbers of questions whose answers are fully supported by the K
                 self.vector_db.delete(ids=results['ids'])
                 self.vector_db.persist()
                 print(f"🧼 Cleared {len(results['ids'])} documents for tenant {tenant_id_str}")
+            if getattr(self.vector_db, "tenant_stats", None) is None:
+                tenant_stats.replace(tenant_id_str, [])
 
-            # Clear suggestions too
-            self.suggestion_cache.pop(tenant_id_str, None)
+            # Clear suggestions and near-duplicate fingerprints too
+            suggestion_scheduler.forget(tenant_id_str)
+            suggestion_store.delete(tenant_id_str)
+            near_dedup.forget_tenant(tenant_id_str)
             return True
         except Exception as e:
             print(f"❌ Error clearing tenant documents: {e}")
@@ -499,8 +636,27 @@ Include only the numbers of questions whose answers are fully supported by the K
         tenant_id: str,
         user_asking_for_images: bool = False,
         behavior: Dict[str, Any] | None = None,
+        retrieved_docs: List[Document] | None = None,
+        intent: Intent | None = None,
     ) -> Dict[str, Any]:
-        """Generate answer for a question using tenant-filtered retrieval and dynamic suggestions."""
+        """
+        Generate answer for a question using tenant-filtered retrieval and dynamic suggestions.
+        Pass `retrieved_docs` (from `retrieve_documents`) when retrieval already ran concurrently,
+        and `intent` when the caller already classified the question.
+        """
+        intent = intent or classify_intent(question)
+
+        # Greetings / thanks: template reply in the bot's tone, no retrieval or LLM call
+        if small_talk.applies(intent):
+            tenant_id_str = str(tenant_id)
+            return {
+                "answer": small_talk.reply(intent, behavior, self._has_knowledge(tenant_id_str)),
+                "sources": [],
+                "tenant_id": tenant_id_str,
+                "suggestions": self.get_tenant_suggestions(tenant_id_str),
+                "context_tokens": 0,
+            }
+
         if not self.vector_db:
             self.initialize_database()
 
@@ -515,24 +671,15 @@ Include only the numbers of questions whose answers are fully supported by the K
         try:
             tenant_id_str = str(tenant_id)
 
-            docs = self._retrieve_for_tenant(question, tenant_id_str)
+            if retrieved_docs is not None:
+                docs = retrieved_docs
+            else:
+                docs = self._retrieve_for_tenant(question, tenant_id_str)
             if not docs:
                 suggestions = self.get_tenant_suggestions(tenant_id_str)
-                if self._is_simple_greeting(question):
-                    n_chunks = self.get_tenant_document_count(tenant_id_str)
-                    if n_chunks == 0:
-                        answer = (
-                            "Hello! There are no knowledge sources loaded for this assistant yet, "
-                            "so I can't answer detailed questions. Once your team adds website pages or documents, "
-                            "I'll be able to help from that content."
-                        )
-                    else:
-                        answer = (
-                            "Hello! I can help with questions about our services, contact details, and other topics "
-                            "from the information we have on file. What would you like to know?"
-                        )
+                if intent.greeting:
                     return {
-                        "answer": answer,
+                        "answer": small_talk.template(intent, behavior, self._has_knowledge(tenant_id_str)),
                         "sources": [],
                         "tenant_id": tenant_id_str,
                         "suggestions": suggestions,
@@ -544,14 +691,16 @@ Include only the numbers of questions whose answers are fully supported by the K
                     "suggestions": suggestions,
                 }
 
-            context_text = self._format_context_for_prompt(docs)
-            if self._is_simple_greeting(question):
+            packed = self._format_context_for_prompt(docs)
+            context_text = packed.text
+            if intent.greeting:
                 context_text = (
                     "[Note: The user's message is a short greeting, not a factual question. "
                     "Reply with a brief friendly greeting; do not say you lack information about their hello. "
                     "You may invite them to ask a specific question.]\n\n"
                 ) + context_text
-            sources = [doc.metadata.get("source", "Unknown") for doc in docs]
+            # Only sources whose excerpts made it into the context budget
+            sources = packed.sources
 
             # When user asks for images, tell the model so it doesn't say "I don't have that information"
             if user_asking_for_images:
@@ -562,32 +711,31 @@ Include only the numbers of questions whose answers are fully supported by the K
                     "rather than saying you don't have that information.]"
                 )
 
-            # Build behavior block from admin-selected website type / tone
-            behavior_text = self._build_behavior_instructions(behavior)
-
-            # Generate answer
-            final_prompt = self.prompt.format(
-                behavior=behavior_text,
-                context=context_text,
-                question=question,
-            )
-            response = self.llm.invoke(final_prompt)
+            # Generate answer: cached per-bot prefix (rules + behavior mode) first, then context/question
+            prompt = self.prompt_assembler.assemble(behavior, context_text, question)
+            print(f"🧾 Context for tenant {tenant_id_str}: {packed.summary()}; prompt: {prompt.summary()}")
+            response = self.llm.invoke(prompt.messages)
+            provider_cached = self.prompt_assembler.record_usage(response)
             answer_text = self._normalize_answer_text(response.content or "")
 
-            # Suggestions: broad KB sample + strict generation + verifier (no unanswerable clicks)
-            knowledge_for_suggestions = self._docs_for_suggestion_generation(tenant_id_str, docs)
-            raw_suggestions = self.suggestion_generator.generate(knowledge_for_suggestions)
-            suggestions = self._keep_answerable_suggestions(raw_suggestions, knowledge_for_suggestions)
-            suggestions = [s for s in suggestions if question.lower() not in s.lower()]
-
-            # Update cache for dynamic refresh next time
-            self.suggestion_cache[tenant_id_str] = suggestions
+            # Suggestions: the tenant's stored, verified set (refreshed in the background)
+            suggestions = [
+                s for s in self.get_tenant_suggestions(tenant_id_str) if question.lower() not in s.lower()
+            ]
 
             return {
                 "answer": answer_text,
                 "sources": list(set(sources)),
                 "tenant_id": tenant_id_str,
                 "suggestions": suggestions,
+                "context_tokens": packed.tokens,
+                "source_scores": self._source_scores(docs),
+                "prompt_cache": {
+                    "prefix_tokens": prompt.prefix_tokens,
+                    "cacheable_tokens": prompt.cacheable_tokens,
+                    "uncached_tokens": prompt.prefix_tokens - prompt.cacheable_tokens + prompt.variable_tokens,
+                    "provider_cached_tokens": provider_cached,
+                },
             }
 
         except Exception as e:
@@ -603,56 +751,89 @@ Include only the numbers of questions whose answers are fully supported by the K
     # 📊 Document Count
     # --------------------------
     def get_tenant_document_count(self, tenant_id: str) -> int:
-        """Get the number of documents for a tenant."""
+        """Get the number of documents (chunks) for a tenant, from the tenant counters."""
+        stats = self.get_tenant_stats(tenant_id)
+        return stats.chunks if stats else 0
+
+    @staticmethod
+    def _source_scores(docs: List[Document]) -> Dict[str, float]:
+        """Best retrieval score per source (sources of retrievers that report scores)."""
+        out: Dict[str, float] = {}
+        for doc in docs:
+            md = doc.metadata or {}
+            score = md.get("relevance_score")
+            if isinstance(score, (int, float)):
+                source = str(md.get("source", "unknown"))
+                out[source] = max(float(score), out.get(source, float("-inf")))
+        return out
+
+    def _has_knowledge(self, tenant_id: str) -> bool:
+        """Whether the tenant has indexed chunks; unknown (store unavailable) counts as yes."""
+        if not self.vector_db:
+            self.initialize_database()
+        stats = self.get_tenant_stats(tenant_id)
+        return stats is None or stats.chunks > 0
+
+    def get_tenant_stats(self, tenant_id: str) -> TenantStats | None:
+        """Chunk / source / byte / token counters for a tenant; O(1) once backfilled."""
         try:
             if not self.vector_db:
-                return 0
+                return None
 
             tenant_id_str = str(tenant_id)
-            results = self.vector_db.get(where={"tenant_id": tenant_id_str})
-            return len(results['ids']) if results and results['ids'] else 0
+            return tenant_stats.get(tenant_id_str, backfill=lambda: self._stored_chunks(tenant_id_str))
         except Exception as e:
-            print(f"❌ Error getting document count: {e}")
-            return 0
+            print(f"❌ Error getting tenant stats: {e}")
+            return None
 
     # --------------------------
     # 💡 Suggestion Handling
     # --------------------------
+    def _knowledge_version(self, tenant_id: str) -> str:
+        stats = self.get_tenant_stats(tenant_id)
+        return stats.version if stats else "empty"
+
     def update_tenant_suggestions(self, tenant_id: str):
         """Generate and store suggestion questions for a tenant."""
         try:
-            tenant_docs = self.vector_db.get(where={"tenant_id": tenant_id})
-            if tenant_docs and tenant_docs['documents']:
-                metas = tenant_docs.get("metadatas") or [{}] * len(tenant_docs["documents"])
-                docs = [
-                    Document(
-                        page_content=d or "",
-                        metadata=m if isinstance(m, dict) else {},
-                    )
-                    for d, m in zip(tenant_docs["documents"], metas)
-                ]
-                docs = self._dedupe_documents(docs)
-                sampled = self._sample_docs_evenly(docs, SUGGESTION_POOL_MAX_DOCS)
+            tenant_id = str(tenant_id)
+            # Version read before sampling: changes made while generating leave the entry stale
+            version = self._knowledge_version(tenant_id)
+            # Sampled per source at the store; cost doesn't grow with the tenant's corpus
+            docs = self._sample_tenant_docs(tenant_id, SUGGESTION_POOL_MAX_DOCS)
+            if docs:
+                sampled = self._dedupe_documents(docs)
                 raw = self.suggestion_generator.generate(sampled)
                 filtered = self._keep_answerable_suggestions(raw, sampled)
-                self.suggestion_cache[tenant_id] = filtered[:5]
+                suggestion_store.put(tenant_id, filtered[:5], version)
                 print(f"✨ Generated {len(filtered)} verified suggestions for tenant {tenant_id}")
+            else:
+                # Nothing indexed yet: record that, so reads don't keep triggering regeneration
+                suggestion_store.put(tenant_id, [], version)
         except Exception as e:
             print(f"❌ Error generating suggestions: {e}")
 
     def get_tenant_suggestions(self, tenant_id: str) -> List[str]:
-        """Retrieve stored suggestion questions for a tenant."""
-        return self.suggestion_cache.get(str(tenant_id), [])
+        """
+        Stored suggestion questions for a tenant. Missing or outdated entries (knowledge
+        changed since they were generated) are queued for a background refresh; the stored
+        ones are served meanwhile.
+        """
+        tenant_id = str(tenant_id)
+        entry = suggestion_store.get(tenant_id)
+        if self.vector_db and (entry is None or entry.version != self._knowledge_version(tenant_id)):
+            suggestion_scheduler.mark_dirty(tenant_id)
+        return entry.suggestions if entry else []
 
     # --------------------------
     # 📏 Long-question hint (better UX for humans)
     # --------------------------
-    def get_question_length_hint(self, question: str) -> str | None:
+    def get_question_length_hint(self, question: str, intent: Intent | None = None) -> str | None:
         """
         If the question is very long, return a short, friendly hint suggesting the user
         shorten it for better results. Otherwise return None.
         """
-        if not question or len(question.strip()) <= MAX_RECOMMENDED_QUESTION_LENGTH:
+        if not question or not (intent or classify_intent(question)).long_question:
             return None
         return (
             "Your question is quite long. For clearer answers, try asking one thing at a time "
@@ -668,43 +849,26 @@ Include only the numbers of questions whose answers are fully supported by the K
         Return True only if the user's question indicates they want to see an image/photo.
         If False, the chat should not include any images in the response.
         """
-        if not question or not question.strip():
-            return False
-        q = question.strip().lower()
-        # Word-boundary style check for single words
-        for token in ("image", "images", "photo", "photos", "picture", "pictures",
-                      "visual", "diagram", "screenshot", "illustration", "graphic", "chart"):
-            if token in q:
-                return True
-        # Phrase checks (simple substring)
-        if "show me" in q and ("image" in q or "photo" in q or "picture" in q):
-            return True
-        if "show " in q and ("image" in q or "photo" in q or "picture" in q):
-            return True
-        if "send " in q and ("image" in q or "photo" in q or "picture" in q):
-            return True
-        if "display " in q and ("image" in q or "photo" in q or "picture" in q):
-            return True
-        if "see the " in q and ("image" in q or "photo" in q or "picture" in q):
-            return True
-        if "what does" in q and "look like" in q:
-            return True
-        if "how does" in q and "look" in q:
-            return True
-        return False
+        return classify_intent(question).image_request
 
     def _is_junk_image_url(self, url: str) -> bool:
         """True if URL looks like tracking pixel, logo, icon, etc."""
         return bool(JUNK_IMAGE_PATTERNS.search(url))
 
     def filter_relevant_images(
-        self, question: str, answer: str, images: List[Dict[str, Any]]
+        self,
+        question: str,
+        answer: str,
+        images: List[Dict[str, Any]],
+        source_scores: Dict[str, float] | None = None,
     ) -> List[Dict[str, Any]]:
         """
         Filter images to only those relevant to the user's question and the bot's answer.
         - Drops junk (tracking pixels, logos, icons) by URL.
-        - Uses LLM to select images that actually help answer the question (e.g. photos of
-          the person/thing asked about). Returns a small, relevant subset for the chat UI.
+        - Ranks the rest by similarity of their stored alt/title/filename vectors to the
+          question + answer (services/image_ranker.py); no LLM call by default. Images with
+          no text take their page's relevance from `source_scores` (see `answer_question`).
+        - With IMAGE_LLM_TIEBREAK, images scoring right at the threshold are settled by the LLM.
         """
         if not images:
             return []
@@ -717,7 +881,29 @@ Include only the numbers of questions whose answers are fully supported by the K
         if not candidates:
             return []
 
-        # 2) Ask LLM which image URLs are relevant to the question/answer
+        # 2) Rank locally by embedding similarity
+        try:
+            ranked = image_ranker.rank(question, answer, candidates, self.embeddings, source_scores)
+        except Exception as e:
+            # If we can't confidently select any relevant images, don't send images at all
+            print(f"Image ranking failed (sending no images): {e}")
+            return []
+
+        # 3) Optionally let the LLM settle the images scoring right at the threshold
+        ambiguous = [img for img, score in ranked if image_ranker.is_ambiguous(score)]
+        if settings.image_llm_tiebreak and ambiguous:
+            picked = self._llm_pick_images(question, answer, ambiguous)
+            out = []
+            for img, score in ranked:
+                keep = img.get("url") in picked if image_ranker.is_ambiguous(score) else image_ranker.is_match(score)
+                if keep:
+                    out.append(img)
+        else:
+            out = [img for img, score in ranked if image_ranker.is_match(score)]
+        return out[:MAX_IMAGES_TO_SHOW]
+
+    def _llm_pick_images(self, question: str, answer: str, candidates: List[Dict[str, Any]]) -> set:
+        """Ask the LLM which image URLs are relevant to the question/answer."""
         list_for_prompt = "\n".join(
             f"{i}. {c.get('url', '')} (alt: {c.get('alt') or 'none'})"
             for i, c in enumerate(candidates[:25], start=1)
@@ -742,16 +928,9 @@ Return a JSON array of the selected image URLs only, e.g. ["https://...", "https
             parsed = json.loads(text)
             urls_selected = set(parsed) if isinstance(parsed, list) else set()
             # Keep only strings that look like URLs
-            urls_selected = {u for u in urls_selected if isinstance(u, str) and u.startswith("http")}
+            return {u for u in urls_selected if isinstance(u, str) and u.startswith("http")}
         except Exception:
-            urls_selected = set()
-
-        if not urls_selected:
-            # If we can't confidently select any relevant images, don't send images at all
-            return []
-
-        out = [c for c in candidates if c.get("url") in urls_selected]
-        return out[:MAX_IMAGES_TO_SHOW]
+            return set()
 
 
 # Singleton instance
@@ -0,0 +1,52 @@
+import random
+from typing import Dict, Hashable, List, Mapping, Optional, Sequence
+
+
+def stratified_sample(
+    groups: Mapping[Hashable, Sequence[int]],
+    k: int,
+    rng: Optional[random.Random] = None,
+) -> List[int]:
+    """
+    Pick up to `k` row numbers from `groups` (stratum -> rows), stratified by group.
+
+    Every group gets at least one row while `k` allows; the rest of the budget is split in
+    proportion to group size (largest remainder). With more groups than `k`, `k` groups are
+    picked at random, one row each. Cost depends on the number of groups and `k`, not on
+    the number of rows.
+    """
+    rng = rng or random.Random()
+    sizes = {g: len(rows) for g, rows in groups.items() if rows}
+    total = sum(sizes.values())
+    if k <= 0 or not total:
+        return []
+    if total <= k:
+        return [row for rows in groups.values() for row in rows]
+
+    if len(sizes) >= k:
+        quota = {g: 1 for g in rng.sample(sorted(sizes, key=str), k)}
+    else:
+        quota = {g: 1 for g in sizes}
+        spare = k - len(quota)
+        capacity = {g: n - 1 for g, n in sizes.items()}
+        spare_total = sum(capacity.values())
+        shares = {g: spare * c / spare_total for g, c in capacity.items()} if spare_total else {}
+        for g, share in shares.items():
+            quota[g] += int(share)
+        left = k - sum(quota.values())
+        for g in sorted(shares, key=lambda g: shares[g] - int(shares[g]), reverse=True)[:left]:
+            quota[g] += 1
+
+    picked: List[int] = []
+    for g, n in quota.items():
+        rows = groups[g]
+        picked.extend(rng.sample(rows, min(n, len(rows))))
+    return picked
+
+
+def rows_by_key(metadatas: Sequence[Dict], key: str = "source") -> Dict[str, List[int]]:
+    """Row numbers grouped by a metadata field (rows without it go under "unknown")."""
+    out: Dict[str, List[int]] = {}
+    for row, md in enumerate(metadatas):
+        out.setdefault(str((md or {}).get(key, "unknown")), []).append(row)
+    return out
@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from config.settings import settings
+
+
+class SuggestionScheduler:
+    """
+    Background refresh of suggested questions, decoupled from ingestion and chat.
+
+    Callers `mark_dirty(tenant)` whenever a tenant's knowledge changes (or its stored
+    suggestions look stale). Signals for a tenant that is already queued are coalesced, and
+    each tenant is refreshed at most once per `min_interval` seconds: a sitemap crawl that
+    adds hundreds of pages costs a handful of refreshes, the last one after the crawl ends.
+    A tenant marked while its refresh is running is queued again for the next window.
+
+    `concurrency` worker threads process due tenants oldest-signal first; that is also the
+    cap on concurrent suggestion LLM work across all tenants.
+    """
+
+    def __init__(self, *, min_interval: float = 60.0, concurrency: int = 2):
+        self.min_interval = max(0.0, float(min_interval))
+        self.concurrency = max(1, int(concurrency))
+        self._refresh: Optional[Callable[[str], None]] = None
+
+        self._cond = threading.Condition()
+        # tenant_id -> monotonic time of the first signal not yet handled
+        self._dirty: Dict[str, float] = {}
+        self._running: Set[str] = set()
+        # tenant_id -> monotonic time the last refresh started
+        self._last_run: Dict[str, float] = {}
+        self._stats = {"signals": 0, "coalesced": 0, "refreshed": 0, "failed": 0}
+        self._last_lag = 0.0
+
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # --------------------------
+    # Signals (hot path: memory only)
+    # --------------------------
+    def mark_dirty(self, tenant_id: str) -> None:
+        tenant_id = str(tenant_id)
+        with self._cond:
+            self._stats["signals"] += 1
+            if tenant_id in self._dirty:
+                self._stats["coalesced"] += 1
+                return
+            self._dirty[tenant_id] = time.monotonic()
+            self._cond.notify()
+
+    def forget(self, tenant_id: str) -> None:
+        """Drop a pending refresh (tenant cleared)."""
+        with self._cond:
+            self._dirty.pop(str(tenant_id), None)
+
+    # --------------------------
+    # Workers
+    # --------------------------
+    def _next_due(self, now: float):
+        """(tenant to refresh now or None, seconds until the next one is due or None)."""
+        best = None
+        wait = None
+        for tenant_id, marked_at in self._dirty.items():
+            if tenant_id in self._running:
+                continue
+            due = self._last_run.get(tenant_id, float("-inf")) + self.min_interval
+            if due <= now:
+                if best is None or marked_at < self._dirty[best]:
+                    best = tenant_id
+            elif wait is None or due - now < wait:
+                wait = due - now
+        return best, wait
+
+    def _take(self) -> Optional[str]:
+        with self._cond:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                tenant_id, wait = self._next_due(now)
+                if tenant_id is not None:
+                    self._last_lag = now - self._dirty.pop(tenant_id)
+                    self._running.add(tenant_id)
+                    self._last_run[tenant_id] = now
+                    return tenant_id
+                self._cond.wait(timeout=wait)
+        return None
+
+    def _work(self) -> None:
+        while True:
+            tenant_id = self._take()
+            if tenant_id is None:
+                return
+            ok = True
+            try:
+                self._refresh(tenant_id)
+            except Exception as e:
+                ok = False
+                print(f"❌ Suggestion refresh failed for tenant {tenant_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(tenant_id)
+                    self._stats["refreshed" if ok else "failed"] += 1
+                    # A signal that arrived during the run may be due at the next window
+                    self._cond.notify_all()
+
+    def start(self, refresh: Callable[[str], None]) -> None:
+        """Start the workers; `refresh(tenant_id)` regenerates and stores a tenant's suggestions."""
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._refresh = refresh
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"suggestion-refresh-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers; pending refreshes are dropped (stored suggestions stay valid)."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._cond:
+            out = dict(self._stats)
+            out["queued"] = len(self._dirty)
+            out["running"] = len(self._running)
+            out["oldest_lag_seconds"] = round(now - min(self._dirty.values()), 3) if self._dirty else 0.0
+            out["last_lag_seconds"] = round(self._last_lag, 3)
+        return out
+
+
+suggestion_scheduler = SuggestionScheduler(
+    min_interval=settings.suggestion_refresh_min_interval_seconds,
+    concurrency=settings.suggestion_refresh_concurrency,
+)
@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenant_suggestions (
+    tenant_id    TEXT PRIMARY KEY,
+    version      TEXT NOT NULL,
+    suggestions  TEXT NOT NULL,
+    generated_at REAL NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class StoredSuggestions:
+    suggestions: List[str]
+    # Knowledge version (see TenantStats.version) the suggestions were generated from
+    version: str
+    generated_at: float
+
+
+class SuggestionStore:
+    """
+    Suggested questions per tenant, persisted in a SQLite file shared by all workers on the
+    host, so restarts and extra workers don't regenerate them with fresh LLM calls.
+
+    Each entry records the knowledge version it was generated from; callers compare it to
+    the tenant's current version to decide whether a refresh is due. Reads go through a
+    small in-process cache (`memory_ttl` seconds, so other workers' writes show up soon);
+    `preload()` fills it for all tenants at startup.
+    """
+
+    def __init__(self, *, path: str, memory_ttl: float = 30.0):
+        self.path = os.path.abspath(path)
+        self.memory_ttl = float(memory_ttl)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # tenant_id -> (loaded_at, entry or None)
+        self._memory: Dict[str, Tuple[float, Optional[StoredSuggestions]]] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Opened on first use (or `open()` at app startup), never at import time
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def open(self) -> None:
+        """Create the SQLite file and schema now (app startup) instead of on first use."""
+        self._connect()
+
+    @staticmethod
+    def _entry(row) -> StoredSuggestions:
+        try:
+            suggestions = [str(s) for s in json.loads(row[1])]
+        except Exception:
+            suggestions = []
+        return StoredSuggestions(suggestions=suggestions, version=row[0], generated_at=row[2])
+
+    def get(self, tenant_id: str) -> Optional[StoredSuggestions]:
+        tenant_id = str(tenant_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._memory.get(tenant_id)
+        if cached is not None and now - cached[0] < self.memory_ttl:
+            return cached[1]
+
+        row = self._connect().execute(
+            "SELECT version, suggestions, generated_at FROM tenant_suggestions WHERE tenant_id = ?",
+            (tenant_id,),
+        ).fetchone()
+        entry = self._entry(row) if row else None
+        with self._lock:
+            self._memory[tenant_id] = (now, entry)
+        return entry
+
+    def put(self, tenant_id: str, suggestions: List[str], version: str) -> StoredSuggestions:
+        tenant_id = str(tenant_id)
+        entry = StoredSuggestions(suggestions=list(suggestions), version=version, generated_at=time.time())
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tenant_suggestions (tenant_id, version, suggestions, generated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (tenant_id, entry.version, json.dumps(entry.suggestions), entry.generated_at),
+        )
+        with self._lock:
+            self._memory[tenant_id] = (time.monotonic(), entry)
+        return entry
+
+    def delete(self, tenant_id: str) -> None:
+        tenant_id = str(tenant_id)
+        self._connect().execute("DELETE FROM tenant_suggestions WHERE tenant_id = ?", (tenant_id,))
+        with self._lock:
+            self._memory[tenant_id] = (time.monotonic(), None)
+
+    def preload(self) -> int:
+        """Load every stored tenant into the in-process cache; returns how many."""
+        rows = self._connect().execute(
+            "SELECT tenant_id, version, suggestions, generated_at FROM tenant_suggestions"
+        ).fetchall()
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                self._memory[row[0]] = (now, self._entry(row[1:]))
+        return len(rows)
+
+
+suggestion_store = SuggestionStore(
+    path=settings.suggestion_store_path,
+    memory_ttl=settings.suggestion_store_memory_ttl_seconds,
+)
@@ -0,0 +1,204 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from config.settings import settings
+from services.tokenizer import count_tokens
+
+# (source, chunk text)
+Chunk = Tuple[str, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenant_stats (
+    tenant_id  TEXT PRIMARY KEY,
+    chunks     INTEGER NOT NULL DEFAULT 0,
+    sources    INTEGER NOT NULL DEFAULT 0,
+    bytes      INTEGER NOT NULL DEFAULT 0,
+    tokens     INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tenant_source_chunks (
+    tenant_id TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    chunks    INTEGER NOT NULL,
+    PRIMARY KEY (tenant_id, source)
+);
+"""
+
+
+@dataclass(frozen=True)
+class TenantStats:
+    tenant_id: str
+    chunks: int
+    sources: int
+    bytes: int
+    tokens: int
+    updated_at: float
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the tenant's indexed knowledge changes."""
+        return f"{self.chunks}-{self.bytes}-{self.updated_at:.6f}"
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class TenantStatsStore:
+    """
+    Per-tenant corpus counters (chunks, distinct sources, bytes, tokens, last update) in a
+    small SQLite file shared by all workers on the host.
+
+    Vector stores call `apply()` with the chunks they actually added / removed; each call is
+    one SQLite transaction, so counters and per-source chunk counts never disagree. Reads
+    are a primary-key lookup, independent of corpus size. Tenants indexed before the table
+    existed are backfilled once from the store, on first read or first change.
+    """
+
+    def __init__(self, *, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Opened on first use (or `open()` at app startup), never at import time
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def open(self) -> None:
+        """Create the SQLite file and schema now (app startup) instead of on first use."""
+        self._connect()
+
+    def _row(self, tenant_id: str) -> Optional[tuple]:
+        return self._connect().execute(
+            "SELECT tenant_id, chunks, sources, bytes, tokens, updated_at FROM tenant_stats WHERE tenant_id = ?",
+            (tenant_id,),
+        ).fetchone()
+
+    @staticmethod
+    def _totals(chunks: Iterable[Chunk]) -> Tuple[Counter, int, int, int]:
+        per_source: Counter = Counter()
+        n_bytes = n_tokens = 0
+        for source, text in chunks:
+            per_source[source or "unknown"] += 1
+            n_bytes += len((text or "").encode("utf-8"))
+            n_tokens += count_tokens(text or "")
+        return per_source, sum(per_source.values()), n_bytes, n_tokens
+
+    def apply(
+        self,
+        tenant_id: str,
+        *,
+        added: Sequence[Chunk] = (),
+        removed: Sequence[Chunk] = (),
+        current: Callable[[], Iterable[Chunk]],
+    ) -> None:
+        """
+        Record chunks added to / removed from the tenant's index, in one transaction.
+        `current` lists all of the tenant's chunks after the change; it is only read when
+        the tenant has no counters yet (indexed before this table existed).
+        """
+        if not added and not removed:
+            return
+        if self._row(tenant_id) is None:
+            self.replace(tenant_id, current())
+            return
+        add_sources, add_chunks, add_bytes, add_tokens = self._totals(added)
+        del_sources, del_chunks, del_bytes, del_tokens = self._totals(removed)
+        deltas = Counter(add_sources)
+        deltas.subtract(del_sources)
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            source_delta = 0
+            for source, delta in deltas.items():
+                if not delta:
+                    continue
+                row = conn.execute(
+                    "SELECT chunks FROM tenant_source_chunks WHERE tenant_id = ? AND source = ?",
+                    (tenant_id, source),
+                ).fetchone()
+                before = row[0] if row else 0
+                after = max(0, before + delta)
+                if after:
+                    conn.execute(
+                        "INSERT INTO tenant_source_chunks (tenant_id, source, chunks) VALUES (?, ?, ?) "
+                        "ON CONFLICT (tenant_id, source) DO UPDATE SET chunks = excluded.chunks",
+                        (tenant_id, source, after),
+                    )
+                else:
+                    conn.execute(
+                        "DELETE FROM tenant_source_chunks WHERE tenant_id = ? AND source = ?",
+                        (tenant_id, source),
+                    )
+                source_delta += (after > 0) - (before > 0)
+
+            conn.execute(
+                """
+                UPDATE tenant_stats SET
+                    chunks = MAX(0, chunks + ?),
+                    sources = MAX(0, sources + ?),
+                    bytes = MAX(0, bytes + ?),
+                    tokens = MAX(0, tokens + ?),
+                    updated_at = ?
+                WHERE tenant_id = ?
+                """,
+                (
+                    add_chunks - del_chunks, source_delta, add_bytes - del_bytes, add_tokens - del_tokens,
+                    time.time(), tenant_id,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def replace(self, tenant_id: str, chunks: Iterable[Chunk]) -> TenantStats:
+        """Recompute the tenant's counters from its full chunk list (backfill / repair)."""
+        per_source, n_chunks, n_bytes, n_tokens = self._totals(chunks)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM tenant_source_chunks WHERE tenant_id = ?", (tenant_id,))
+            conn.executemany(
+                "INSERT INTO tenant_source_chunks (tenant_id, source, chunks) VALUES (?, ?, ?)",
+                [(tenant_id, s, c) for s, c in per_source.items()],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO tenant_stats (tenant_id, chunks, sources, bytes, tokens, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (tenant_id, n_chunks, len(per_source), n_bytes, n_tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return TenantStats(tenant_id, n_chunks, len(per_source), n_bytes, n_tokens, now)
+
+    def get(
+        self,
+        tenant_id: str,
+        backfill: Optional[Callable[[], Iterable[Chunk]]] = None,
+    ) -> Optional[TenantStats]:
+        """Counters for the tenant; with `backfill`, a tenant never seen is computed once from it."""
+        row = self._row(tenant_id)
+        if row is not None:
+            return TenantStats(*row)
+        if backfill is None:
+            return None
+        return self.replace(tenant_id, backfill())
+
+
+tenant_stats = TenantStatsStore(path=settings.tenant_stats_path)
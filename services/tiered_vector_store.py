@@ -0,0 +1,281 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from services.near_dedup import near_dedup
+from services.pinecone_vector_store import PineconeVectorStore, _allowed_tenant_ids_from_filter
+from services.vector_math import mmr_select, normalize_rows
+
+
+@dataclass(frozen=True)
+class _HotTenant:
+    """Immutable snapshot of one tenant held in local memory (swapped, never mutated)."""
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict[str, Any]]
+    matrix: Any  # np.ndarray (n, dim), rows L2-normalized
+    nbytes: int
+
+
+class TieredVectorStore:
+    """
+    Hot/cold tiering around `PineconeVectorStore`.
+
+    Per-tenant query rates are tracked as exponentially decayed counters. A background
+    thread periodically ranks tenants by rate and keeps the hottest ones (vectors + chunk
+    text) in local memory, within `memory_budget_bytes`. Queries whose tenants are all hot
+    are answered in-process; everything else falls through to Pinecone.
+
+    Writes always go to Pinecone; any tenant touched by add/delete is dropped from the hot
+    tier and picked up again on the next rebalance.
+    """
+
+    def __init__(
+        self,
+        *,
+        remote: PineconeVectorStore,
+        memory_budget_bytes: int,
+        rebalance_interval: float = 60.0,
+        rate_half_life: float = 600.0,
+        min_queries: float = 3.0,
+    ):
+        self.remote = remote
+        self.memory_budget_bytes = max(0, int(memory_budget_bytes))
+        self.rebalance_interval = float(rebalance_interval)
+        self.rate_decay = math.log(2) / max(1.0, float(rate_half_life))
+        self.min_queries = float(min_queries)
+
+        self._lock = threading.Lock()
+        # tenant_id -> (decayed query count, last update monotonic time)
+        self._rates: Dict[str, Tuple[float, float]] = {}
+        self._hot: Dict[str, _HotTenant] = {}
+        # Bumped on every write so a promotion racing with ingestion is discarded.
+        self._generation: Dict[str, int] = {}
+        self._served_local = 0
+        self._served_remote = 0
+
+        self._stop = threading.Event()
+        self._rebalance_thread: Optional[threading.Thread] = None
+        if self.rebalance_interval > 0:
+            self._rebalance_thread = threading.Thread(
+                target=self._rebalance_loop, name="tiered-rebalance", daemon=True
+            )
+            self._rebalance_thread.start()
+
+    def __getattr__(self, name: str) -> Any:
+        # Anything tier-agnostic (embeddings, fetch_vectors, ...) comes from the remote store.
+        if name == "remote":
+            raise AttributeError(name)
+        return getattr(self.remote, name)
+
+    # --------------------------
+    # Query rate tracking
+    # --------------------------
+    def _decayed(self, value: float, last: float, now: float) -> float:
+        return value * math.exp(-self.rate_decay * (now - last))
+
+    def record_query(self, tenant_ids: Set[str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for tenant_id in tenant_ids:
+                value, last = self._rates.get(tenant_id, (0.0, now))
+                self._rates[tenant_id] = (self._decayed(value, last, now) + 1.0, now)
+
+    def _current_rates(self) -> Dict[str, float]:
+        now = time.monotonic()
+        with self._lock:
+            return {t: self._decayed(v, last, now) for t, (v, last) in self._rates.items()}
+
+    # --------------------------
+    # Promotion / demotion
+    # --------------------------
+    def _load_hot_tenant(self, tenant_id: str) -> _HotTenant:
+        meta = self.remote._load_tenant_meta(tenant_id)
+        ids = list(meta.get("ids") or [])
+        documents = list(meta.get("documents") or [])
+        metadatas = list(meta.get("metadatas") or [])
+        if not ids:
+            return _HotTenant(ids=[], documents=[], metadatas=[], matrix=None, nbytes=0)
+
+        values = self.remote.fetch_vectors(ids)
+        # Only keep rows Pinecone actually returned so ids and matrix stay aligned.
+        rows = [i for i, cid in enumerate(ids) if cid in values]
+        matrix = normalize_rows([values[ids[i]] for i in rows])
+        docs = [documents[i] for i in rows]
+        nbytes = int(matrix.nbytes) + sum(len(d) for d in docs)
+        return _HotTenant(
+            ids=[ids[i] for i in rows],
+            documents=docs,
+            metadatas=[metadatas[i] for i in rows],
+            matrix=matrix,
+            nbytes=nbytes,
+        )
+
+    def _estimate_bytes(self, tenant_id: str, dim: int) -> int:
+        meta = self.remote._load_tenant_meta(tenant_id)
+        docs = meta.get("documents") or []
+        return len(docs) * dim * 4 + sum(len(d or "") for d in docs)
+
+    def rebalance(self) -> None:
+        """Recompute the hot set from current rates and promote/demote tenants to fit the budget."""
+        rates = self._current_rates()
+        ranked = sorted(
+            (t for t, r in rates.items() if r >= self.min_queries),
+            key=lambda t: rates[t],
+            reverse=True,
+        )
+
+        hot_now = dict(self._hot)
+        dim = next((h.matrix.shape[1] for h in hot_now.values() if h.matrix is not None), 1536)
+
+        desired: List[str] = []
+        used = 0
+        for tenant_id in ranked:
+            size = hot_now[tenant_id].nbytes if tenant_id in hot_now else self._estimate_bytes(tenant_id, dim)
+            if used + size > self.memory_budget_bytes:
+                continue
+            desired.append(tenant_id)
+            used += size
+
+        for tenant_id in set(hot_now) - set(desired):
+            with self._lock:
+                self._hot.pop(tenant_id, None)
+            print(f"🧊 Demoted tenant {tenant_id} to Pinecone tier")
+
+        for tenant_id in desired:
+            if tenant_id in hot_now:
+                continue
+            generation = self._generation.get(tenant_id, 0)
+            try:
+                hot = self._load_hot_tenant(tenant_id)
+            except Exception as e:
+                print(f"❌ Promoting tenant {tenant_id} to local tier failed: {e}")
+                continue
+            with self._lock:
+                if self._generation.get(tenant_id, 0) != generation:
+                    continue
+                self._hot[tenant_id] = hot
+            print(f"🔥 Promoted tenant {tenant_id} to local tier ({len(hot.ids)} chunks, {hot.nbytes} bytes)")
+
+        # Forget tenants whose rate has decayed to nothing so the table doesn't grow forever.
+        with self._lock:
+            for tenant_id, rate in rates.items():
+                if rate < 0.01 and tenant_id not in self._hot:
+                    self._rates.pop(tenant_id, None)
+
+    def _rebalance_loop(self) -> None:
+        while not self._stop.wait(self.rebalance_interval):
+            try:
+                self.rebalance()
+            except Exception as e:
+                print(f"❌ Tier rebalance failed: {e}")
+
+    def _invalidate(self, tenant_ids: Set[str]) -> None:
+        with self._lock:
+            for tenant_id in tenant_ids:
+                self._hot.pop(tenant_id, None)
+                self._generation[tenant_id] = self._generation.get(tenant_id, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hot_tenants": sorted(self._hot.keys()),
+                "hot_bytes": sum(h.nbytes for h in self._hot.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "served_local": self._served_local,
+                "served_remote": self._served_remote,
+            }
+
+    # --------------------------
+    # Chroma-like interface (writes go to Pinecone)
+    # --------------------------
+    def add_documents(self, documents: List[Document]) -> None:
+        self.remote.add_documents(documents)
+        self._invalidate({str((d.metadata or {}).get("tenant_id", "")) for d in documents})
+
+    def delete(self, ids: List[str]) -> None:
+        self.remote.delete(ids=ids)
+        self._invalidate({PineconeVectorStore._tenant_id_from_chunk_id(cid) for cid in ids})
+
+    def get(self, *, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self.remote.get(where=where)
+
+    def sample(self, tenant_id: str, k: int, seed: Optional[int] = None) -> Dict[str, Any]:
+        return self.remote.sample(tenant_id, k, seed=seed)
+
+    def persist(self) -> None:
+        self.remote.persist()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[Dict[str, Any]] = None) -> Any:
+        search_kwargs = search_kwargs or {}
+        return _TieredRetriever(store=self, search_type=search_type, search_kwargs=search_kwargs)
+
+
+class _TieredRetriever:
+    def __init__(self, *, store: TieredVectorStore, search_type: str, search_kwargs: Dict[str, Any]):
+        self.store = store
+        self.search_type = search_type
+        self.search_kwargs = search_kwargs
+
+    def invoke(self, query: str) -> List[Document]:
+        allowed_tenants = _allowed_tenant_ids_from_filter(self.search_kwargs.get("filter"))
+        if allowed_tenants is None:
+            return self.store.remote.as_retriever(self.search_type, self.search_kwargs).invoke(query)
+
+        self.store.record_query(allowed_tenants)
+        with self.store._lock:
+            hot = [self.store._hot.get(t) for t in allowed_tenants]
+            if any(h is None for h in hot):
+                self.store._served_remote += 1
+                hot = None
+            else:
+                self.store._served_local += 1
+
+        if hot is None:
+            return self.store.remote.as_retriever(self.search_type, self.search_kwargs).invoke(query)
+        return self._search_local(query, hot)
+
+    def _search_local(self, query: str, hot: List[_HotTenant]) -> List[Document]:
+        k = int(self.search_kwargs.get("k", 4))
+        fetch_k = max(k, int(self.search_kwargs.get("fetch_k", k)))
+        lambda_mult = float(self.search_kwargs.get("lambda_mult", 0.5))
+
+        query_vec = normalize_rows(self.store.remote.embeddings.embed_query(query))[0]
+
+        # (score, tenant snapshot, row)
+        candidates: List[Tuple[float, _HotTenant, int]] = []
+        for tenant in hot:
+            if tenant.matrix is None or not tenant.ids:
+                continue
+            scores = tenant.matrix @ query_vec
+            top = min(fetch_k, scores.shape[0])
+            rows = np.argpartition(-scores, top - 1)[:top]
+            candidates.extend((float(scores[r]), tenant, int(r)) for r in rows)
+        if not candidates:
+            return []
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        candidates = candidates[:fetch_k]
+        # Collapse near-duplicate chunks (templated boilerplate) before MMR
+        keep = near_dedup.collapse_indices([t.documents[r] for _s, t, r in candidates])
+        candidates = [candidates[i] for i in keep]
+        if self.search_type == "mmr":
+            cand_vectors = np.stack([t.matrix[r] for _s, t, r in candidates])
+            selected = [candidates[i] for i in mmr_select(query_vec, cand_vectors, k, lambda_mult)]
+        else:
+            selected = candidates[:k]
+
+        out_docs: List[Document] = []
+        for score, tenant, row in selected:
+            md = dict(tenant.metadatas[row] or {})
+            md["relevance_score"] = score
+            out_docs.append(Document(page_content=tenant.documents[row], metadata=md))
+        return out_docs
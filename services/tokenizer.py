@@ -0,0 +1,63 @@
+import threading
+from typing import List, Optional
+
+try:
+    import tiktoken
+except Exception:  # pragma: no cover
+    tiktoken = None
+
+# Matches text-embedding-3-* and the gpt-4/gpt-3.5 family closely enough for budgeting.
+DEFAULT_ENCODING = "cl100k_base"
+# Used only when the tiktoken encoding can't be loaded (e.g. no network for the BPE file).
+APPROX_CHARS_PER_TOKEN = 4
+
+_lock = threading.Lock()
+_encoding = None
+_encoding_failed = False
+
+
+def get_encoding():
+    """Shared tiktoken encoding, or None when tiktoken / its BPE file is unavailable."""
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+    with _lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                if tiktoken is None:
+                    raise ImportError("tiktoken is not installed")
+                _encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception as e:
+                _encoding_failed = True
+                print(f"⚠️ tiktoken encoding unavailable, using ~{APPROX_CHARS_PER_TOKEN} chars/token: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = get_encoding()
+    if enc is None:
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Hard split into pieces of at most `max_tokens` tokens (last resort for unbreakable text)."""
+    max_tokens = max(1, int(max_tokens))
+    enc = get_encoding()
+    if enc is None:
+        step = max_tokens * APPROX_CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = enc.encode(text, disallowed_special=())
+    return [enc.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    pieces = split_by_tokens(text, max_tokens) if text else []
+    return pieces[0] if pieces else ""
+
+
+def encoding_name() -> Optional[str]:
+    enc = get_encoding()
+    return enc.name if enc is not None else None
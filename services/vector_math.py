@@ -0,0 +1,49 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+def normalize_rows(vectors: Sequence[Sequence[float]] | np.ndarray) -> np.ndarray:
+    """Return a float32 matrix whose rows have unit L2 norm (zero rows stay zero)."""
+    mat = np.asarray(vectors, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat.reshape(1, -1)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return mat / norms
+
+
+def mmr_select(
+    query_vec: Sequence[float] | np.ndarray,
+    cand_vectors: Sequence[Sequence[float]] | np.ndarray,
+    k: int,
+    lambda_mult: float,
+) -> List[int]:
+    """
+    Indices of `cand_vectors` chosen by maximal marginal relevance (cosine similarity):
+      MMR = lambda * sim(query, doc) - (1 - lambda) * max_{sel in selected} sim(doc, sel)
+    """
+    cands = normalize_rows(cand_vectors)
+    n = cands.shape[0]
+    if n == 0 or k <= 0:
+        return []
+    query = normalize_rows(query_vec)[0]
+
+    query_sims = cands @ query
+    # Running max similarity of every candidate to the already-selected set.
+    max_sel_sims = np.full(n, -np.inf, dtype=np.float32)
+    remaining = np.ones(n, dtype=bool)
+    selected: List[int] = []
+
+    while len(selected) < min(k, n):
+        if not selected:
+            scores = query_sims.copy()
+        else:
+            scores = lambda_mult * query_sims - (1.0 - lambda_mult) * max_sel_sims
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        max_sel_sims = np.maximum(max_sel_sims, cands @ cands[best])
+
+    return selected